@@ -0,0 +1,245 @@
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from .vehicle_assignment import FleetState, SPECIALISED, assign_vehicles, pack, write_assignment
+
+# 🧩 /api/dispatch/ assignment modes
+#   serial  -> one pass over all orders in (Cluster, priority) order
+#   sharded -> fleet split across clusters by demand, one pack() per cluster in a
+#              worker process, then leftovers re-packed against what is left of the fleet.
+#              Falls back to serial when some vehicle type has fewer vehicles than there
+#              are clusters: most clusters would get none of it and the split plan loses orders.
+ASSIGNMENT_MODES = ["serial", "sharded"]
+
+# ⚙️ Override with settings.DISPATCH_ASSIGNMENT
+DEFAULT_ASSIGNMENT = {
+    "MODE": "serial",
+    "WORKERS": 4,               # worker processes for sharded mode
+    "MIN_POOL_ORDERS": 50000,   # smaller plans run their shards in-process (same result, no IPC cost)
+}
+
+
+def _config():
+    try:
+        from django.conf import settings
+        return {**DEFAULT_ASSIGNMENT, **getattr(settings, "DISPATCH_ASSIGNMENT", {})}
+    except Exception:
+        return dict(DEFAULT_ASSIGNMENT)
+
+
+def apportion(total, shares):
+    """Split `total` whole units by `shares` (largest remainder), so the parts always sum to `total`."""
+    shares = np.asarray(shares, dtype=np.float64)
+    if shares.sum() <= 0:
+        shares = np.ones(len(shares))
+    exact = total * shares / shares.sum()
+    counts = np.floor(exact).astype(np.intp)
+    short = total - counts.sum()
+    if short:
+        counts[np.argsort(-(exact - counts), kind="stable")[:short]] += 1
+    return counts
+
+
+def cluster_demand(fleet, clusters, load_types, weights, volumes):
+    """
+    (cluster labels, specialised demand, general demand) per cluster: the larger
+    of each cluster's kg / L share of the fleet. TF loads can only ride on
+    specialised vehicles; everything else is counted against the general ones.
+    """
+    labels, codes = np.unique(clusters, return_inverse=True)
+    kg = fleet.capacity_kg.sum() or 1.0
+    L = fleet.capacity_L.sum() or 1.0
+    tf = np.asarray(load_types, dtype=object) == "TF"
+
+    def demand(mask):
+        w = np.bincount(codes[mask], weights=weights[mask], minlength=len(labels))
+        v = np.bincount(codes[mask], weights=volumes[mask], minlength=len(labels))
+        return np.maximum(w / kg, v / L)
+
+    return labels, codes, demand(tf), demand(~tf)
+
+
+def partition_fleet(fleet, specialised_demand, general_demand):
+    """
+    Vehicle indices per cluster. Every vehicle type is split across clusters
+    in proportion to their demand on that type's property (specialised or
+    general), after one vehicle of it for each cluster with any such demand,
+    keeping pool order within each share.
+    """
+    n = len(specialised_demand)
+    total = specialised_demand + general_demand
+    parts = [[] for _ in range(n)]
+    pool = np.arange(len(fleet))
+    for (vehicle_type, prop), group in pd.Series(pool).groupby(
+        [fleet.vehicle_types, fleet.properties], sort=False
+    ):
+        demand = specialised_demand if prop == SPECIALISED else general_demand
+        if demand.sum() <= 0:
+            demand = total
+        # Every cluster with demand on this property gets at least one vehicle of the type
+        floor = (demand > 0).astype(np.intp)
+        if floor.sum() > len(group):
+            floor[:] = 0
+        counts = floor + apportion(len(group) - floor.sum(), demand)
+        for c, chunk in enumerate(np.split(group.to_numpy(), np.cumsum(counts)[:-1])):
+            parts[c].append(chunk)
+    return [np.sort(np.concatenate(p)) if p else np.zeros(0, dtype=np.intp) for p in parts]
+
+
+def too_few_vehicles(fleet, n_clusters):
+    """Reason sharding would starve clusters of a vehicle type (fewer of it than clusters), else None."""
+    types, counts = np.unique(fleet.vehicle_types.astype(str), return_counts=True)
+    if n_clusters > 1 and len(counts) and counts.min() < n_clusters:
+        return (f"{counts.min()} {types[counts.argmin()]} vehicle(s) for {n_clusters} clusters; "
+                f"sharding needs at least one vehicle of each type per cluster")
+    return None
+
+
+def _fleet_arrays(fleet, idx):
+    return (
+        fleet.vehicle_ids[idx], fleet.vehicle_types[idx], fleet.properties[idx],
+        fleet.capacity_kg[idx], fleet.capacity_L[idx],
+        fleet.remaining_kg[idx], fleet.remaining_L[idx], fleet.used[idx],
+    )
+
+
+def pack_shard(fleet_arrays, load_types, weights, volumes, mode):
+    """One cluster's orders on its share of the fleet (runs in a worker process)."""
+    fleet = FleetState(*fleet_arrays)
+    started = time.perf_counter()
+    assigned = pack(fleet, load_types, weights, volumes, mode=mode)
+    return assigned, fleet.remaining_kg, fleet.remaining_L, fleet.used, time.perf_counter() - started
+
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers):
+    """Shared worker pool; forkserver so workers never inherit the server's threads."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("forkserver"))
+            _pool_workers = workers
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def run_shards(jobs, workers, use_pool):
+    if not use_pool or workers <= 1 or len(jobs) <= 1:
+        return [pack_shard(*job) for job in jobs], "in_process"
+    try:
+        pool = get_pool(workers)
+        return list(pool.map(pack_shard, *zip(*jobs))), "process_pool"
+    except BrokenProcessPool:
+        print("⚠️ Assignment worker pool died; packing shards in-process")
+        traceback.print_exc()
+        _reset_pool()
+        return [pack_shard(*job) for job in jobs], "in_process"
+
+
+def assign_vehicles_sharded(df, vehicle_df, order_index, mode="first_fit", workers=None, min_pool_orders=None):
+    """
+    Sharded counterpart of assign_vehicles(): same columns written into df,
+    same FleetState returned, plus a stats dict.
+
+    Each cluster's orders (kept in planning order) are packed on its own
+    slice of the fleet; orders a shard could not place are then packed in
+    planning order against the whole fleet's remaining capacity. The plan
+    depends only on the orders and the fleet, never on the worker count.
+    """
+    config = _config()
+    workers = int(config["WORKERS"] if workers is None else workers)
+    min_pool_orders = int(config["MIN_POOL_ORDERS"] if min_pool_orders is None else min_pool_orders)
+
+    fleet = vehicle_df if isinstance(vehicle_df, FleetState) else FleetState.from_frame(vehicle_df)
+    ordered = df.loc[order_index, ["Cluster", "Load_Type", "Total_Weight", "Total_Volume"]]
+    load_types = ordered["Load_Type"].to_numpy(dtype=object)
+    weights = ordered["Total_Weight"].to_numpy(dtype=np.float64)
+    volumes = ordered["Total_Volume"].to_numpy(dtype=np.float64)
+
+    started = time.perf_counter()
+    labels, codes, spec_demand, gen_demand = cluster_demand(
+        fleet, ordered["Cluster"].to_numpy(), load_types, weights, volumes
+    )
+    reason = too_few_vehicles(fleet, len(labels))
+    if reason:
+        print(f"⚠️ {reason} (using serial assignment)")
+        fleet = assign_vehicles(df, fleet, order_index, mode=mode)
+        return fleet, {
+            "workers": 1,
+            "runner": "serial",
+            "fallback_reason": reason,
+            "shards": [],
+            "leftovers": 0,
+            "reconciled": 0,
+            "partition_seconds": round(time.perf_counter() - started, 4),
+            "shard_seconds": 0.0,
+            "reconcile_seconds": 0.0,
+        }
+    vehicle_parts = partition_fleet(fleet, spec_demand, gen_demand)
+    order_parts = [np.flatnonzero(codes == c) for c in range(len(labels))]
+    jobs = [
+        (_fleet_arrays(fleet, v), load_types[o], weights[o], volumes[o], mode)
+        for v, o in zip(vehicle_parts, order_parts)
+    ]
+    partition_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    results, runner = run_shards(jobs, workers, len(ordered) >= min_pool_orders)
+    shard_seconds = time.perf_counter() - started
+
+    # === Merge shard results back onto the full fleet ===
+    assigned = np.full(len(ordered), -1, dtype=np.intp)
+    shards = []
+    for label, v, o, (local, rem_kg, rem_L, used, seconds) in zip(labels, vehicle_parts, order_parts, results):
+        hit = local >= 0
+        assigned[o[hit]] = v[local[hit]]
+        fleet.remaining_kg[v] = rem_kg
+        fleet.remaining_L[v] = rem_L
+        fleet.used[v] = used
+        shards.append({
+            "cluster": label.item() if hasattr(label, "item") else label,
+            "orders": int(len(o)),
+            "vehicles": int(len(v)),
+            "assigned": int(hit.sum()),
+            "seconds": round(seconds, 4),
+        })
+
+    # === Reconcile: leftovers in planning order against the remaining fleet ===
+    started = time.perf_counter()
+    leftover = np.flatnonzero(assigned < 0)
+    if len(leftover):
+        placed = pack(fleet, load_types[leftover], weights[leftover], volumes[leftover], mode=mode)
+        assigned[leftover] = placed
+    reconcile_seconds = time.perf_counter() - started
+
+    write_assignment(df, order_index, fleet, assigned)
+    return fleet, {
+        "workers": workers if runner == "process_pool" else 1,
+        "runner": runner,
+        "shards": shards,
+        "leftovers": int(len(leftover)),
+        "reconciled": int((assigned[leftover] >= 0).sum()) if len(leftover) else 0,
+        "partition_seconds": round(partition_seconds, 4),
+        "shard_seconds": round(shard_seconds, 4),
+        "reconcile_seconds": round(reconcile_seconds, 4),
+    }
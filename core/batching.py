@@ -0,0 +1,246 @@
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# ⏱️ Micro-batching of small concurrent predict() calls (override with settings.PREDICTION_BATCHING)
+DEFAULT_BATCHING = {
+    "ENABLED": True,
+    "WINDOW_MS": 3,         # how long a queued caller waits for others to join its batch
+    "MAX_ROWS": 4096,       # a batch is closed early once it holds this many rows
+    "BYPASS_ROWS": 1024,    # calls this large already amortise the overhead; run them directly
+}
+
+# Queue waits kept per batcher for the percentile report
+WAIT_SAMPLES = 2048
+
+
+class _Pending:
+    __slots__ = ("model", "method", "X", "rows", "key", "enqueued", "done", "result", "error")
+
+    def __init__(self, model, method, X):
+        self.model = model
+        self.method = method
+        self.X = X
+        self.rows = len(X)
+        columns = tuple(X.columns) if isinstance(X, pd.DataFrame) else None
+        self.key = (id(model), method, columns)
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class PredictionBatcher:
+    """
+    Groups predict() calls that arrive within `window_ms` of each other into
+    one call on the shared model, then hands each caller its own slice back.
+    Row-wise models (forests, KNN, scalers) give the same output per row
+    whether a row is scored alone or in a batch, so callers see no difference
+    apart from the wait for their batch.
+
+    A call that finds no other call in flight runs directly on the caller's
+    thread, so an idle server pays no window. Calls that arrive while others
+    are running or queued go to a single collector thread, which opens a
+    window for them; callers block on their own event. Calls of `bypass_rows`
+    rows or more skip the queue.
+    """
+
+    def __init__(self, name, window_ms=3, max_rows=4096, bypass_rows=1024):
+        self.name = name
+        self.window = window_ms / 1000.0
+        self.max_rows = max_rows
+        self.bypass_rows = bypass_rows
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # Calls between entering predict() and getting their result (direct or queued)
+        self._in_flight = 0
+
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.direct_requests = 0
+        self.idle_requests = 0
+        self.batches = 0
+        self.batched_rows = 0
+        self.max_batch_rows = 0
+        self.max_batch_requests = 0
+        self.fallbacks = 0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+
+    def predict(self, model, X, method="predict"):
+        if len(X) >= self.bypass_rows or self.window <= 0:
+            with self._stats_lock:
+                self.requests += 1
+                self.direct_requests += 1
+            return getattr(model, method)(X)
+
+        with self._stats_lock:
+            busy = self._in_flight > 0
+            self._in_flight += 1
+            if not busy:
+                self.requests += 1
+                self.idle_requests += 1
+        try:
+            if not busy:
+                return getattr(model, method)(X)
+
+            item = _Pending(model, method, X)
+            self._ensure_thread()
+            self._queue.put(item)
+            item.done.wait()
+            if item.error is not None:
+                raise item.error
+            return item.result
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+
+    def _ensure_thread(self):
+        # Started lazily so forked server workers each get their own collector
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(
+                        target=self._collect, name=f"batcher-{self.name}", daemon=True
+                    )
+                    self._thread.start()
+
+    def _collect(self):
+        while True:
+            first = self._queue.get()
+            batch, rows = [first], first.rows
+            deadline = first.enqueued + self.window
+            while rows < self.max_rows:
+                # Under backlog the deadline has already passed: still take
+                # everything that is waiting, just don't wait for more.
+                timeout = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+                rows += item.rows
+            try:
+                self._run(batch)
+            except Exception as e:
+                traceback.print_exc()
+                for item in batch:
+                    if not item.done.is_set():
+                        item.error = e
+                        item.done.set()
+
+    def _run(self, batch):
+        started = time.perf_counter()
+        groups = {}
+        for item in batch:
+            groups.setdefault(item.key, []).append(item)
+
+        for items in groups.values():
+            self._run_group(items)
+
+        with self._stats_lock:
+            self.requests += len(batch)
+            self.batches += 1
+            rows = sum(item.rows for item in batch)
+            self.batched_rows += rows
+            self.max_batch_rows = max(self.max_batch_rows, rows)
+            self.max_batch_requests = max(self.max_batch_requests, len(batch))
+            self._waits.extend(started - item.enqueued for item in batch)
+
+    def _run_group(self, items):
+        first = items[0]
+        if len(items) == 1:
+            try:
+                first.result = getattr(first.model, first.method)(first.X)
+            except Exception as e:
+                first.error = e
+            first.done.set()
+            return
+
+        if isinstance(first.X, pd.DataFrame):
+            X = pd.concat([item.X for item in items], ignore_index=True)
+        else:
+            X = np.concatenate([np.asarray(item.X) for item in items])
+
+        try:
+            out = getattr(first.model, first.method)(X)
+        except Exception:
+            # One bad input must not fail its neighbours: score each call on its own
+            with self._stats_lock:
+                self.fallbacks += 1
+            for item in items:
+                try:
+                    item.result = getattr(item.model, item.method)(item.X)
+                except Exception as e:
+                    item.error = e
+                item.done.set()
+            return
+
+        offsets = np.cumsum([0] + [item.rows for item in items])
+        for item, start, end in zip(items, offsets[:-1], offsets[1:]):
+            item.result = out[start:end]
+            item.done.set()
+
+    def stats(self):
+        with self._stats_lock:
+            waits = np.array(self._waits) * 1000.0
+            batched_requests = self.requests - self.direct_requests - self.idle_requests
+            return {
+                "window_ms": self.window * 1000.0,
+                "max_rows": self.max_rows,
+                "bypass_rows": self.bypass_rows,
+                "requests": self.requests,
+                "direct_requests": self.direct_requests,
+                "idle_requests": self.idle_requests,
+                "batches": self.batches,
+                "fallbacks": self.fallbacks,
+                "mean_batch_requests": round(batched_requests / self.batches, 3) if self.batches else None,
+                "mean_batch_rows": round(self.batched_rows / self.batches, 3) if self.batches else None,
+                "max_batch_requests": self.max_batch_requests,
+                "max_batch_rows": self.max_batch_rows,
+                "queue_wait_ms": {
+                    "mean": round(float(waits.mean()), 3),
+                    "p50": round(float(np.percentile(waits, 50)), 3),
+                    "p95": round(float(np.percentile(waits, 95)), 3),
+                    "max": round(float(waits.max()), 3),
+                } if len(waits) else None,
+            }
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def _config():
+    try:
+        from django.conf import settings
+        return {**DEFAULT_BATCHING, **getattr(settings, "PREDICTION_BATCHING", {})}
+    except Exception:
+        return dict(DEFAULT_BATCHING)
+
+
+def get_batcher(name):
+    batcher = _batchers.get(name)
+    if batcher is None:
+        with _batchers_lock:
+            batcher = _batchers.get(name)
+            if batcher is None:
+                config = _config()
+                window = config["WINDOW_MS"] if config["ENABLED"] else 0
+                batcher = PredictionBatcher(name, window, config["MAX_ROWS"], config["BYPASS_ROWS"])
+                _batchers[name] = batcher
+    return batcher
+
+
+def predict_batched(name, model, X, method="predict"):
+    """model.<method>(X), micro-batched with other concurrent calls for the same model `name`."""
+    return get_batcher(name).predict(model, X, method)
+
+
+def batching_stats():
+    return {name: batcher.stats() for name, batcher in _batchers.items()}
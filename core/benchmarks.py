@@ -0,0 +1,314 @@
+import contextlib
+import io
+import json
+import os
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from rest_framework.renderers import JSONRenderer
+
+from .file_handler import MASTER_PATH, load_product_master, product_master, prepare_orders
+from .model_registry import registry, BASE_DIR
+from .ml_utils import load_priority_model_and_encoder, predict_priority
+from .prediction_cache import get_prediction_cache, predict_memoized
+from .cluster_engine import assign_clusters
+from .dispatch import (
+    CLUSTER_FEATURES, FINAL_COLUMNS, base_vehicles, planning_order, score_and_cluster, _memoized_knn
+)
+from .vehicle_assignment import MAX_FLEET_SIZE, assign_vehicles, build_vehicle_pool
+from .ml_handlers.rl_utils import convert_used_to_available, process_batch_allocations_qtable
+from .ml_handlers import sop_logic  # noqa: F401  (registers "sop_policy")
+
+# 📏 Named input sizes for `python manage.py benchmark --scales`
+SCALES = {"1k": 1000, "10k": 10000, "100k": 100000, "1m": 1000000}
+DEFAULT_SCALES = ["1k", "10k", "100k"]
+
+# 📉 A stage/scale is a regression when its median wall time grows by more than
+# THRESHOLD over the baseline and by more than NOISE_FLOOR_SECONDS in absolute terms
+DEFAULT_THRESHOLD = 0.25
+NOISE_FLOOR_SECONDS = 0.005
+BASELINE_PATH = os.path.join(BASE_DIR, "var", "benchmarks", "baseline.json")
+
+# Rows used to warm each stage up (model loads, compiled forests) before timing
+WARMUP_ROWS = 1000
+
+ZONES = ['A1', 'B1', 'C1', 'A2', 'B2', 'C2', 'A3', 'B3', 'C3']
+
+
+# === Synthetic inputs drawn from the product master ===
+
+def master_products(path=MASTER_PATH):
+    return load_product_master(path)
+
+
+def upload_orders(master, n, rng):
+    """/api/data/ order rows for real Product_IDs, with dispatch / delivery dates over one month."""
+    pick = rng.integers(0, len(master), n)
+    dispatch = np.datetime64("2025-07-01") + rng.integers(0, 30, n).astype("timedelta64[D]")
+    delivery = dispatch + rng.integers(0, 10, n).astype("timedelta64[D]")
+    return pd.DataFrame({
+        "Assignment_ID": np.arange(n).astype(str),
+        "Product_ID": master["Product_ID"].to_numpy()[pick],
+        "Quantity_Assigned": rng.integers(1, 50, n),
+        "Unit_Weight_(kg)": master["Unit_Weight_kg"].to_numpy()[pick],
+        "Unit_Volume_(L)": master["Unit_Volume_L"].to_numpy()[pick],
+        "Urgent_Flag": rng.integers(0, 2, n),
+        "Dispatch_Window": np.datetime_as_string(dispatch, unit="D").astype(object),
+        "Delivery_Window": np.datetime_as_string(delivery, unit="D").astype(object),
+        "Fragile_Flag": master["Fragile_Flag"].to_numpy()[pick],
+        "Temp_Sensitive_Flag": master["Temp_Sensitive_Flag"].to_numpy()[pick],
+        "Zone": rng.choice(["A", "B", "C"], n).astype(object),
+        "Rack": rng.integers(1, 20, n),
+        "UID": rng.integers(1000, 9999, n),
+        "Vehicle_No": rng.choice(["MH12AB1234", "GJ01XY9999", "KA03MN4321"], n).astype(object),
+    })
+
+
+def dispatch_orders(master, n, rng):
+    """/api/dispatch/ order rows: product weights / volumes and tags from the master, 1-50 units each."""
+    pick = rng.integers(0, len(master), n)
+    qty = rng.integers(1, 50, n)
+    products = master.iloc[pick]
+    shelf = pd.to_datetime(products["Expiry_Date"]) - pd.to_datetime(products["Manufacture_Date"])
+    return pd.DataFrame({
+        "Product_ID": products["Product_ID"].to_numpy(),
+        "Product_Name": products["Product_Name"].to_numpy(),
+        "Product_Category": products["Product_ID"].str.split("-").str[0].to_numpy(),
+        "Quantity_Dispatched": qty,
+        "Total_Weight": np.round(qty * products["Unit_Weight_kg"].to_numpy(), 2),
+        "Total_Volume": np.round(qty * products["Unit_Volume_L"].to_numpy(), 2),
+        "Fragility_Tag": products["Fragile_Flag"].to_numpy(),
+        "Temp_Tag": products["Temp_Sensitive_Flag"].to_numpy(),
+        "Expiry_Duration_Months": np.maximum(1, (shelf.dt.days.to_numpy() // 30)),
+        "Dispatch_Duration_Days": rng.integers(1, 30, n),
+    })
+
+
+def sop_requests(n, rng):
+    """/api/sop/ rows: urgency / handling tags, demand and the zone fill levels."""
+    frame = pd.DataFrame({
+        "urgency": rng.choice(["Low", "Medium", "High"], n).astype(object),
+        "fragile": rng.integers(0, 2, n),
+        "temp": rng.integers(0, 2, n),
+        "capacity_required": rng.integers(1, 40, n),
+    })
+    for zone in ZONES:
+        frame[f"{zone}_used"] = rng.integers(0, 60, n)
+    return frame
+
+
+def fleet_for(n):
+    """A default-template fleet big enough to carry most of `n` orders (≈25 orders per vehicle)."""
+    per_type = int(min(max(4, n // 150), MAX_FLEET_SIZE // len(base_vehicles)))
+    return build_vehicle_pool(base_vehicles, per_type)
+
+
+# === Stages ===
+# Each stage's prepare(master, n, rng) builds its inputs (untimed) and returns
+# the zero-argument call that is timed.
+
+def _clear_memo(*names):
+    for name in names:
+        get_prediction_cache(name).clear()
+
+
+def stage_data_enrichment(master, n, rng):
+    features = product_master.snapshot().features
+    orders = upload_orders(master, n, rng)
+    return lambda: prepare_orders(orders, features)
+
+
+def stage_predict_priority(master, n, rng):
+    model, encoder = load_priority_model_and_encoder()
+    prepared = prepare_orders(upload_orders(master, n, rng), product_master.snapshot().features)
+
+    def run():
+        _clear_memo("priority_model")
+        return predict_priority(prepared.copy(), model, encoder)
+    return run
+
+
+def _scored_dispatch(master, n, rng):
+    df = dispatch_orders(master, n, rng)
+    score_and_cluster(df, "exact")
+    return df
+
+
+def stage_dispatch_priority(master, n, rng):
+    model = registry.get("dispatch_priority")
+    X = dispatch_orders(master, n, rng)[list(model.feature_names_in_)]
+
+    def run():
+        _clear_memo("dispatch_priority")
+        return predict_memoized("dispatch_priority", model, X)
+    return run
+
+
+def stage_knn_clustering(master, n, rng):
+    scaler = registry.get("dispatch_scaler")
+    knn = registry.get("dispatch_knn")
+    features = _scored_dispatch(master, n, rng)[CLUSTER_FEATURES]
+
+    def run():
+        _clear_memo("dispatch_knn")
+        return assign_clusters(features, scaler, knn, predict=_memoized_knn)
+    return run
+
+
+def stage_vehicle_assignment(master, n, rng):
+    df = _scored_dispatch(master, n, rng)
+    order = planning_order(df)
+    vehicles = fleet_for(n)
+    return lambda: assign_vehicles(df.copy(), vehicles, order)
+
+
+def stage_sop_allocation(master, n, rng):
+    policy = registry.get("sop_policy")
+    requests = sop_requests(n, rng)
+    available = convert_used_to_available({zone: int(requests[f"{zone}_used"].iloc[0]) for zone in ZONES})
+    return lambda: process_batch_allocations_qtable(requests, policy, available)
+
+
+def stage_response_serialization(master, n, rng):
+    df = _scored_dispatch(master, n, rng)
+    df["Assignment_Status"] = "Assigned"
+    df["Assigned_Vehicle_ID"] = "MEDIUM_001"
+    renderer = JSONRenderer()
+    return lambda: renderer.render({"columns": FINAL_COLUMNS, "data": df[FINAL_COLUMNS].values.tolist()})
+
+
+STAGES = {
+    "data_enrichment": stage_data_enrichment,
+    "predict_priority": stage_predict_priority,
+    "dispatch_priority": stage_dispatch_priority,
+    "knn_clustering": stage_knn_clustering,
+    "vehicle_assignment": stage_vehicle_assignment,
+    "sop_allocation": stage_sop_allocation,
+    "response_serialization": stage_response_serialization,
+}
+
+
+# === Runner ===
+
+@contextlib.contextmanager
+def _quiet(enabled):
+    """The handlers print previews on every call; keep them out of the timings and the report."""
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def measure(call, repeat):
+    """Wall times of `repeat` untraced calls, then one traced call for peak Python-heap memory."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        call()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def run_benchmarks(stages=None, scales=None, repeat=3, seed=0, quiet=True, log=print):
+    """
+    Time every stage at every scale. Inputs are rebuilt per (stage, scale)
+    from `seed`, so runs are comparable. A stage whose model or input is
+    unavailable is reported as skipped instead of failing the run.
+    """
+    stages = stages or list(STAGES)
+    scales = scales or DEFAULT_SCALES
+    master = master_products()
+    results = {}
+
+    for stage in stages:
+        prepare = STAGES[stage]
+        results[stage] = {}
+        try:
+            with _quiet(quiet):
+                prepare(master, WARMUP_ROWS, np.random.default_rng(seed))()
+        except Exception as e:
+            log(f"⏭️ {stage}: skipped ({type(e).__name__}: {e})")
+            results[stage] = {"skipped": f"{type(e).__name__}: {e}"}
+            continue
+
+        for scale in scales:
+            n = SCALES[scale]
+            with _quiet(quiet):
+                call = prepare(master, n, np.random.default_rng(seed))
+                times, peak = measure(call, repeat)
+            median = float(np.median(times))
+            results[stage][scale] = {
+                "rows": n,
+                "seconds": round(median, 6),
+                "min_seconds": round(min(times), 6),
+                "rows_per_sec": round(n / median, 1) if median > 0 else None,
+                "peak_mb": round(peak / 2 ** 20, 3),
+            }
+            log(f"⏱️ {stage:<24} {scale:>5}  {median * 1000:10.2f} ms  "
+                f"{n / median:14,.0f} rows/s  {peak / 2 ** 20:9.1f} MB peak")
+
+    return {"meta": environment(repeat, seed), "results": results}
+
+
+def environment(repeat, seed):
+    import sklearn
+    return {
+        "created": time.time(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "repeat": repeat,
+        "seed": seed,
+        "models": {name: entry["version"] for name, entry in registry.info().items()},
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD, noise_floor=NOISE_FLOOR_SECONDS):
+    """Per stage/scale ratio against the baseline; returns (rows, regressions)."""
+    rows, regressions = [], []
+    for stage, scales in current["results"].items():
+        base_scales = baseline.get("results", {}).get(stage, {})
+        for scale, entry in scales.items():
+            base = base_scales.get(scale) if isinstance(base_scales, dict) else None
+            if not isinstance(entry, dict) or not isinstance(base, dict):
+                continue
+            ratio = entry["seconds"] / base["seconds"] if base["seconds"] > 0 else float("inf")
+            regressed = ratio > 1 + threshold and entry["seconds"] - base["seconds"] > noise_floor
+            row = {
+                "stage": stage,
+                "scale": scale,
+                "baseline_seconds": base["seconds"],
+                "seconds": entry["seconds"],
+                "ratio": round(ratio, 3),
+                "regressed": regressed,
+            }
+            rows.append(row)
+            if regressed:
+                regressions.append(row)
+    return rows, regressions
+
+
+def save_report(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+
+def load_report(path):
+    with open(path) as f:
+        return json.load(f)
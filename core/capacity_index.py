@@ -0,0 +1,172 @@
+import math
+import random
+
+import numpy as np
+
+
+class CapacityBlocks:
+    """
+    Block index over (remaining_kg, remaining_L) for vehicles in a fixed scan
+    order. The order is cut into ~sqrt(n) blocks and each block keeps the max
+    of both dimensions, so leftmost() masks the block maxima, then scans only
+    the first candidate block(s). A query or update costs O(sqrt(n)) in NumPy
+    instead of O(n).
+    """
+
+    # candidate blocks checked per vectorized step in leftmost()
+    scan_blocks = 8
+
+    def __init__(self, positions, remaining_kg, remaining_L, block_size=None):
+        self.positions = np.asarray(positions, dtype=np.intp)
+        n = len(self.positions)
+        self.block_size = block_size or max(16, int(math.sqrt(max(n, 1))))
+        n_blocks = max(1, -(-n // self.block_size))
+
+        self.kg = np.full(n_blocks * self.block_size, -np.inf)
+        self.L = np.full(n_blocks * self.block_size, -np.inf)
+        self.kg[:n] = np.asarray(remaining_kg, dtype=np.float64)[self.positions]
+        self.L[:n] = np.asarray(remaining_L, dtype=np.float64)[self.positions]
+        self.kg_blocks = self.kg.reshape(n_blocks, self.block_size)
+        self.L_blocks = self.L.reshape(n_blocks, self.block_size)
+        self.block_kg = self.kg_blocks.max(axis=1)
+        self.block_L = self.L_blocks.max(axis=1)
+
+        # vehicle index -> slot in this index (-1 = not covered)
+        self.slot = np.full(len(remaining_kg), -1, dtype=np.intp)
+        self.slot[self.positions] = np.arange(n, dtype=np.intp)
+
+    def __contains__(self, vehicle_idx):
+        return self.slot[vehicle_idx] >= 0
+
+    def update(self, vehicle_idx, remaining_kg, remaining_L):
+        s = self.slot[vehicle_idx]
+        b = s // self.block_size
+        self.kg[s] = remaining_kg
+        self.L[s] = remaining_L
+        self.block_kg[b] = self.kg_blocks[b].max()
+        self.block_L[b] = self.L_blocks[b].max()
+
+    def leftmost(self, weight, volume):
+        """First vehicle in scan order with room for (weight, volume), or -1."""
+        candidates = np.flatnonzero((self.block_kg >= weight) & (self.block_L >= volume))
+        # Block maxima can come from two different vehicles, so a candidate
+        # block may not hold a fit; check candidates a few blocks at a time.
+        for start in range(0, len(candidates), self.scan_blocks):
+            blocks = candidates[start:start + self.scan_blocks]
+            fits = (self.kg_blocks[blocks] >= weight) & (self.L_blocks[blocks] >= volume)
+            k = fits.argmax()
+            if fits.flat[k]:
+                b, offset = divmod(int(k), self.block_size)
+                return int(self.positions[blocks[b] * self.block_size + offset])
+        return -1
+
+
+class _Node:
+    __slots__ = ("key", "L", "max_L", "priority", "left", "right")
+
+    def __init__(self, key, L, priority):
+        self.key = key
+        self.L = self.max_L = L
+        self.priority = priority
+        self.left = self.right = None
+
+    def pull(self):
+        m = self.L
+        if self.left is not None and self.left.max_L > m:
+            m = self.left.max_L
+        if self.right is not None and self.right.max_L > m:
+            m = self.right.max_L
+        self.max_L = m
+
+
+def _split(node, key):
+    """(nodes with key < `key`, nodes with key >= `key`)."""
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        node.pull()
+        return node, right
+    left, node.left = _split(node.left, key)
+    node.pull()
+    return left, node
+
+
+def _merge(left, right):
+    """Join two treaps where every key in `left` is below every key in `right`."""
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        left.pull()
+        return left
+    right.left = _merge(left, right.left)
+    right.pull()
+    return right
+
+
+class CapacityTree:
+    """
+    Vehicles ordered by (remaining kg, vehicle index) in a treap where every
+    node also keeps the max remaining L of its subtree. best_fit() -- the
+    vehicle with the least remaining kg that still has room for both the
+    weight and the volume -- descends to the first key >= weight and skips
+    any subtree whose max L is too small, so queries and updates take
+    O(log n) expected steps however the two capacities are spread.
+    """
+
+    def __init__(self, vehicle_indices, remaining_kg, remaining_L, seed=0):
+        self._rng = random.Random(seed)
+        self.size = 0
+        self.root = None
+        keyed = sorted((float(remaining_kg[i]), int(i)) for i in vehicle_indices)
+        # Cartesian-tree build over the sorted keys: O(n) instead of n inserts
+        spine = []
+        for key in keyed:
+            node = _Node(key, float(remaining_L[key[1]]), self._rng.random())
+            last = None
+            while spine and spine[-1].priority < node.priority:
+                last = spine.pop()
+                last.pull()
+            node.left = last
+            if spine:
+                spine[-1].right = node
+            spine.append(node)
+        for node in reversed(spine):
+            node.pull()
+        if spine:
+            self.root = spine[0]
+        self.size = len(keyed)
+
+    def __len__(self):
+        return self.size
+
+    def best_fit(self, weight, volume):
+        node = self._first_fit(self.root, (weight, -1), volume)
+        return -1 if node is None else node.key[1]
+
+    def _first_fit(self, node, key, volume):
+        """Leftmost node at or after `key` with L >= volume."""
+        while node is not None and node.max_L >= volume:
+            if node.key < key:
+                node = node.right
+                continue
+            found = self._first_fit(node.left, key, volume)
+            if found is not None:
+                return found
+            if node.L >= volume:
+                return node
+            node = node.right
+        return None
+
+    def update(self, vehicle_idx, old_kg, new_kg, new_L):
+        left, rest = _split(self.root, (old_kg, vehicle_idx))
+        node, right = _split(rest, (old_kg, vehicle_idx + 1))
+        node.key = (new_kg, vehicle_idx)
+        node.L = node.max_L = new_L
+        node.left = node.right = None
+        root = _merge(left, right)
+        left, right = _split(root, node.key)
+        self.root = _merge(_merge(left, node), right)
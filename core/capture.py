@@ -0,0 +1,142 @@
+import base64
+import json
+import os
+import random
+import threading
+import time
+
+from django.core.exceptions import MiddlewareNotUsed, RequestDataTooBig
+
+# 🎙️ Sampled capture of incoming API payloads to JSONL, for `python manage.py replay_traffic`
+# (override with settings.REQUEST_CAPTURE)
+#   PATHS          -> request paths recorded (exact match)
+#   SAMPLE_RATE    -> fraction of matching requests recorded
+#   MAX_BODY_BYTES -> larger bodies, and bodies without a Content-Length, are not recorded
+#   MAX_FILE_BYTES -> capture stops once the file reaches this size
+DEFAULT_REQUEST_CAPTURE = {
+    "ENABLED": False,
+    "PATH": os.path.join(os.path.dirname(__file__), '..', 'var', 'captures', 'requests.jsonl'),
+    "PATHS": ["/api/dispatch/", "/api/sop/", "/api/data/"],
+    "SAMPLE_RATE": 0.1,
+    "MAX_BODY_BYTES": 2 * 1024 * 1024,
+    "MAX_FILE_BYTES": 256 * 1024 * 1024,
+}
+
+# Request headers kept with each record (they change how the body is parsed or the response encoded)
+CAPTURED_HEADERS = ["Content-Type", "Content-Encoding", "Accept", "Accept-Encoding"]
+
+# Sent by the replay tool, so replayed traffic is never captured again
+REPLAY_HEADER = "X-Mlapi-Replay"
+
+
+def _config():
+    from django.conf import settings
+    return {**DEFAULT_REQUEST_CAPTURE, **getattr(settings, "REQUEST_CAPTURE", {})}
+
+
+def capture_path():
+    return _config()["PATH"]
+
+
+def encode_body(body):
+    """(text, encoding): UTF-8 bodies as they are, anything else (CSV uploads, gzip) as base64."""
+    try:
+        return body.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        return base64.b64encode(body).decode("ascii"), "base64"
+
+
+def decode_body(record):
+    body = record.get("body") or ""
+    if record.get("body_encoding") == "base64":
+        return base64.b64decode(body)
+    return body.encode("utf-8")
+
+
+class CaptureWriter:
+    """
+    Appends one JSON line per record. Each line goes out in a single write on
+    a file opened for appending; once the file (as seen by any process
+    appending to it) reaches max_bytes, the writer stops for good.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.full = False
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            if self.full:
+                return False
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "ab")
+            if self._file.tell() + len(line) > self.max_bytes:
+                self.full = True
+                print(f"[WARN] 🎙️ Capture file {self.path} reached {self.max_bytes} bytes; capture stopped")
+                return False
+            self._file.write(line)
+            self._file.flush()
+            return True
+
+
+class CaptureMiddleware:
+    """
+    Records a sample of the requests to the configured paths (method, path,
+    query, body and the headers that shape parsing) with the response status
+    and latency. Dropped from the chain unless settings.REQUEST_CAPTURE
+    enables it; unsampled requests cost one random() call.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = _config()
+        if not config["ENABLED"]:
+            raise MiddlewareNotUsed()
+        self.paths = set(config["PATHS"])
+        self.sample_rate = float(config["SAMPLE_RATE"])
+        self.max_body_bytes = int(config["MAX_BODY_BYTES"])
+        self.writer = CaptureWriter(config["PATH"], int(config["MAX_FILE_BYTES"]))
+
+    def _body(self, request):
+        """Raw body when it is small enough to keep (read before the view, which parses it from memory)."""
+        # No Content-Length (e.g. chunked): the size is unknown until the whole body has been read
+        try:
+            length = int(request.META["CONTENT_LENGTH"])
+        except (KeyError, ValueError):
+            return None
+        if length > self.max_body_bytes:
+            return None
+        try:
+            return request.body
+        except RequestDataTooBig:
+            return None
+
+    def __call__(self, request):
+        if (self.writer.full or request.path not in self.paths or request.headers.get(REPLAY_HEADER)
+                or random.random() >= self.sample_rate):
+            return self.get_response(request)
+
+        body = self._body(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        if body is None:
+            return response
+
+        text, encoding = encode_body(body)
+        self.writer.write({
+            "ts": round(time.time(), 3),
+            "method": request.method,
+            "path": request.path,
+            "query": request.META.get("QUERY_STRING", ""),
+            "headers": {name: request.headers[name] for name in CAPTURED_HEADERS if name in request.headers},
+            "body": text,
+            "body_encoding": encoding,
+            "status": response.status_code,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        })
+        return response
@@ -0,0 +1,232 @@
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+# 🧭 /api/dispatch/ cluster engines
+#   exact -> knn.predict on the scaled features (neighbour search over the training set)
+#   fast  -> distilled grid lookup, exact KNN only for rows in cells near a label boundary
+#   grid  -> grid lookup only, no neighbour search at all
+CLUSTER_MODES = ["exact", "fast", "grid"]
+
+CLUSTER_FEATURES = ["Total_Weight", "Total_Volume", "ML_Priority_Score", "Fragility_Tag", "Temp_Tag"]
+CONTINUOUS_FEATURES = ["Total_Weight", "Total_Volume", "ML_Priority_Score"]
+TAG_FEATURES = ["Fragility_Tag", "Temp_Tag"]
+
+# Grid axis per continuous feature (scaled units):
+#   (points across the training range, points in each geometric tail, tail length in training spans)
+# Orders are often far outside the training range on weight / volume, so those axes get long tails;
+# the priority score comes from a forest fitted on the same range and stays inside it.
+GRID_AXES = {
+    "Total_Weight": (48, 16, 12),
+    "Total_Volume": (48, 16, 12),
+    "ML_Priority_Score": (48, 8, 2),
+}
+
+# Rows sampled per region for the build-time agreement report
+REPORT_ROWS = 20000
+
+
+def grid_axis(low, high, core_points, tail_points, tail_spans):
+    span = high - low
+    core = np.linspace(low - 0.1 * span, high + 0.1 * span, core_points)
+    if tail_points == 0:
+        return core
+    step = core[1] - core[0]
+    tail = np.geomspace(step, tail_spans * span, tail_points)
+    return np.concatenate([core[0] - tail[::-1], core, core[-1] + tail])
+
+
+def nearest_point(axis, values):
+    i = np.clip(np.searchsorted(axis, values), 1, len(axis) - 1)
+    return np.where(values - axis[i - 1] <= axis[i] - values, i - 1, i)
+
+
+def boundary_cells(labels):
+    """True where a cell's label differs from any axis neighbour in the continuous dimensions."""
+    mask = np.zeros(labels.shape, dtype=bool)
+    for axis in range(2, labels.ndim):
+        diff = np.diff(labels, axis=axis) != 0
+        lead = [slice(None)] * labels.ndim
+        trail = [slice(None)] * labels.ndim
+        lead[axis] = slice(None, -1)
+        trail[axis] = slice(1, None)
+        mask[tuple(lead)] |= diff
+        mask[tuple(trail)] |= diff
+    return mask
+
+
+class ClusterGrid:
+    """
+    KNN cluster labels precomputed on a grid: one 3-D table (weight x volume
+    x priority, in scaled units) per (Fragility_Tag, Temp_Tag) pair. A lookup
+    snaps each row to its nearest grid point. Cells whose label differs from
+    a neighbour are marked as boundary cells; rows landing there (and rows
+    with tags other than 0/1) are sent back to the exact KNN.
+
+    Built offline by `python manage.py build_cluster_grid`, tied to the
+    checksums of the KNN and scaler it was distilled from.
+    """
+
+    def __init__(self, axes, labels, boundary, knn_checksum, scaler_checksum, report=None):
+        self.axes = axes
+        self.labels = labels
+        self.boundary = boundary
+        self.knn_checksum = knn_checksum
+        self.scaler_checksum = scaler_checksum
+        self.report = report or {}
+
+    @classmethod
+    def build(cls, knn, scaler, knn_checksum, scaler_checksum):
+        features = list(scaler.feature_names_in_)
+        cont = [features.index(f) for f in CONTINUOUS_FEATURES]
+        train = knn._fit_X
+        axes = [grid_axis(train[:, c].min(), train[:, c].max(), *GRID_AXES[f]) for f, c in zip(CONTINUOUS_FEATURES, cont)]
+
+        if knn.classes_.max() > 255:
+            raise ValueError("ClusterGrid stores labels as uint8")
+
+        points = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1).reshape(-1, len(axes))
+        shape = tuple(len(a) for a in axes)
+        labels = np.zeros((2, 2) + shape, dtype=np.uint8)
+        for fragile in (0, 1):
+            for temp in (0, 1):
+                raw = np.zeros((1, len(features)))
+                raw[0, features.index("Fragility_Tag")] = fragile
+                raw[0, features.index("Temp_Tag")] = temp
+                scaled_tags = scaler.transform(pd.DataFrame(raw, columns=features))[0]
+                X = np.repeat(scaled_tags[np.newaxis, :], len(points), axis=0)
+                X[:, cont] = points
+                labels[fragile, temp] = knn.predict(X).reshape(shape)
+
+        return cls(axes, labels, boundary_cells(labels), knn_checksum, scaler_checksum)
+
+    def cells(self, scaled, fragile, temp):
+        """Grid cell of each row; rows whose tags are not 0/1 get fragile = -1."""
+        idx = [nearest_point(axis, scaled[:, i]) for i, axis in enumerate(self.axes)]
+        tags_ok = np.isin(fragile, (0, 1)) & np.isin(temp, (0, 1))
+        f = np.where(tags_ok, fragile, 0).astype(np.intp)
+        t = np.where(tags_ok, temp, 0).astype(np.intp)
+        return (f, t, *idx), tags_ok
+
+    def lookup(self, scaled, fragile, temp):
+        """(labels, needs_exact mask) for scaled continuous features + raw 0/1 tags."""
+        cell, tags_ok = self.cells(scaled, fragile, temp)
+        return self.labels[cell], self.boundary[cell] | ~tags_ok
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            labels=self.labels,
+            boundary=self.boundary,
+            **{f"axis_{i}": axis for i, axis in enumerate(self.axes)},
+            meta=np.array(json.dumps({
+                "knn_checksum": self.knn_checksum,
+                "scaler_checksum": self.scaler_checksum,
+                "report": self.report,
+            }))
+        )
+
+    def to_dict(self):
+        return {
+            "shape": list(self.labels.shape),
+            "boundary_cells": round(float(self.boundary.mean()), 4),
+            "knn_version": self.knn_checksum[:12],
+            "report": self.report,
+        }
+
+
+def load_cluster_grid(path):
+    with np.load(path) as data:
+        meta = json.loads(str(data["meta"]))
+        axes = [data[f"axis_{i}"] for i in range(len(CONTINUOUS_FEATURES))]
+        return ClusterGrid(
+            axes, data["labels"], data["boundary"], meta["knn_checksum"], meta["scaler_checksum"], meta.get("report")
+        )
+
+
+def scale_features(df, scaler):
+    """
+    StandardScaler.transform without sklearn's per-call validation: the same
+    float64 subtract / divide, so the values are identical.
+    """
+    X = df[list(scaler.feature_names_in_)].to_numpy(dtype=np.float64, copy=True)
+    if scaler.with_mean:
+        X -= scaler.mean_
+    if scaler.with_std:
+        X /= scaler.scale_
+    return X
+
+
+def _knn_predict(model, X):
+    return model.predict(X)
+
+
+def assign_clusters(df, scaler, knn, grid=None, mode="exact", predict=_knn_predict):
+    """
+    Cluster label per row of `df` (the cluster feature columns) and a stats
+    dict. exact runs the KNN on every row; fast / grid use the grid, and fast
+    sends boundary cells (and tags other than 0/1) to the KNN as well.
+    `predict(model, X)` runs the KNN.
+    """
+    if grid is None or mode == "exact":
+        return predict(knn, scaler.transform(df[list(scaler.feature_names_in_)])), {"rows_exact": len(df)}
+
+    scaled = scale_features(df, scaler)
+    features = list(scaler.feature_names_in_)
+    cont = scaled[:, [features.index(f) for f in CONTINUOUS_FEATURES]]
+    labels, needs_exact = grid.lookup(cont, df["Fragility_Tag"].to_numpy(), df["Temp_Tag"].to_numpy())
+    labels = labels.astype(knn.classes_.dtype)
+
+    # Tags other than 0/1 have no table: always exact
+    if mode == "grid":
+        tags = df[TAG_FEATURES].to_numpy()
+        needs_exact = ~np.isin(tags, (0, 1)).all(axis=1)
+    if needs_exact.any():
+        labels[needs_exact] = predict(knn, scaled[needs_exact])
+    return labels, {"rows_grid": int((~needs_exact).sum()), "rows_exact": int(needs_exact.sum())}
+
+
+def agreement_report(grid, knn, scaler, order_frames=None, rows=REPORT_ROWS, seed=0):
+    """
+    Agreement of the grid and fast engines with the exact KNN, with timings,
+    on the training points, on uniform samples over the training range and
+    the whole grid domain, and on any {label: order frame} given (raw units).
+    """
+    rng = np.random.default_rng(seed)
+    features = list(scaler.feature_names_in_)
+    train = pd.DataFrame(scaler.inverse_transform(knn._fit_X), columns=features)
+    train[TAG_FEATURES] = train[TAG_FEATURES].round()
+
+    def uniform(bounds):
+        frame = pd.DataFrame({name: rng.integers(0, 2, rows).astype(float) for name in features})
+        for axis, name in zip(grid.axes, CONTINUOUS_FEATURES):
+            j = features.index(name)
+            low, high = bounds(axis, knn._fit_X[:, j])
+            frame[name] = rng.uniform(low, high, rows) * scaler.scale_[j] + scaler.mean_[j]
+        return frame
+
+    samples = {
+        "training_points": train,
+        "uniform_training_range": uniform(lambda axis, col: (col.min(), col.max())),
+        "uniform_grid_domain": uniform(lambda axis, col: (axis[0], axis[-1])),
+    }
+    for label, frame in (order_frames or {}).items():
+        samples[label] = frame[features]
+
+    report = {}
+    for name, frame in samples.items():
+        entry = {"rows": len(frame)}
+        exact = None
+        for mode in CLUSTER_MODES:
+            started = time.perf_counter()
+            labels, stats = assign_clusters(frame, scaler, knn, grid, mode)
+            entry[f"{mode}_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            if mode == "exact":
+                exact = labels
+                continue
+            entry[f"{mode}_agreement"] = round(float((labels == exact).mean()), 5)
+            entry[f"{mode}_exact_share"] = round(stats["rows_exact"] / max(len(frame), 1), 5)
+        report[name] = entry
+    return report
@@ -0,0 +1,312 @@
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .vehicle_assignment import write_assignment
+
+# ⏳ Anytime consolidation of a packed plan (override with settings.DISPATCH_OPTIMIZER)
+#   DEFAULT_TIME_BUDGET_MS -> budget for {"optimize": true}
+#   MAX_TIME_BUDGET_MS     -> cap on a caller-supplied "time_budget_ms"
+DEFAULT_OPTIMIZER = {
+    "DEFAULT_TIME_BUDGET_MS": 200,
+    "MAX_TIME_BUDGET_MS": 10000,
+}
+
+# Vehicles tried when making room for an order, and how deep a chain of moves may go
+# (1 = the orders in the way may move elsewhere, but not push others out in turn)
+CANDIDATE_VEHICLES = 8
+EJECTION_DEPTH = 1
+# Random relocations applied when no improving step is left, before trying again
+KICK_MOVES = 3
+# Full rounds over the unassigned orders and used vehicles without an improvement before stopping early
+STALL_ROUNDS = 20
+
+EPS = 1e-9
+
+
+def _config():
+    return {**DEFAULT_OPTIMIZER, **getattr(settings, "DISPATCH_OPTIMIZER", {})}
+
+
+def optimize_budget(option):
+    """
+    Seconds of search for a request's "optimize" value, or None to skip it.
+    Accepts true / false or {"time_budget_ms": n}; raises ValueError otherwise.
+    """
+    if option is None or option is False:
+        return None
+    config = _config()
+    if option is True:
+        budget_ms = config["DEFAULT_TIME_BUDGET_MS"]
+    elif isinstance(option, dict):
+        budget_ms = option.get("time_budget_ms", config["DEFAULT_TIME_BUDGET_MS"])
+    else:
+        raise ValueError("'optimize' must be true / false or {\"time_budget_ms\": n}")
+
+    try:
+        budget_ms = float(budget_ms)
+    except (TypeError, ValueError):
+        raise ValueError("'optimize.time_budget_ms' must be a number")
+    if not 0 < budget_ms <= config["MAX_TIME_BUDGET_MS"]:
+        raise ValueError(f"'optimize.time_budget_ms' must be between 0 and {config['MAX_TIME_BUDGET_MS']}")
+    return budget_ms / 1000.0
+
+
+class Consolidator:
+    """
+    Local search over a packed plan, seeded with the greedy assignment.
+
+    Two improving steps are tried until the deadline:
+      insert -> place an unassigned order, first moving orders out of a
+                vehicle into the others to make room for it
+      close  -> empty a lightly loaded vehicle into the other used ones
+    A step is a chain of single-order moves under the kg / L limits and the
+    TF-on-Specialised rule; it is either applied whole or undone. No step
+    ever unassigns an order, so the current plan is always the best so far:
+    more orders assigned first, then fewer vehicles used. When neither step
+    finds anything, a few random relocations and swaps between vehicles
+    shift the slack around before retrying.
+    """
+
+    def __init__(self, fleet, load_types, weights, volumes, assigned, seed=0):
+        self.capacity_kg = fleet.capacity_kg
+        self.capacity_L = fleet.capacity_L
+        self.remaining_kg = fleet.remaining_kg.copy()
+        self.remaining_L = fleet.remaining_L.copy()
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.volumes = np.asarray(volumes, dtype=np.float64)
+        self.assigned = np.asarray(assigned, dtype=np.intp).copy()
+        self.specialised_only = np.asarray(load_types, dtype=object) == "TF"
+        self.anywhere = np.ones(len(fleet), dtype=bool)
+        self.specialised = fleet.specialised_mask
+        self.rng = np.random.default_rng(seed)
+
+        self.loads = [set() for _ in range(len(fleet))]
+        for order, vehicle in enumerate(self.assigned):
+            if vehicle >= 0:
+                self.loads[vehicle].add(order)
+        self.counts = np.array([len(orders) for orders in self.loads], dtype=np.intp)
+        self.log = []
+        self.moves = 0
+
+    # === Single-order moves, logged so a failed step can be undone ===
+    def _move(self, order, vehicle):
+        source = self.assigned[order]
+        w, v = self.weights[order], self.volumes[order]
+        if source >= 0:
+            self.remaining_kg[source] += w
+            self.remaining_L[source] += v
+            self.loads[source].discard(order)
+            self.counts[source] -= 1
+        if vehicle >= 0:
+            self.remaining_kg[vehicle] -= w
+            self.remaining_L[vehicle] -= v
+            self.loads[vehicle].add(order)
+            self.counts[vehicle] += 1
+        self.assigned[order] = vehicle
+        self.log.append((order, source))
+
+    def _undo(self, mark):
+        while len(self.log) > mark:
+            order, source = self.log.pop()
+            self._move(order, source)
+            self.log.pop()
+
+    def _allowed(self, order):
+        return self.specialised if self.specialised_only[order] else self.anywhere
+
+    def _fits(self, order, vehicle):
+        return (self.remaining_kg[vehicle] + EPS >= self.weights[order]
+                and self.remaining_L[vehicle] + EPS >= self.volumes[order])
+
+    def _relocate(self, order, exclude, depth, used_only=True):
+        """Move `order` to another vehicle, best fit first; with depth > 0 other orders may be moved out of the way."""
+        w, v = self.weights[order], self.volumes[order]
+        mask = self._allowed(order) & (self.remaining_kg + EPS >= w) & (self.remaining_L + EPS >= v)
+        if used_only:
+            mask &= self.counts > 0
+        mask[list(exclude)] = False
+        targets = np.flatnonzero(mask)
+        if len(targets):
+            self._move(order, targets[np.argmin(self.remaining_kg[targets])])
+            return True
+        if depth == 0:
+            return False
+
+        mask = self._allowed(order) & (self.counts > 0) & (self.capacity_kg >= w) & (self.capacity_L >= v)
+        mask[list(exclude)] = False
+        candidates = np.flatnonzero(mask)
+        if len(candidates) > CANDIDATE_VEHICLES:
+            candidates = self.rng.choice(candidates, CANDIDATE_VEHICLES, replace=False)
+        for vehicle in candidates:
+            mark = len(self.log)
+            if self._make_room(vehicle, order, exclude | {vehicle}, depth - 1):
+                self._move(order, vehicle)
+                return True
+            self._undo(mark)
+        return False
+
+    def _make_room(self, vehicle, order, exclude, depth):
+        residents = list(self.loads[vehicle])
+        self.rng.shuffle(residents)
+        for resident in residents:
+            if self._fits(order, vehicle):
+                return True
+            self._relocate(resident, exclude, depth)
+        return self._fits(order, vehicle)
+
+    # === Improving steps ===
+    def insert(self, order):
+        mark = len(self.log)
+        allowed = self._allowed(order)
+        if (self.remaining_kg[allowed].sum() + EPS < self.weights[order]
+                or self.remaining_L[allowed].sum() + EPS < self.volumes[order]):
+            return False
+        if self._relocate(order, set(), EJECTION_DEPTH, used_only=False):
+            return True
+        self._undo(mark)
+        return False
+
+    def close(self, vehicle):
+        mark = len(self.log)
+        residents = sorted(self.loads[vehicle], key=lambda o: -self.weights[o] / self.capacity_kg[vehicle])
+        for order in residents:
+            if not self._relocate(order, {vehicle}, EJECTION_DEPTH):
+                self._undo(mark)
+                return False
+        return True
+
+    def _close_candidate(self, tried):
+        used = np.flatnonzero(self.counts > 0)
+        used = used[~np.isin(used, list(tried))]
+        if len(used) < 1 or (self.counts > 0).sum() < 2:
+            return None
+        fill = np.maximum(
+            1 - self.remaining_kg[used] / self.capacity_kg[used], 1 - self.remaining_L[used] / self.capacity_L[used]
+        )
+        lightest = used[np.argsort(fill, kind="stable")[:3]]
+        return int(self.rng.choice(lightest))
+
+    def _swap(self, a, b):
+        """Exchange two placed orders between their vehicles if both still fit; False otherwise."""
+        va, vb = self.assigned[a], self.assigned[b]
+        if va == vb or not (self._allowed(a)[vb] and self._allowed(b)[va]):
+            return False
+        dw, dv = self.weights[b] - self.weights[a], self.volumes[b] - self.volumes[a]
+        if (self.remaining_kg[va] + EPS < dw or self.remaining_L[va] + EPS < dv
+                or self.remaining_kg[vb] + EPS < -dw or self.remaining_L[vb] + EPS < -dv):
+            return False
+        self._move(a, -1)
+        self._move(b, va)
+        self._move(a, vb)
+        return True
+
+    def _kick(self):
+        """Neutral random relocations / swaps between used vehicles, to shift where the slack sits."""
+        placed = np.flatnonzero(self.assigned >= 0)
+        if len(placed) < 2:
+            return
+        for order in self.rng.choice(placed, min(KICK_MOVES, len(placed)), replace=False):
+            mask = self._allowed(order) & (self.counts > 0) & (self.remaining_kg + EPS >= self.weights[order]) \
+                & (self.remaining_L + EPS >= self.volumes[order])
+            mask[self.assigned[order]] = False
+            targets = np.flatnonzero(mask)
+            if len(targets) and self.rng.random() < 0.5:
+                self._move(order, int(self.rng.choice(targets)))
+            else:
+                self._swap(order, int(self.rng.choice(placed)))
+
+    def run(self, deadline):
+        """Search until time.perf_counter() passes `deadline` (or nothing improves for STALL_ROUNDS rounds)."""
+        pending = deque(np.flatnonzero(self.assigned < 0).tolist())
+        failed, tried = [], set()
+        iterations = stall = inserted = closed = 0
+        stopped = "deadline"
+
+        while time.perf_counter() < deadline:
+            if stall > STALL_ROUNDS * (len(pending) + len(failed) + int((self.counts > 0).sum()) + 1):
+                stopped = "converged"
+                break
+            iterations += 1
+            self.log = []
+
+            if pending:
+                order = pending.popleft()
+                if self.insert(order):
+                    inserted += 1
+                    stall = 0
+                    tried.clear()
+                else:
+                    failed.append(order)
+                    stall += 1
+                self.moves += len(self.log)
+                continue
+
+            vehicle = self._close_candidate(tried)
+            if vehicle is not None:
+                if self.close(vehicle):
+                    closed += 1
+                    stall = 0
+                    tried.clear()
+                    pending.extend(failed)
+                    failed = []
+                else:
+                    tried.add(vehicle)
+                    stall += 1
+                self.moves += len(self.log)
+                continue
+
+            self._kick()
+            self.moves += len(self.log)
+            pending.extend(failed)
+            failed, tried = [], set()
+            stall += 1
+
+        self.log = []
+        return {"iterations": iterations, "inserted": inserted, "closed": closed, "stopped": stopped}
+
+
+def _plan_stats(assigned, counts):
+    return {"vehicles_used": int((counts > 0).sum()), "orders_assigned": int((assigned >= 0).sum())}
+
+
+def consolidate_plan(df, order_index, fleet, time_budget, seed=0):
+    """
+    Improve the assignment already written to `df` (and `fleet`) for up to
+    `time_budget` seconds. Rewrites both in place when the plan got better
+    and returns the optimizer report.
+    """
+    started = time.perf_counter()
+    ordered = df.loc[order_index, ["Load_Type", "Total_Weight", "Total_Volume", "Assigned_Vehicle_ID"]]
+    assigned = pd.Index(fleet.vehicle_ids).get_indexer(ordered["Assigned_Vehicle_ID"])
+    search = Consolidator(
+        fleet, ordered["Load_Type"].to_numpy(), ordered["Total_Weight"].to_numpy(),
+        ordered["Total_Volume"].to_numpy(), assigned, seed
+    )
+    greedy = _plan_stats(search.assigned, search.counts)
+    report = search.run(started + time_budget)
+    optimized = _plan_stats(search.assigned, search.counts)
+
+    improved = (optimized["orders_assigned"], -optimized["vehicles_used"]) > \
+        (greedy["orders_assigned"], -greedy["vehicles_used"])
+    if improved:
+        write_assignment(df, order_index, fleet, search.assigned)
+        fleet.remaining_kg[:] = search.remaining_kg
+        fleet.remaining_L[:] = search.remaining_L
+        fleet.used[:] = search.counts > 0
+
+    return {
+        "time_budget_ms": round(time_budget * 1000, 3),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        **report,
+        "moves": search.moves,
+        "greedy": greedy,
+        "optimized": optimized if improved else greedy,
+        "improvement": {
+            "orders_added": optimized["orders_assigned"] - greedy["orders_assigned"] if improved else 0,
+            "vehicles_saved": greedy["vehicles_used"] - optimized["vehicles_used"] if improved else 0,
+        },
+    }
@@ -1,14 +1,40 @@
+import contextlib
+import os
+import numpy as np
 import pandas as pd
-import joblib
 import traceback
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.parsers import JSONParser
+from .model_registry import registry, joblib_loader, MODELS_DIR
+from .tree_compiler import compiled_loader
+from .model_artifacts import mmap_loader
+from .cluster_engine import CLUSTER_MODES, assign_clusters, load_cluster_grid
+from .assignment_shards import ASSIGNMENT_MODES, assign_vehicles_sharded
+from .consolidation import optimize_budget, consolidate_plan
+from .jobs import wants_async, submit_job, no_progress
+from .prediction_cache import predict_memoized
+from .metrics import stage
+from .wire import PAYLOAD_PARSERS, FrameData, as_frame
+from .low_memory import MEMORY_MODES, PeakMemory, chunks, column_frame, compact_column, compact_frame, memory_config
+from django.conf import settings
+from .vehicle_assignment import (
+    fleet_from_spec, classify_load_type, assign_vehicles, summarize_fleet, PACKING_MODES, LOAD_TYPES,
+    ASSIGNMENT_STATUSES
+)
 
 # === Model Paths ===
-PRIORITY_MODEL_PATH = "models/Dispatch/priority_score_model.pkl"
-SCALER_PATH = "models/Dispatch/scaler.pkl"
-KNN_MODEL_PATH = "models/Dispatch/knn_model.pkl"
+PRIORITY_MODEL_PATH = os.path.join(MODELS_DIR, "Dispatch", "priority_score_model.pkl")
+SCALER_PATH = os.path.join(MODELS_DIR, "Dispatch", "scaler.pkl")
+KNN_MODEL_PATH = os.path.join(MODELS_DIR, "Dispatch", "knn_model.pkl")
+KNN_GRID_PATH = os.path.join(MODELS_DIR, "Dispatch", "knn_grid.npz")
+
+# Forest flattened into NumPy arrays at load time (core/tree_compiler.py); the large
+# artifacts are served from memory-mapped copies (core/model_artifacts.py)
+registry.register("dispatch_priority", PRIORITY_MODEL_PATH, mmap_loader(compiled_loader(joblib_loader)))
+registry.register("dispatch_scaler", SCALER_PATH)
+registry.register("dispatch_knn", KNN_MODEL_PATH, mmap_loader(joblib_loader))
+# Cluster lookup grid distilled from the KNN (python manage.py build_cluster_grid)
+registry.register("dispatch_knn_grid", KNN_GRID_PATH, mmap_loader(load_cluster_grid))
 
 # === Vehicle Configuration ===
 base_vehicles = [
@@ -19,133 +45,287 @@ base_vehicles = [
     {"Vehicle_Type": "Special_Medium", "Capacity_kg": 1000, "Capacity_L": 3000, "Vehicle_Property": "Specialised"},
     {"Vehicle_Type": "Special_Large", "Capacity_kg": 2000, "Capacity_L": 6000, "Vehicle_Property": "Specialised"},
 ]
+defined_vehicles = 4
 
-class DispatchPlannerView(APIView):
-    parser_classes = [JSONParser]
 
-    def post(self, request):
-        try:
-            # === Parse JSON ===
-            columns = request.data.get("columns", [])
-            data = request.data.get("data", [])
-            print("📥 [DispatchPlanner] Payload received.")
-
-            if not columns or not data:
-                return Response({"error": "Missing 'columns' or 'data' in request"}, status=400)
-
-            df = pd.DataFrame(data, columns=columns)
-            print(f"✅ DataFrame created. Shape: {df.shape}")
-            print("🧾 Columns:", df.columns.tolist())
-
-            # === Required Columns Check ===
-            required = [
-                "Fragility_Tag", "Temp_Tag", "Total_Weight", "Total_Volume",
-                "Expiry_Duration_Months", "Dispatch_Duration_Days"
-            ]
-            missing_cols = [col for col in required if col not in df.columns]
-            if missing_cols:
-                return Response({"error": f"Missing columns: {missing_cols}"}, status=400)
-
-            # === Convert to Numeric ===
-            for col in required:
-                df[col] = pd.to_numeric(df[col], errors="coerce")
-
-            if df[required].isnull().any().any():
-                return Response({"error": "Invalid or null numeric fields"}, status=400)
-
-            # === ML Priority Score ===
-            priority_model = joblib.load(PRIORITY_MODEL_PATH)
-            priority_features = list(priority_model.feature_names_in_)
-            df["ML_Priority_Score"] = priority_model.predict(df[priority_features])
-            print("✅ ML_Priority_Score computed.")
-
-            # === Clustering ===
-            scaler = joblib.load(SCALER_PATH)
-            knn = joblib.load(KNN_MODEL_PATH)
-            cluster_features = ["Total_Weight", "Total_Volume", "ML_Priority_Score", "Fragility_Tag", "Temp_Tag"]
-            df["Cluster"] = knn.predict(scaler.transform(df[cluster_features]))
-            print("✅ Cluster labels assigned.")
-
-            # === Load Classification ===
-            df["Fragile_Flag"] = df["Fragility_Tag"].astype(bool).astype(int)
-            df["Temp_Flag"] = df["Temp_Tag"].astype(bool).astype(int)
-            df["Load_Type"] = df.apply(
-                lambda r: "TF" if r.Fragile_Flag and r.Temp_Flag else ("F" if r.Fragile_Flag else ("T" if r.Temp_Flag else "N")),
-                axis=1
+def _memoized_knn(model, X):
+    return predict_memoized("dispatch_knn", model, X)
+
+
+def current_cluster_grid():
+    """(grid, None) if the distilled grid matches the loaded KNN + scaler, else (None, reason)."""
+    try:
+        grid = registry.get("dispatch_knn_grid")
+    except FileNotFoundError:
+        return None, "No cluster grid built; run: python manage.py build_cluster_grid"
+    if (grid.knn_checksum != registry.entry("dispatch_knn").checksum
+            or grid.scaler_checksum != registry.entry("dispatch_scaler").checksum):
+        return None, "Cluster grid was built from a different KNN / scaler; run: python manage.py build_cluster_grid"
+    return grid, None
+
+
+# === Columns returned per order ===
+FINAL_COLUMNS = [
+    "Product_ID",
+    "Product_Name",
+    "Product_Category",
+    "Quantity_Dispatched",
+    "Total_Weight",
+    "Total_Volume",
+    "ML_Priority_Score",
+    "Cluster",
+    "Load_Type",
+    "Assignment_Status",
+    "Assigned_Vehicle_ID"
+]
+
+REQUIRED_COLUMNS = [
+    "Fragility_Tag", "Temp_Tag", "Total_Weight", "Total_Volume",
+    "Expiry_Duration_Months", "Dispatch_Duration_Days"
+]
+CLUSTER_FEATURES = ["Total_Weight", "Total_Volume", "ML_Priority_Score", "Fragility_Tag", "Temp_Tag"]
+
+
+def orders_frame(columns, data, low_memory=False):
+    """
+    (DataFrame, None) for a {"columns", "data"} order batch (row lists or columnar), or (None, error message).
+    low_memory builds it column by column and stores every column in its most compact lossless dtype.
+    """
+    with stage("dispatch", "parse", rows=len(data)):
+        df = column_frame(columns, data) if low_memory else as_frame(columns, data)
+        print(f"✅ DataFrame created. Shape: {df.shape}")
+        print("🧾 Columns:", df.columns.tolist())
+
+        # === Required Columns Check ===
+        missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+        if missing_cols:
+            return None, f"Missing columns: {missing_cols}"
+
+        # === Convert to Numeric ===
+        for col in REQUIRED_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+        if df[REQUIRED_COLUMNS].isnull().any().any():
+            return None, "Invalid or null numeric fields"
+
+        if low_memory:
+            compact_frame(df)
+    return df, None
+
+
+def _rows(df, names, part):
+    """Columns `names` of the rows in slice `part`, copying only that chunk."""
+    return df.iloc[part, df.columns.get_indexer(names)]
+
+
+def score_and_cluster(df, cluster_mode, cluster_check=False, progress=no_progress, chunk_rows=None):
+    """
+    Adds ML_Priority_Score, Cluster and the load-type columns to `df` in place
+    and returns the clustering report. With chunk_rows (low-memory mode) the
+    models see chunk_rows rows at a time and the label columns are stored as
+    categoricals / small integers.
+    """
+    parts = chunks(len(df), chunk_rows)
+
+    # === ML Priority Score ===
+    progress(0.1, "priority")
+    with stage("dispatch", "priority", rows=len(df)):
+        priority_model = registry.get("dispatch_priority")
+        priority_features = list(priority_model.feature_names_in_)
+        scores = np.empty(len(df), dtype=np.float64)
+        for part in parts:
+            scores[part] = predict_memoized("dispatch_priority", priority_model, _rows(df, priority_features, part))
+        df["ML_Priority_Score"] = scores
+    print("✅ ML_Priority_Score computed.")
+
+    # === Clustering ===
+    progress(0.4, "clustering")
+    with stage("dispatch", "clustering", rows=len(df)):
+        scaler = registry.get("dispatch_scaler")
+        knn = registry.get("dispatch_knn")
+        grid, grid_issue = (None, None) if cluster_mode == "exact" else current_cluster_grid()
+        labels, cluster_stats = [], {}
+        for part in parts:
+            chunk_labels, chunk_stats = assign_clusters(
+                _rows(df, CLUSTER_FEATURES, part), scaler, knn, grid, cluster_mode, predict=_memoized_knn
             )
-            df["Sensitive_Flag"] = df["Load_Type"].isin(["TF", "F", "T"])
-            df["Assignment_Status"] = "Not_Assigned"
-            df["Assigned_Vehicle_ID"] = None
-            print("✅ Load type logic applied.")
-
-            # === Vehicle Pool Initialization ===
-            defined_vehicles = 4
-            vehicle_pool = []
-            counter = 1
-            for v in base_vehicles:
-                for _ in range(defined_vehicles):
-                    vehicle_pool.append({
-                        "Vehicle_ID": f"{v['Vehicle_Type'].upper()}_{counter:03d}",
-                        "Vehicle_Type": v["Vehicle_Type"],
-                        "Vehicle_Property": v["Vehicle_Property"],
-                        "Capacity_kg": v["Capacity_kg"],
-                        "Capacity_L": v["Capacity_L"],
-                        "Remaining_kg": v["Capacity_kg"],
-                        "Remaining_L": v["Capacity_L"],
-                        "Used": 0
-                    })
-                    counter += 1
-            vehicle_df = pd.DataFrame(vehicle_pool)
+            labels.append(chunk_labels)
+            for key, value in chunk_stats.items():
+                cluster_stats[key] = cluster_stats.get(key, 0) + value
+        labels = np.concatenate(labels) if labels else np.empty(0, dtype=knn.classes_.dtype)
+        df["Cluster"] = compact_column(pd.Series(labels, index=df.index)) if chunk_rows else labels
+
+    clustering = {"mode": cluster_mode, "engine": cluster_mode if grid is not None else "exact", **cluster_stats}
+    if grid_issue:
+        print(f"⚠️ {grid_issue} (using exact KNN)")
+        clustering["fallback_reason"] = grid_issue
+    if grid is not None:
+        clustering["grid_version"] = registry.entry("dispatch_knn_grid").version
+        clustering["report_agreement"] = {
+            sample: entry[f"{cluster_mode}_agreement"] for sample, entry in grid.report.items()
+        }
+    # ✅ Optional per-batch check against the exact KNN
+    if cluster_check and grid is not None:
+        agree = 0
+        for part in parts:
+            exact, _ = assign_clusters(_rows(df, CLUSTER_FEATURES, part), scaler, knn, predict=_memoized_knn)
+            agree += int((exact == labels[part]).sum())
+        clustering["batch_agreement"] = round(agree / len(df), 6) if len(df) else 1.0
+    print(f"✅ Cluster labels assigned. ({clustering['engine']})")
+
+    # === Load Classification ===
+    flag_dtype = np.int8 if chunk_rows else int
+    df["Fragile_Flag"] = df["Fragility_Tag"].astype(bool).astype(flag_dtype)
+    df["Temp_Flag"] = df["Temp_Tag"].astype(bool).astype(flag_dtype)
+    load_types = classify_load_type(df["Fragile_Flag"], df["Temp_Flag"])
+    if chunk_rows:
+        # Integer codes behind fixed categories; write_assignment() keeps the vehicle IDs as codes too
+        df["Load_Type"] = pd.Categorical(load_types, categories=LOAD_TYPES)
+        df["Sensitive_Flag"] = df["Load_Type"].isin(["TF", "F", "T"])
+        df["Assignment_Status"] = pd.Categorical.from_codes(
+            np.ones(len(df), dtype=np.int8), categories=ASSIGNMENT_STATUSES
+        )
+        df["Assigned_Vehicle_ID"] = pd.Categorical.from_codes(
+            np.full(len(df), -1, dtype=np.int8), dtype=pd.CategoricalDtype(pd.Index([], dtype=object))
+        )
+    else:
+        df["Load_Type"] = load_types
+        df["Sensitive_Flag"] = df["Load_Type"].isin(["TF", "F", "T"])
+        df["Assignment_Status"] = "Not_Assigned"
+        df["Assigned_Vehicle_ID"] = None
+    print("✅ Load type logic applied.")
+    return clustering
+
+
+def planning_order(df):
+    """
+    Orders in the sequence the planner packs them: by cluster, highest priority
+    first (ties keep batch order). A stable lexsort over the two key arrays,
+    so the batch itself is never copied in sorted order.
+    """
+    positions = np.lexsort((-df["ML_Priority_Score"].to_numpy(), df["Cluster"].to_numpy()))
+    return df.index[positions]
+
+
+def default_cluster_mode():
+    return getattr(settings, "DISPATCH_CLUSTER_MODE", "exact")
+
+
+def request_fleet(spec):
+    """Vehicle pool for a request's "fleet" spec (raises ValueError)."""
+    return fleet_from_spec(spec, base_vehicles, defined_vehicles, getattr(settings, "DISPATCH_DEPOT_FLEETS", {}))
+
+
+def plan_dispatch(payload, progress=no_progress):
+    """
+    Full dispatch plan for a {"columns", "data", "fleet"?, "packing_mode"?, ...}
+    payload. Returns (body, status_code); runs in the request thread or as a
+    background job.
+    """
+    try:
+        # === Parse JSON ===
+        columns = payload.get("columns", [])
+        data = payload.get("data", [])
+        print("📥 [DispatchPlanner] Payload received.")
+
+        if not columns or not data:
+            return {"error": "Missing 'columns' or 'data' in request"}, 400
+
+        # === Fleet + Packing Options ===
+        packing_mode = payload.get("packing_mode", "first_fit")
+        if packing_mode not in PACKING_MODES:
+            return {"error": f"Unknown packing_mode '{packing_mode}'. Use one of {PACKING_MODES}"}, 400
+        cluster_mode = payload.get("cluster_mode", default_cluster_mode())
+        if cluster_mode not in CLUSTER_MODES:
+            return {"error": f"Unknown cluster_mode '{cluster_mode}'. Use one of {CLUSTER_MODES}"}, 400
+        assignment_mode = payload.get(
+            "assignment_mode", getattr(settings, "DISPATCH_ASSIGNMENT", {}).get("MODE", "serial")
+        )
+        if assignment_mode not in ASSIGNMENT_MODES:
+            return {"error": f"Unknown assignment_mode '{assignment_mode}'. Use one of {ASSIGNMENT_MODES}"}, 400
+        memory = memory_config()
+        memory_mode = payload.get("memory_mode", memory["MODE"])
+        if memory_mode not in MEMORY_MODES:
+            return {"error": f"Unknown memory_mode '{memory_mode}'. Use one of {MEMORY_MODES}"}, 400
+        try:
+            vehicle_df = request_fleet(payload.get("fleet"))
+            time_budget = optimize_budget(payload.get("optimize"))
+        except ValueError as e:
+            return {"error": str(e)}, 400
+
+        chunk_rows = int(memory["CHUNK_ROWS"]) if memory_mode == "low" else None
+        probe = PeakMemory() if memory["REPORT_PEAK"] else None
+        with probe or contextlib.nullcontext():
+            df, error = orders_frame(columns, data, low_memory=chunk_rows is not None)
+            if error:
+                return {"error": error}, 400
+
+            clustering = score_and_cluster(df, cluster_mode, payload.get("cluster_check"), progress, chunk_rows)
+
+            # === Vehicle Pool ===
             print(f"🚚 Vehicle pool initialized with {len(vehicle_df)} vehicles.")
 
             # === Assignment ===
-            df_sorted = df.sort_values(["Cluster", "ML_Priority_Score"], ascending=[True, False])
+            progress(0.6, "assignment")
+            with stage("dispatch", "assignment", rows=len(df)):
+                order_index = planning_order(df)
+                if assignment_mode == "sharded":
+                    fleet, shard_stats = assign_vehicles_sharded(df, vehicle_df, order_index, mode=packing_mode)
+                else:
+                    fleet, shard_stats = assign_vehicles(df, vehicle_df, order_index, mode=packing_mode), None
 
-            for i, order in df_sorted.iterrows():
-                load_type = order["Load_Type"]
-                weight = order["Total_Weight"]
-                volume = order["Total_Volume"]
+            # === Optional anytime consolidation of the greedy plan ===
+            optimizer = None
+            if time_budget is not None:
+                progress(0.8, "optimize")
+                with stage("dispatch", "optimize", rows=len(df)):
+                    optimizer = consolidate_plan(df, order_index, fleet, time_budget)
+                print(f"✅ Plan optimized in {optimizer['elapsed_ms']} ms: {optimizer['improvement']}")
 
-                if load_type == "TF":
-                    candidates = vehicle_df[vehicle_df["Vehicle_Property"] == "Specialised"]
-                elif load_type in ["F", "T"]:
-                    candidates = vehicle_df.sort_values(by="Vehicle_Property", ascending=True)
-                else:
-                    candidates = vehicle_df.copy()
-
-                for j, vehicle in candidates.iterrows():
-                    if vehicle["Remaining_kg"] >= weight and vehicle["Remaining_L"] >= volume:
-                        df.at[i, "Assigned_Vehicle_ID"] = vehicle["Vehicle_ID"]
-                        df.at[i, "Assignment_Status"] = "Assigned"
-                        vehicle_df.at[j, "Remaining_kg"] -= weight
-                        vehicle_df.at[j, "Remaining_L"] -= volume
-                        vehicle_df.at[j, "Used"] = 1
-                        break
-
-            print("✅ Vehicle assignment done.")
-
-            # === Final Columns To Return ===
-            final_columns = [
-                "Product_ID",
-                "Product_Name",
-                "Product_Category",
-                "Quantity_Dispatched",
-                "Total_Weight",
-                "Total_Volume",
-                "ML_Priority_Score",
-                "Cluster",
-                "Load_Type",
-                "Assignment_Status",
-                "Assigned_Vehicle_ID"
-            ]
-            output_data = df[final_columns].values.tolist()
-
-            return Response({
-                "columns": final_columns,
-                "data": output_data
-            })
-
-        except Exception as e:
-            print("❌ Exception in DispatchPlannerView:")
-            traceback.print_exc()
-            return Response({"error": str(e)}, status=500)
+            fleet_summary = summarize_fleet(fleet)
+            fleet_summary["packing_mode"] = packing_mode
+            fleet_summary["assignment_mode"] = assignment_mode
+            if shard_stats is not None:
+                fleet_summary["sharding"] = shard_stats
+            if optimizer is not None:
+                fleet_summary["optimizer"] = optimizer
+            fleet_summary["orders_assigned"] = int((df["Assignment_Status"] == "Assigned").sum())
+            fleet_summary["orders_unassigned"] = int(len(df) - fleet_summary["orders_assigned"])
+            print(f"✅ Vehicle assignment done. ({packing_mode}, {assignment_mode}, {fleet_summary['vehicles_used']} vehicles used)")
+
+            # === Final Columns To Return (rows for JSON, column by column for the columnar formats) ===
+            output = df[FINAL_COLUMNS]
+            if chunk_rows is not None:
+                # Unassigned orders carry None (not NaN) like the standard frame
+                vehicle_ids = output["Assigned_Vehicle_ID"].astype(object)
+                output = output.assign(Assigned_Vehicle_ID=vehicle_ids.where(vehicle_ids.notna(), None))
+            output_data = FrameData(output)
+
+            body = {
+                "columns": FINAL_COLUMNS,
+                "data": output_data,
+                "fleet": fleet_summary,
+                "clustering": clustering
+            }
+
+        # === Memory report (peak RSS while the plan was built) ===
+        body["memory"] = {"mode": memory_mode, "chunk_rows": chunk_rows, **(probe.report() if probe else {})}
+        return body, 200
+
+    except Exception as e:
+        print("❌ Exception in DispatchPlannerView:")
+        traceback.print_exc()
+        return {"error": str(e)}, 500
+
+
+class DispatchPlannerView(APIView):
+    parser_classes = PAYLOAD_PARSERS
+    metrics_component = "dispatch"
+
+    def post(self, request):
+        # ✅ ?async=1 -> queue the plan and return a job ID to poll
+        if wants_async(request):
+            return submit_job("dispatch", plan_dispatch, request.data)
+
+        body, code = plan_dispatch(request.data)
+        return Response(body, status=code)
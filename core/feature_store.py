@@ -0,0 +1,50 @@
+import numpy as np
+
+# 🧮 Per-product features derived from the master, one contiguous NumPy column each
+# Read by order enrichment (/api/data/, CSV uploads) only: /api/dispatch/ rows carry their own Total_Weight,
+# Total_Volume, tags and Expiry_Duration_Months and no Product_ID, so the dispatch models have no per-product input
+FEATURE_DTYPES = {
+    "Expiry_Days_Left": np.float64,     # expiry minus manufacture, NaN when either date is missing
+    "Expiry_Date": object,              # "YYYY-MM-DD" or None
+    "Product_Prefix": object,           # "<first name word>-<SKU>-<batch>-", completed with the order UID
+}
+
+
+class ProductFeatures:
+    """
+    Per-product inputs computed once per master version, stored as NumPy
+    columns aligned to an integer product index: row i of every column
+    belongs to index[i]. Assembling features for a batch of orders is one
+    positions() lookup plus a take() gather per column, instead of
+    re-deriving them from the raw master rows on every request.
+    """
+
+    def __init__(self, index, columns):
+        self.index = index
+        self.columns = {name: np.ascontiguousarray(values) for name, values in columns.items()}
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def nbytes(self):
+        return int(sum(values.nbytes for values in self.columns.values()))
+
+    def positions(self, product_ids):
+        """Vectorized Product_ID -> integer product index (-1 when unknown)."""
+        return self.index.get_indexer(product_ids)
+
+    def take(self, positions, names=None):
+        """{feature: values for each position}, gathered column by column."""
+        return {name: self.columns[name].take(positions) for name in (names or self.columns)}
+
+    def select(self, mask):
+        """Features for the products where `mask` is True, order kept."""
+        return ProductFeatures(self.index[mask], {name: values[mask] for name, values in self.columns.items()})
+
+    def append(self, other):
+        """Rows of `other` after ours (its columns cast to ours)."""
+        return ProductFeatures(self.index.append(other.index), {
+            name: np.concatenate([values, other.columns[name].astype(values.dtype, copy=False)])
+            for name, values in self.columns.items()
+        })
@@ -1,25 +1,363 @@
+import numpy as np
 import pandas as pd
 import os
+import threading
+import time
+
+from .master_store import get_master_store
+from .feature_store import ProductFeatures, FEATURE_DTYPES
 
 MASTER_PATH = os.path.join(os.path.dirname(__file__), '..', 'assets', 'products.csv')
 
-def update_master_file(file_obj):
-    df = pd.read_csv(file_obj)
-    df.to_csv(MASTER_PATH, index=False)
+# 📅 Fast path for date columns; anything else falls back to per-value parsing
+DATE_FORMAT = "ISO8601"
 
-def process_uploaded_csv(df):
-    master = pd.read_csv(MASTER_PATH)
+# ⏱️ How often (seconds) a snapshot() may stat the master for outside changes
+MASTER_CHECK_INTERVAL = 2.0
+
+# ✅ Columns every /api/data/ order batch must carry
+REQUIRED_COLUMNS = [
+    'Assignment_ID',
+    'Product_ID',
+    'Quantity_Assigned',
+    'Unit_Weight_(kg)',
+    'Unit_Volume_(L)',
+    'Urgent_Flag',
+    'Dispatch_Window',
+    'Delivery_Window',
+    'Fragile_Flag',
+    'Temp_Sensitive_Flag',
+    'Zone', 'Rack', 'UID', 'Vehicle_No'
+]
+
+# 🔁 Upload flag names -> feature names the priority model expects
+COLUMN_MAPPING = {
+    'Fragile_Flag': 'Fragility',
+    'Temp_Sensitive_Flag': 'Temp_Sensitive',
+    'Urgent_Flag': 'Urgent_Order_Flag'
+}
+
+
+def update_master_file(file_obj, mode="replace"):
+    """
+    Apply an uploaded master CSV to the store as one new version: "replace"
+    makes it the whole master (products not in the file are deleted),
+    "upsert" only inserts / updates the rows it carries.
+    Returns (snapshot, change report).
+    """
+    df = normalize_master_columns(pd.read_csv(file_obj))
+    product_master.sync_csv()
+    if mode == "upsert":
+        report = product_master.store.upsert(df, source="upload")
+    else:
+        report = product_master.store.replace(df, source="upload")
+    return product_master.latest(), report
+
+
+def upsert_master_rows(df):
+    product_master.sync_csv()
+    report = product_master.store.upsert(normalize_master_columns(df))
+    return product_master.latest(), report
+
+
+def delete_master_rows(product_ids):
+    product_master.sync_csv()
+    report = product_master.store.delete(product_ids)
+    return product_master.latest(), report
+
+
+def normalize_master_columns(product_df):
+    product_df.columns = [col.strip().replace(" ", "_").replace("(", "").replace(")", "") for col in product_df.columns]
+    return product_df
+
+
+def load_product_master(path=MASTER_PATH):
+    return normalize_master_columns(pd.read_csv(path))
+
+
+def parse_dates(values):
+    """
+    Vectorized equivalent of calling pd.to_datetime(v, errors='coerce') per value:
+    one fixed-format pass, then a mixed-format pass only for values it missed.
+    """
+    values = pd.Series(values)
+    parsed = pd.to_datetime(values, format=DATE_FORMAT, errors="coerce")
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], format="mixed", errors="coerce")
+    return parsed
+
+
+def _whole_days(delta):
+    """Timedelta -> .days, int64 when complete, float64 with NaN otherwise."""
+    days = delta.dt.days
+    if days.isna().any():
+        return days.astype(float)
+    return days.astype("int64")
+
+
+def _map_unique(values, fn):
+    """Apply a scalar function once per distinct value and scatter it back."""
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=False)
+    mapped = np.array([fn(v) for v in uniques], dtype=object)
+    return mapped[codes]
+
+
+def build_product_features(product_df):
+    """
+    Per-product values the order enrichment needs, computed once per master:
+    parsed expiry, expiry minus manufacture, and the Product_ID prefix.
+    """
+    product_ids = product_df["Product_ID"]
+    if not product_ids.is_unique:
+        duplicated = product_ids[product_ids.duplicated()].unique().tolist()
+        raise ValueError(f"❌ Duplicate Product_ID values in the product master: {duplicated}")
+
+    expiry = parse_dates(product_df["Expiry_Date"])
+    mfg = parse_dates(product_df["Manufacture_Date"])
+
+    # Masters repeat names / SKUs / batches heavily, so format each distinct value once
+    first_word = _map_unique(product_df["Product_Name"], lambda v: str(v).split()[0])
+    prefix = (
+        first_word + "-" + _map_unique(product_df["SKU_Code"], str)
+        + "-" + _map_unique(product_df["Batch_Number"], str) + "-"
+    )
+    expiry_str = _map_unique(expiry, lambda v: v.strftime("%Y-%m-%d") if pd.notna(v) else None)
+
+    columns = {
+        "Expiry_Date": expiry_str,
+        "Expiry_Days_Left": (expiry - mfg).dt.days.astype(float).to_numpy(),
+        "Product_Prefix": prefix,
+    }
+    columns = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in FEATURE_DTYPES.items()}
+    return ProductFeatures(pd.Index(product_ids.to_numpy(), name="Product_ID"), columns)
+
+
+def enrich_orders(df, features):
+    """
+    Columnar order enrichment shared by /api/data/ and CSV uploads.
+
+    Adds Handle, Total_Weight, Total_Volume, Delivery_Window_Days,
+    Expiry_Days_Left and Expiry_Date, and rebuilds Assignment_ID and
+    Product_ID from the product features. Raises ValueError for unknown
+    products.
+    """
+    df = df.copy()
+
+    # ✅ Handle tag
+    fragile = df['Fragile_Flag'].astype(int).to_numpy().astype(bool)
+    temp_sens = df['Temp_Sensitive_Flag'].astype(int).to_numpy().astype(bool)
+    df['Handle'] = np.select([fragile & temp_sens, fragile, temp_sens], ['TF', 'F', 'T'], default='N').astype(object)
+
+    # ✅ Gather product features
+    positions = features.positions(df['Product_ID'])
+    missing = positions < 0
+    if missing.any():
+        pid = df['Product_ID'].to_numpy()[missing.argmax()]
+        raise ValueError(f"❌ Expiry_Date not found for Product_ID: {pid}")
+    product = features.take(positions)
+
+    qty = df['Quantity_Assigned'].astype(float).to_numpy()
+    df['Total_Weight'] = qty * df['Unit_Weight_(kg)'].astype(float).to_numpy()
+    df['Total_Volume'] = qty * df['Unit_Volume_(L)'].astype(float).to_numpy()
+
+    dispatch = parse_dates(df['Dispatch_Window'].to_numpy())
+    delivery = parse_dates(df['Delivery_Window'].to_numpy())
+    df['Delivery_Window_Days'] = _whole_days(delivery - dispatch).to_numpy()
+
+    expiry_days = product['Expiry_Days_Left']
+    df['Expiry_Days_Left'] = expiry_days if np.isnan(expiry_days).any() else expiry_days.astype("int64")
+    df['Expiry_Date'] = product['Expiry_Date']
 
-    df = df.dropna()
-    df = df.merge(master, on="Product_ID", how="left")
+    # ✅ Construct Assignment_ID & Product_ID
+    uid = df['UID'].astype(str)
+    df['Assignment_ID'] = (
+        df['Zone'].astype(str) + "::" + df['Rack'].astype(str) + "::" + uid + "::" + df['Vehicle_No'].astype(str)
+    )
+    df['Product_ID'] = product['Product_Prefix'] + uid.to_numpy().astype(object)
+
+    return df
 
-    df['Total_Weight'] = df['Quantity_Assigned'] * df['Unit_Weight_(kg)']
-    df['Total_Volume'] = df['Quantity_Assigned'] * df['Unit_Volume_(L)']
 
-    df['Expiry_Date'] = pd.to_datetime(df['Expiry_Date'])
-    df['Dispatch_Window'] = pd.to_datetime(df['Dispatch_Window'])
+def prepare_orders(df, features):
+    """Enrichment plus the flag casts / renames that feed predict_priority."""
+    df = enrich_orders(df, features)
 
-    df['Expiry_Days_Left'] = (df['Expiry_Date'] - pd.Timestamp.today()).dt.days
-    df['Delivery_Window_Days'] = (pd.to_datetime(df['Delivery_Window']) - df['Dispatch_Window']).dt.days
+    df['Urgent_Flag'] = df['Urgent_Flag'].astype(int)
+    df['Temp_Sensitive_Flag'] = df['Temp_Sensitive_Flag'].astype(int)
+    df['Fragile_Flag'] = df['Fragile_Flag'].astype(int)
 
+    df.rename(columns=COLUMN_MAPPING, inplace=True)
     return df
+
+
+class ProductMasterSnapshot:
+    """One immutable, fully built view of the master. Requests hold it for their whole run."""
+
+    def __init__(self, features, version, columns, loaded_at, load_seconds):
+        self.features = features
+        self.version = version
+        self.columns = columns
+        self.loaded_at = loaded_at
+        self.load_seconds = load_seconds
+
+    def __len__(self):
+        return len(self.features)
+
+    def positions(self, product_ids):
+        """Vectorized Product_ID -> row position (-1 when unknown)."""
+        return self.features.positions(product_ids)
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "rows": len(self.features),
+            "feature_bytes": self.features.nbytes,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 6),
+        }
+
+
+class ProductMaster:
+    """
+    Process-wide cache of the product master.
+
+    The rows live in the versioned MasterStore, seeded from the CSV at `path`
+    (and re-synced whenever that file is replaced on disk). A snapshot is the
+    product feature store for one version: every lookup goes through it.
+    Every check_interval seconds snapshot() reads the store's latest version;
+    when it moved, only the rows changed since are fetched and spliced in.
+    Snapshots are swapped by reference, so requests already running keep the
+    one they started with. on_change() callbacks receive (snapshot, changes).
+    """
+
+    def __init__(self, path=MASTER_PATH, check_interval=MASTER_CHECK_INTERVAL, store=None):
+        self.path = path
+        self.check_interval = check_interval
+        self._store = store
+        self._snapshot = None
+        self._csv_stat = None
+        self._last_check = 0.0
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        if self._store is None:
+            self._store = get_master_store()
+        return self._store
+
+    def on_change(self, callback):
+        """Call callback(snapshot, changes) after every refresh; changes["full"] means everything was reloaded."""
+        self._listeners.append(callback)
+        return callback
+
+    def snapshot(self):
+        current = self._snapshot
+        if current is None:
+            return self.rebuild()
+
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return current
+        self._last_check = now
+
+        self.sync_csv()
+        if self.store.version() != current.version:
+            return self.refresh(stale=current)
+        return current
+
+    def latest(self):
+        """snapshot() without waiting out check_interval, e.g. right after this process wrote to the store."""
+        self._last_check = 0.0
+        return self.snapshot()
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def sync_csv(self):
+        """Import the CSV as a new store version when the file differs from the one last imported."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        csv_stat = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        if csv_stat == self._csv_stat:
+            return None
+        report = None
+        if self.store.meta("csv") != csv_stat:
+            print(f"[INFO] 📥 Importing product master CSV: {self.path}")
+            report = self.store.replace(load_product_master(self.path), source="csv", csv_stat=csv_stat)
+        self._csv_stat = csv_stat
+        return report
+
+    def rebuild(self, stale=None):
+        with self._lock:
+            # Another request already built (or rebuilt) it while we waited
+            if self._snapshot is not stale:
+                return self._snapshot
+            self.sync_csv()
+            return self._load_full(stale)
+
+    def refresh(self, stale):
+        with self._lock:
+            if self._snapshot is not stale:
+                return self._snapshot
+            return self._load_delta(stale)
+
+    def _load_full(self, stale):
+        print("[INFO] 📦 Building product master index from the master store")
+        started = time.perf_counter()
+        head, product_df = self.store.load()
+        features = build_product_features(product_df)
+        elapsed = time.perf_counter() - started
+
+        snapshot = ProductMasterSnapshot(features, head["version"], head["columns"], time.time(), elapsed)
+        print(f"[OK] ✅ Product master ready: {len(features)} rows (version {head['version']}) in {elapsed:.3f}s")
+        return self._publish(snapshot, {
+            "previous_version": stale.version if stale else None, "version": head["version"],
+            "full": True, "upserted": [], "deleted": [],
+        })
+
+    def _load_delta(self, stale):
+        started = time.perf_counter()
+        delta = self.store.delta(stale.version)
+        if delta is None:
+            return self._load_full(stale)
+        head, changed_df, deleted = delta
+        # A new column layout, or a change touching most rows, is cheaper to take in full
+        if head["columns"] != stale.columns or len(changed_df) + len(deleted) > len(stale) // 2:
+            return self._load_full(stale)
+
+        upserted = changed_df["Product_ID"].astype(str).tolist()
+        keep = ~stale.features.index.astype(str).isin(upserted + deleted)
+        features = stale.features.select(keep)
+        if len(changed_df):
+            features = features.append(build_product_features(changed_df))
+        elapsed = time.perf_counter() - started
+
+        snapshot = ProductMasterSnapshot(features, head["version"], head["columns"], time.time(), elapsed)
+        print(f"[OK] ✅ Product master {stale.version} -> {head['version']}: "
+              f"{len(upserted)} upserted, {len(deleted)} deleted in {elapsed:.3f}s")
+        return self._publish(snapshot, {
+            "previous_version": stale.version, "version": head["version"],
+            "full": False, "upserted": upserted, "deleted": deleted,
+        })
+
+    def _publish(self, snapshot, changes):
+        self._snapshot = snapshot
+        self._last_check = time.monotonic()
+        for callback in self._listeners:
+            try:
+                callback(snapshot, changes)
+            except Exception as e:
+                print(f"[WARN] ⚠️ Product master listener failed: {e}")
+        return snapshot
+
+
+# ✅ Shared process-wide product master
+product_master = ProductMaster()
+
+
+def process_uploaded_csv(df):
+    return enrich_orders(df, product_master.snapshot().features)
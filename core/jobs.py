@@ -0,0 +1,244 @@
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from rest_framework.response import Response
+
+from .result_store import SQLiteStore, DEFAULT_RESULT_STORE, json_dumps
+
+# ⚙️ Background job limits (override with settings.JOBS)
+DEFAULT_JOBS = {
+    "MAX_WORKERS": 2,       # jobs computing at once in each server process
+    "MAX_QUEUED": 16,       # jobs waiting for a worker before submits get 429
+    "TTL_SECONDS": 3600,    # finished jobs (and their results) are kept this long
+    "MAX_FINISHED": 200,
+}
+
+# Truthy values for the ?async= query param
+ASYNC_TRUE = ("1", "true", "yes")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    stage TEXT,
+    pid INTEGER NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    status_code INTEGER,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created);
+"""
+
+JOB_FIELDS = ["id", "kind", "status", "progress", "stage", "pid", "created", "started", "finished", "status_code", "error"]
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+def no_progress(fraction, stage):
+    pass
+
+
+def wants_async(request):
+    return str(request.query_params.get("async", "")).lower() in ASYNC_TRUE
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore(SQLiteStore):
+    """
+    Job status and results in the same SQLite file as the result store, so a
+    poll can be answered by any worker, not just the one running the job.
+    """
+
+    schema = SCHEMA
+
+    def __init__(self, path, ttl_seconds=3600, max_finished=200):
+        self.ttl_seconds = ttl_seconds
+        self.max_finished = max_finished
+        super().__init__(path)
+
+    def create(self, kind):
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, pid, created) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, kind, os.getpid(), time.time())
+            )
+            self._prune(conn)
+        return job_id
+
+    def update(self, job_id, **fields):
+        if "result" in fields:
+            fields["result"] = json_dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id, include_result=True):
+        columns = JOB_FIELDS + (["result"] if include_result else [])
+        row = self._connection().execute(
+            f"SELECT {', '.join(columns)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(columns, row))
+
+        # The process running it died (restart / crash): it will never finish
+        if job["status"] in ("queued", "running") and not _pid_alive(job["pid"]):
+            job.update(status="failed", finished=time.time(), error="Worker process exited before the job finished")
+            self.update(job_id, status=job["status"], finished=job["finished"], error=job["error"])
+
+        if include_result and job["result"] is not None:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    def recent(self, limit=50):
+        rows = self._connection().execute(
+            f"SELECT {', '.join(JOB_FIELDS)} FROM jobs ORDER BY created DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [dict(zip(JOB_FIELDS, row)) for row in rows]
+
+    def _prune(self, conn):
+        conn.execute(
+            "DELETE FROM jobs WHERE finished IS NOT NULL AND finished < ?", (time.time() - self.ttl_seconds,)
+        )
+        conn.execute(
+            "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE finished IS NOT NULL "
+            "ORDER BY finished DESC LIMIT -1 OFFSET ?)", (self.max_finished,)
+        )
+
+
+class JobRunner:
+    """
+    Local thread pool for heavy requests. At most `max_workers` jobs compute
+    at once per process and at most `max_queued` more wait; beyond that
+    submit() raises JobQueueFull, so a burst of large batches cannot tie up
+    every thread that interactive requests need.
+
+    Job functions take their usual arguments plus progress=fn(fraction, stage)
+    and return (body, status_code), like the synchronous handlers.
+    """
+
+    def __init__(self, store, max_workers=2, max_queued=16):
+        self.store = store
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mlapi-job")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queued)
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFull(f"Job queue is full ({self.max_workers} running, {self.max_queued} queued). Retry later.")
+        try:
+            job_id = self.store.create(kind)
+            with self._lock:
+                self._active += 1
+            self._executor.submit(self._run, job_id, fn, args, kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        print(f"[INFO] 🧵 Job {job_id} ({kind}) queued")
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        store = self.store
+
+        def progress(fraction, stage):
+            store.update(job_id, progress=round(float(fraction), 4), stage=stage)
+
+        try:
+            store.update(job_id, status="running", started=time.time())
+            body, code = fn(*args, progress=progress, **kwargs)
+            store.update(
+                job_id, status="succeeded" if code < 400 else "failed", progress=1.0, stage="done",
+                finished=time.time(), status_code=code, result=body,
+                error=body.get("error") if code >= 400 and isinstance(body, dict) else None
+            )
+            print(f"[OK] ✅ Job {job_id} finished ({code})")
+        except Exception as e:
+            print(f"[ERR] ❌ Job {job_id} failed:")
+            traceback.print_exc()
+            store.update(job_id, status="failed", finished=time.time(), status_code=500, error=str(e))
+        finally:
+            with self._lock:
+                self._active -= 1
+            self._slots.release()
+
+    def info(self):
+        return {
+            "max_workers": self.max_workers,
+            "max_queued": self.max_queued,
+            "active_in_process": self._active,
+        }
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner():
+    """Process-wide runner configured from settings.JOBS (store path from settings.RESULT_STORE)."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                from django.conf import settings
+                config = {**DEFAULT_JOBS, **getattr(settings, "JOBS", {})}
+                path = {**DEFAULT_RESULT_STORE, **getattr(settings, "RESULT_STORE", {})}["PATH"]
+                store = JobStore(path, config["TTL_SECONDS"], config["MAX_FINISHED"])
+                _runner = JobRunner(store, config["MAX_WORKERS"], config["MAX_QUEUED"])
+    return _runner
+
+
+def submit_job(kind, fn, *args):
+    """Queue fn(*args) and answer 202 with the job ID, or 429 when the queue is full."""
+    try:
+        job_id = get_job_runner().submit(kind, fn, *args)
+    except JobQueueFull as e:
+        return Response({"error": str(e)}, status=429)
+    return Response({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/jobs/{job_id}/",
+    }, status=202)
+
+
+def job_to_dict(job):
+    """Job row -> API shape."""
+    out = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "stage": job["stage"],
+        "created_at": job["created"],
+        "started_at": job["started"],
+        "finished_at": job["finished"],
+        "status_code": job["status_code"],
+        "error": job["error"],
+    }
+    if "result" in job:
+        out["result"] = job["result"]
+    return out
@@ -0,0 +1,136 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .wire import FrameData
+
+# 🪶 /api/dispatch/ memory modes (override with settings.DISPATCH_MEMORY; requests send "memory_mode")
+#   standard -> the batch frame as pandas builds it from the payload rows
+#   low      -> frame built one column at a time, numeric columns downcast (losslessly), label
+#               columns as categoricals, priority / clusters scored CHUNK_ROWS rows at a time
+#   REPORT_PEAK -> add the request's peak RSS (and its rise over the RSS at the start) to the response
+MEMORY_MODES = ["standard", "low"]
+
+DEFAULT_DISPATCH_MEMORY = {
+    "MODE": "standard",
+    "CHUNK_ROWS": 50000,
+    "REPORT_PEAK": True,
+}
+
+# String columns become categoricals when at most this share of their values is distinct
+CATEGORY_MAX_UNIQUE = 0.5
+
+
+def memory_config():
+    return {**DEFAULT_DISPATCH_MEMORY, **getattr(settings, "DISPATCH_MEMORY", {})}
+
+
+def column_frame(columns, data):
+    """
+    DataFrame for a payload's columns / row lists, built one column at a time:
+    only one column of Python values is alive besides the frame, instead of
+    the full object matrix pandas makes from the rows first.
+    """
+    if isinstance(data, FrameData):
+        return data.frame
+    width = len(columns)
+    if any(len(row) != width for row in data):
+        raise ValueError(f"{width} columns passed, but some rows have a different number of values")
+
+    frame = pd.DataFrame(index=pd.RangeIndex(len(data)))
+    for i in range(width):
+        frame[i] = pd.Series([row[i] for row in data])
+    frame.columns = list(columns)
+    return frame
+
+
+def compact_column(values):
+    """
+    `values` in the smallest dtype that keeps every value: integers downcast,
+    floats to float32 only when each one survives the round trip, mostly
+    repeated strings as a categorical. Anything else is returned unchanged.
+    """
+    kind = values.dtype.kind
+    if kind in "iu":
+        return pd.to_numeric(values, downcast="unsigned" if kind == "u" or values.min() >= 0 else "integer")
+    if kind == "f" and values.dtype.itemsize > 4:
+        small = values.to_numpy().astype(np.float32)
+        if np.array_equal(small, values.to_numpy(), equal_nan=True):
+            return pd.Series(small, index=values.index, name=values.name)
+        return values
+    if kind == "O" and len(values) and pd.api.types.infer_dtype(values, skipna=False) == "string":
+        if values.nunique() <= CATEGORY_MAX_UNIQUE * len(values):
+            return values.astype("category")
+    return values
+
+
+def compact_frame(df):
+    """compact_column() applied to every column of `df`, in place."""
+    for name in df.columns:
+        df[name] = compact_column(df[name])
+    return df
+
+
+def chunks(n, chunk_rows=None):
+    """Row slices covering range(n), chunk_rows at a time (one slice without chunk_rows)."""
+    step = chunk_rows or max(n, 1)
+    return [slice(start, min(start + step, n)) for start in range(0, n, step)]
+
+
+def _status_kb(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    raise OSError(f"No {field} in /proc/self/status")
+
+
+class PeakMemory:
+    """
+    `with PeakMemory() as probe:` -> probe.report(), the process's peak RSS
+    while the block ran and how far it rose above the RSS at the start. The
+    kernel's high-water mark (VmHWM) is reset on entry through
+    /proc/self/clear_refs, so this costs two small file reads per request
+    (Linux only; elsewhere the report is empty). The mark is per process:
+    blocks overlapping in other threads share it, and only the first one
+    open resets it.
+    """
+
+    _lock = threading.Lock()
+    _open = 0
+
+    def __enter__(self):
+        cls = type(self)
+        self.start_kb = self.peak_kb = None
+        with cls._lock:
+            try:
+                if cls._open == 0:
+                    with open("/proc/self/clear_refs", "w") as f:
+                        f.write("5")
+                self.start_kb = _status_kb("VmRSS")
+            except OSError:
+                pass
+            cls._open += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        cls = type(self)
+        with cls._lock:
+            cls._open -= 1
+            if self.start_kb is not None:
+                try:
+                    self.peak_kb = _status_kb("VmHWM")
+                except OSError:
+                    self.start_kb = None
+        return False
+
+    def report(self):
+        if self.start_kb is None or self.peak_kb is None:
+            return {}
+        return {
+            "rss_start_mb": round(self.start_kb / 1024, 2),
+            "peak_rss_mb": round(self.peak_kb / 1024, 2),
+            "peak_increase_mb": round(max(self.peak_kb - self.start_kb, 0) / 1024, 2),
+        }
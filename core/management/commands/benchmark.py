@@ -0,0 +1,70 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import (
+    BASELINE_PATH, DEFAULT_SCALES, DEFAULT_THRESHOLD, SCALES, STAGES,
+    compare, load_report, run_benchmarks, save_report
+)
+
+
+def _names(value, known, label):
+    names = [v.strip() for v in value.split(",") if v.strip()]
+    unknown = [v for v in names if v not in known]
+    if unknown:
+        raise CommandError(f"Unknown {label}: {unknown}. Use any of {list(known)}")
+    return names
+
+
+class Command(BaseCommand):
+    help = ("Time each hot stage (enrichment, priority models, KNN, vehicle assignment, SOP allocation, "
+            "serialisation) on synthetic inputs from assets/products.csv, and compare with a saved baseline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {list(STAGES)}")
+        parser.add_argument("--scales", default=",".join(DEFAULT_SCALES), help=f"Comma-separated subset of {list(SCALES)}")
+        parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage and scale (median is reported)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the full report (JSON) here")
+        parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline report to save to / compare with")
+        parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+        parser.add_argument("--check", action="store_true",
+                            help="Compare with the baseline and exit non-zero on a regression")
+        parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                            help="Allowed slowdown over the baseline (0.25 = 25%%)")
+        parser.add_argument("--verbose-stages", action="store_true", help="Keep the handlers' own prints")
+
+    def handle(self, *args, **options):
+        stages = _names(options["stages"], STAGES, "stages")
+        scales = _names(options["scales"], SCALES, "scales")
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1")
+        if options["check"] and not os.path.exists(options["baseline"]):
+            raise CommandError(f"No baseline at {options['baseline']}; run with --save-baseline first")
+
+        self.stdout.write(f"🏁 Benchmarking {stages} at {scales} ({options['repeat']} runs each)")
+        report = run_benchmarks(
+            stages, scales, options["repeat"], options["seed"],
+            quiet=not options["verbose_stages"], log=self.stdout.write
+        )
+
+        if options["output"]:
+            save_report(report, options["output"])
+            self.stdout.write(f"💾 Report written to {options['output']}")
+        if options["save_baseline"]:
+            save_report(report, options["baseline"])
+            self.stdout.write(f"💾 Baseline saved to {options['baseline']}")
+
+        if options["check"]:
+            rows, regressions = compare(report, load_report(options["baseline"]), options["threshold"])
+            for row in rows:
+                flag = "❌" if row["regressed"] else "✅"
+                self.stdout.write(
+                    f"{flag} {row['stage']:<24} {row['scale']:>5}  {row['baseline_seconds'] * 1000:10.2f} ms -> "
+                    f"{row['seconds'] * 1000:10.2f} ms  (x{row['ratio']})"
+                )
+            if regressions:
+                raise CommandError(
+                    f"{len(regressions)} stage(s) slower than the baseline by more than {options['threshold']:.0%}"
+                )
+            self.stdout.write(f"✅ No regressions beyond {options['threshold']:.0%}")
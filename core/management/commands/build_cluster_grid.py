@@ -0,0 +1,43 @@
+import json
+import os
+import time
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from core.cluster_engine import ClusterGrid, agreement_report
+from core.dispatch import KNN_GRID_PATH
+from core.model_registry import registry
+
+
+class Command(BaseCommand):
+    help = "Distil the dispatch KNN into the cluster lookup grid used by cluster_mode=fast/grid, and report agreement."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orders", action="append", default=[],
+                            help="CSV of /api/dispatch/ order rows to include in the agreement report (repeatable)")
+        parser.add_argument("--output", default=KNN_GRID_PATH, help="Where to write the grid (.npz)")
+
+    def handle(self, *args, **options):
+        knn_entry = registry.entry("dispatch_knn")
+        scaler_entry = registry.entry("dispatch_scaler")
+
+        self.stdout.write(f"🧭 Building cluster grid from KNN {knn_entry.version} / scaler {scaler_entry.version}")
+        started = time.perf_counter()
+        grid = ClusterGrid.build(knn_entry.obj, scaler_entry.obj, knn_entry.checksum, scaler_entry.checksum)
+        self.stdout.write(f"✅ Grid {list(grid.labels.shape)} built in {time.perf_counter() - started:.1f}s "
+                          f"({grid.boundary.mean():.1%} boundary cells)")
+
+        frames = {f"orders:{os.path.basename(path)}": self.load_orders(path) for path in options["orders"]}
+        grid.report = agreement_report(grid, knn_entry.obj, scaler_entry.obj, frames)
+        grid.save(options["output"])
+
+        self.stdout.write(json.dumps(grid.report, indent=2))
+        self.stdout.write(f"💾 Saved to {options['output']}")
+
+    def load_orders(self, path):
+        df = pd.read_csv(path)
+        if "ML_Priority_Score" not in df.columns:
+            priority_model = registry.get("dispatch_priority")
+            df["ML_Priority_Score"] = priority_model.predict(df[list(priority_model.feature_names_in_)])
+        return df
@@ -0,0 +1,46 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.model_footprint import SCENARIOS, run_footprint
+
+
+class Command(BaseCommand):
+    help = ("Cold-start time and per-worker RSS / PSS / USS of N forked workers, with and without "
+            "model preloading and memory-mapped model artifacts.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                            help=f"Comma-separated subset of {list(SCENARIOS)}")
+        parser.add_argument("--output", help="Write the report (JSON) here")
+
+    def handle(self, *args, **options):
+        scenarios = [s.strip() for s in options["scenarios"].split(",") if s.strip()]
+        unknown = [s for s in scenarios if s not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {unknown}. Use any of {list(SCENARIOS)}")
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        self.stdout.write(f"🏁 Measuring {scenarios} with {options['workers']} workers each")
+        try:
+            results = run_footprint(scenarios, options["workers"], log=self.stdout.write)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+
+        if "baseline" in results and "preload_mmap" in results:
+            before, after = results["baseline"], results["preload_mmap"]
+            if "total_pss_mb" in before and "total_pss_mb" in after:
+                self.stdout.write(
+                    f"✅ preload + mmap vs baseline: total PSS {before['total_pss_mb']} -> {after['total_pss_mb']} MB, "
+                    f"worker USS {before['worker_uss_mb']} -> {after['worker_uss_mb']} MB, "
+                    f"cold start {before['cold_start_seconds']} -> {after['cold_start_seconds']} s"
+                )
+
+        if options["output"]:
+            os.makedirs(os.path.dirname(os.path.abspath(options["output"])), exist_ok=True)
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"💾 Report written to {options['output']}")
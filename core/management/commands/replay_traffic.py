@@ -0,0 +1,88 @@
+import contextlib
+import io
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.capture import capture_path
+from core.replay import TARGETS, ClientSender, HTTPSender, load_captures, replay, start_wsgi_server, summarize
+
+
+class Command(BaseCommand):
+    help = ("Replay requests captured by settings.REQUEST_CAPTURE through the Django test client, a local "
+            "WSGI server or a running server, at a given concurrency and rate; report throughput, latency "
+            "percentiles and error rates per endpoint.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--capture", help="Capture file (default: settings.REQUEST_CAPTURE['PATH'])")
+        parser.add_argument("--target", choices=TARGETS, default="client")
+        parser.add_argument("--url", help="Base URL of the server for --target url (e.g. http://127.0.0.1:8000)")
+        parser.add_argument("--port", type=int, default=0, help="Port for --target wsgi (0 picks a free one)")
+        parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+        parser.add_argument("--rate", type=float, default=0, help="Requests per second over all threads (0 = no limit)")
+        parser.add_argument("--repeat", type=int, default=1, help="Passes over the captured requests")
+        parser.add_argument("--limit", type=int, help="Replay only the first N captured requests")
+        parser.add_argument("--paths", help="Comma-separated request paths to replay (default: all captured)")
+        parser.add_argument("--output", help="Write the report (JSON) here")
+        parser.add_argument("--verbose-handlers", action="store_true", help="Keep the handlers' own prints")
+
+    def handle(self, *args, **options):
+        path = options["capture"] or capture_path()
+        if not os.path.exists(path):
+            raise CommandError(f"No capture file at {path}; enable settings.REQUEST_CAPTURE first")
+        if options["concurrency"] < 1 or options["repeat"] < 1:
+            raise CommandError("--concurrency and --repeat must be at least 1")
+        if options["rate"] < 0:
+            raise CommandError("--rate must not be negative")
+        if options["target"] == "url" and not options["url"]:
+            raise CommandError("--target url needs --url")
+
+        paths = [p.strip() for p in (options["paths"] or "").split(",") if p.strip()]
+        try:
+            records = load_captures(path, paths or None, options["limit"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not records:
+            raise CommandError(f"No captured requests to replay in {path}")
+
+        server = None
+        if options["target"] == "client":
+            send = ClientSender()
+        elif options["target"] == "wsgi":
+            server, base_url = start_wsgi_server(options["port"])
+            send = HTTPSender(base_url)
+        else:
+            try:
+                send = HTTPSender(options["url"])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+        self.stdout.write(
+            f"🔁 Replaying {len(records)} requests x{options['repeat']} via {options['target']} "
+            f"(concurrency {options['concurrency']}, rate {options['rate'] or 'unlimited'})"
+        )
+        quiet = contextlib.nullcontext() if options["verbose_handlers"] else contextlib.redirect_stdout(io.StringIO())
+        try:
+            with quiet:
+                samples, elapsed = replay(records, send, options["concurrency"], options["rate"] or None, options["repeat"])
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+
+        report = {"target": options["target"], "capture": str(path), "concurrency": options["concurrency"],
+                  "rate": options["rate"] or None, **summarize(samples, elapsed)}
+        for name, stats in {**report["endpoints"], "overall": report["overall"]}.items():
+            latency = stats["latency_ms"]
+            self.stdout.write(
+                f"{'❌' if stats['errors'] else '✅'} {name:<28} {stats['requests']:>6} req  "
+                f"{stats['throughput_rps']:8.2f} req/s  p50 {latency['p50']:8.1f} ms  p95 {latency['p95']:8.1f} ms  "
+                f"p99 {latency['p99']:8.1f} ms  errors {stats['error_rate']:.2%}"
+            )
+
+        if options["output"]:
+            os.makedirs(os.path.dirname(os.path.abspath(options["output"])), exist_ok=True)
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"💾 Report written to {options['output']}")
@@ -0,0 +1,303 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+from django.conf import settings
+
+from .result_store import SQLiteStore, json_dumps
+
+# 🗂️ Versioned product master (override with settings.PRODUCT_MASTER)
+#   PATH          -> SQLite file holding the live master rows, keyed (and indexed) by Product_ID
+#   KEEP_VERSIONS -> versions whose per-product change log is kept; a cache older than that reloads in full
+DEFAULT_PRODUCT_MASTER = {
+    "PATH": os.path.join(os.path.dirname(__file__), '..', 'var', 'product_master.sqlite3'),
+    "KEEP_VERSIONS": 500,
+}
+
+# 🧾 Product_IDs listed per kind in a change report (counts are always complete)
+REPORT_IDS = 1000
+
+# SQLite limits bound parameters per statement
+_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS master_rows (
+    product_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    data TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS master_changes (
+    version INTEGER NOT NULL,
+    product_id TEXT NOT NULL,
+    op TEXT NOT NULL,
+    PRIMARY KEY (version, product_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS master_versions (
+    version INTEGER PRIMARY KEY,
+    created REAL NOT NULL,
+    source TEXT NOT NULL,
+    inserted INTEGER NOT NULL,
+    updated INTEGER NOT NULL,
+    deleted INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    columns TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS master_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+VERSION_KEYS = ["version", "created", "source", "inserted", "updated", "deleted", "rows", "columns"]
+
+
+def _values(frame):
+    """Row lists of plain Python values, NaN / NA as None."""
+    return frame.astype(object).where(frame.notna(), None).to_numpy().tolist()
+
+
+def _product_ids(frame):
+    if "Product_ID" not in frame.columns:
+        raise ValueError("Master rows need a 'Product_ID' column")
+    ids = frame["Product_ID"]
+    if ids.isna().any():
+        raise ValueError("Master rows have an empty Product_ID")
+    ids = ids.astype(str).tolist()
+    if len(set(ids)) != len(ids):
+        raise ValueError("Duplicate Product_ID values in master rows")
+    return ids
+
+
+def _decode(data, columns):
+    """Stored JSON row lists -> DataFrame (one json.loads for the whole batch)."""
+    if not data:
+        return pd.DataFrame(columns=columns)
+    return pd.DataFrame(json.loads("[" + ",".join(data) + "]"), columns=columns)
+
+
+def _listed(ids):
+    return ids[:REPORT_IDS]
+
+
+class MasterStore(SQLiteStore):
+    """
+    The product master as rows keyed by Product_ID in a SQLite file, so
+    changing a few products touches only their rows (the primary key is the
+    on-disk Product_ID index). Every write, whether an upsert, a delete or a
+    full replace, runs in one BEGIN IMMEDIATE transaction and commits as one
+    new version: readers see all of it or none of it. Rows whose content did
+    not change are left alone, and a write that changes nothing creates no
+    version. Each version logs the Product_IDs it touched, so a cache at
+    version V can fetch only what changed since V.
+    """
+
+    schema = SCHEMA
+
+    def __init__(self, path, keep_versions=500):
+        self.keep_versions = keep_versions
+        super().__init__(path)
+
+    def head(self, conn=None):
+        """The latest version (version 0 with no columns while the store is empty)."""
+        conn = conn or self._connection()
+        row = conn.execute(
+            f"SELECT {', '.join(VERSION_KEYS)} FROM master_versions ORDER BY version DESC LIMIT 1"
+        ).fetchone()
+        if row is None:
+            return {"version": 0, "created": None, "source": None, "inserted": 0, "updated": 0,
+                    "deleted": 0, "rows": 0, "columns": []}
+        return {**dict(zip(VERSION_KEYS, row)), "columns": json.loads(row[-1])}
+
+    def version(self):
+        row = self._connection().execute("SELECT MAX(version) FROM master_versions").fetchone()
+        return row[0] or 0
+
+    def versions(self, limit=20):
+        rows = self._connection().execute(
+            f"SELECT {', '.join(VERSION_KEYS[:-1])} FROM master_versions ORDER BY version DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [dict(zip(VERSION_KEYS, row)) for row in rows]
+
+    def meta(self, key, conn=None):
+        conn = conn or self._connection()
+        row = conn.execute("SELECT value FROM master_meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _set_meta(self, conn, key, value):
+        conn.execute("INSERT OR REPLACE INTO master_meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _stored(self, conn, product_ids):
+        """{product_id: stored JSON row} for the ids that exist, looked up through the primary key."""
+        found = {}
+        for i in range(0, len(product_ids), _BATCH):
+            batch = product_ids[i:i + _BATCH]
+            found.update(conn.execute(
+                f"SELECT product_id, data FROM master_rows WHERE product_id IN ({', '.join('?' * len(batch))})",
+                batch
+            ))
+        return found
+
+    def rows(self, product_ids):
+        """(columns, stored row lists for the ids that exist, ids that don't)."""
+        product_ids = [str(pid) for pid in product_ids]
+        with self._read() as conn:
+            columns = self.head(conn)["columns"]
+            found = self._stored(conn, product_ids)
+        missing = [pid for pid in product_ids if pid not in found]
+        return columns, [json.loads(found[pid]) for pid in product_ids if pid in found], missing
+
+    def load(self):
+        """(head, DataFrame) of the whole master, read in one transaction."""
+        with self._read() as conn:
+            head = self.head(conn)
+            data = [d for (d,) in conn.execute("SELECT data FROM master_rows")]
+        return head, _decode(data, head["columns"])
+
+    def delta(self, since):
+        """
+        (head, DataFrame of rows inserted or updated after version `since`,
+        Product_IDs deleted after it), or None once the change log no longer
+        reaches back to `since`.
+        """
+        with self._read() as conn:
+            head = self.head(conn)
+            if since < (self.meta("changes_from", conn) or 0) or since > head["version"]:
+                return None
+            changed = conn.execute(
+                "SELECT c.product_id, r.data FROM "
+                "(SELECT DISTINCT product_id FROM master_changes WHERE version > ?) c "
+                "LEFT JOIN master_rows r ON r.product_id = c.product_id", (since,)
+            ).fetchall()
+        deleted = [pid for pid, data in changed if data is None]
+        return head, _decode([data for _, data in changed if data is not None], head["columns"]), deleted
+
+    def changes(self, since, offset=0, limit=1000, until=None):
+        """
+        Latest operation per Product_ID over versions (since, until], paged.
+        full_reload is set when the change log no longer reaches back to `since`.
+        """
+        with self._read() as conn:
+            latest = self.head(conn)["version"]
+            until = latest if until is None else min(until, latest)
+            page = {"since": since, "until": until, "version": latest}
+            if since < (self.meta("changes_from", conn) or 0):
+                return {**page, "full_reload": True, "total": None, "changes": []}
+            total = conn.execute(
+                "SELECT COUNT(DISTINCT product_id) FROM master_changes WHERE version > ? AND version <= ?",
+                (since, until)
+            ).fetchone()[0]
+            # SQLite takes the bare op column from the row holding MAX(version)
+            rows = conn.execute(
+                "SELECT product_id, op, MAX(version) FROM master_changes WHERE version > ? AND version <= ? "
+                "GROUP BY product_id ORDER BY product_id LIMIT ? OFFSET ?", (since, until, limit, offset)
+            ).fetchall()
+        return {**page, "full_reload": False, "total": total,
+                "changes": [{"product_id": pid, "op": op, "version": version} for pid, op, version in rows]}
+
+    def upsert(self, frame, source="upsert"):
+        """Insert new Product_IDs and overwrite the given columns of existing ones."""
+        with self._connect() as conn:
+            head = self.head(conn)
+            columns = head["columns"] or list(frame.columns)
+            unknown = [col for col in frame.columns if col not in columns]
+            if unknown:
+                raise ValueError(f"Unknown master columns: {unknown}. Expected any of {columns}")
+            product_ids = _product_ids(frame)
+            existing = self._stored(conn, product_ids)
+
+            positions = [columns.index(col) for col in frame.columns]
+            blank = [None] * len(columns)
+            rows = {}
+            for pid, values in zip(product_ids, _values(frame)):
+                row = json.loads(existing[pid]) if pid in existing else list(blank)
+                for pos, value in zip(positions, values):
+                    row[pos] = value
+                rows[pid] = row
+            return self._commit(conn, head, columns, rows, existing, [], source)
+
+    def delete(self, product_ids, source="delete"):
+        product_ids = list(dict.fromkeys(str(pid) for pid in product_ids))
+        with self._connect() as conn:
+            head = self.head(conn)
+            existing = self._stored(conn, product_ids)
+            missing = [pid for pid in product_ids if pid not in existing]
+            return self._commit(conn, head, head["columns"], {}, existing, list(existing), source, missing)
+
+    def replace(self, frame, source="replace", csv_stat=None):
+        """Make `frame` the whole master: diffed against the stored rows, so only real changes are written."""
+        product_ids = _product_ids(frame)
+        rows = dict(zip(product_ids, _values(frame)))
+        with self._connect() as conn:
+            head = self.head(conn)
+            existing = dict(conn.execute("SELECT product_id, data FROM master_rows"))
+            deleted = [pid for pid in existing if pid not in rows]
+            report = self._commit(conn, head, list(frame.columns), rows, existing, deleted, source)
+            if csv_stat is not None:
+                self._set_meta(conn, "csv", csv_stat)
+            return report
+
+    def _commit(self, conn, head, columns, rows, existing, deleted, source, missing=()):
+        inserted, updated, writes = [], [], []
+        for pid, row in rows.items():
+            data = json_dumps(row)
+            old = existing.get(pid)
+            if old == data:
+                continue
+            (inserted if old is None else updated).append(pid)
+            writes.append((pid, data))
+
+        report = {
+            "previous_version": head["version"],
+            "version": head["version"],
+            "source": source,
+            "inserted": len(inserted),
+            "updated": len(updated),
+            "deleted": len(deleted),
+            "unchanged": len(rows) - len(writes),
+            "missing": list(missing),
+            "rows": head["rows"],
+            "product_ids": {"inserted": _listed(inserted), "updated": _listed(updated), "deleted": _listed(deleted)},
+        }
+        if not writes and not deleted and columns == head["columns"]:
+            return report
+
+        version = head["version"] + 1
+        conn.executemany(
+            "INSERT OR REPLACE INTO master_rows (product_id, version, data) VALUES (?, ?, ?)",
+            [(pid, version, data) for pid, data in writes]
+        )
+        conn.executemany("DELETE FROM master_rows WHERE product_id = ?", [(pid,) for pid in deleted])
+        conn.executemany(
+            "INSERT INTO master_changes (version, product_id, op) VALUES (?, ?, ?)",
+            [(version, pid, "upsert") for pid, _ in writes] + [(version, pid, "delete") for pid in deleted]
+        )
+        report["version"] = version
+        report["rows"] = head["rows"] + len(inserted) - len(deleted)
+        conn.execute(
+            f"INSERT INTO master_versions ({', '.join(VERSION_KEYS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (version, time.time(), source, len(inserted), len(updated), len(deleted), report["rows"], json.dumps(columns))
+        )
+        self._prune(conn, version)
+        return report
+
+    def _prune(self, conn, version):
+        floor = version - self.keep_versions
+        if floor > (self.meta("changes_from", conn) or 0):
+            conn.execute("DELETE FROM master_changes WHERE version <= ?", (floor,))
+            self._set_meta(conn, "changes_from", floor)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_master_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = {**DEFAULT_PRODUCT_MASTER, **getattr(settings, "PRODUCT_MASTER", {})}
+                _store = MasterStore(config["PATH"], config["KEEP_VERSIONS"])
+    return _store
@@ -0,0 +1,228 @@
+import bisect
+import threading
+import time
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, JsonResponse
+from rest_framework.renderers import JSONRenderer
+
+from .model_registry import registry
+
+# 📈 Stage timings / row counts / model loads, exposed as Prometheus text at /metrics
+# (override with settings.METRICS). Values are per server process.
+DEFAULT_METRICS = {
+    "ENABLED": True,
+    # Histogram upper bounds in seconds
+    "BUCKETS": [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0],
+}
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Minimal in-process metric store: histograms, counters and gauges keyed by
+    (metric name, label values). One lock guards every update; each update is
+    a few list / dict operations, so recording costs microseconds.
+    """
+
+    # name -> (type, help, label names)
+    METRICS = {
+        "mlapi_stage_seconds": ("histogram", "Time spent in a named processing stage", ("component", "stage")),
+        "mlapi_stage_rows_total": ("counter", "Rows processed by a named stage", ("component", "stage")),
+        "mlapi_stage_errors_total": ("counter", "Stages that raised", ("component", "stage")),
+        "mlapi_request_seconds": ("histogram", "API request latency", ("view", "method", "status")),
+        "mlapi_model_loads_total": ("counter", "Model artifacts (re)loaded", ("model",)),
+        "mlapi_model_load_seconds": ("gauge", "Duration of the latest load of a model", ("model",)),
+        "mlapi_model_generation": ("gauge", "Reload generation of the loaded model", ("model",)),
+    }
+
+    def __init__(self, buckets):
+        self.buckets = list(buckets)
+        self._values = {name: {} for name in self.METRICS}
+        self._lock = threading.Lock()
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            series = self._values[name]
+            histogram = series.get(labels)
+            if histogram is None:
+                histogram = series[labels] = Histogram(self.buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            series = self._values[name]
+            series[labels] = series.get(labels, 0) + amount
+
+    def set(self, name, labels, value):
+        with self._lock:
+            self._values[name][labels] = value
+
+    def render(self):
+        """Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, label_names) in self.METRICS.items():
+                series = self._values[name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(series.items()):
+                    label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(label_names, labels))
+                    if kind != "histogram":
+                        lines.append(f"{name}{{{label_text}}} {_number(value)}")
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + ["+Inf"], value.counts):
+                        cumulative += count
+                        le = bound if bound == "+Inf" else _number(bound)
+                        lines.append(f'{name}_bucket{{{label_text},le="{le}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{label_text}}} {_number(value.sum)}")
+                    lines.append(f"{name}_count{{{label_text}}} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "labels", "count", "started")
+
+    def __init__(self, metrics, component, stage, rows):
+        self.metrics = metrics
+        self.labels = (component, stage)
+        self.count = rows
+
+    def rows(self, n):
+        self.count = n
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        metrics = self.metrics
+        metrics.observe("mlapi_stage_seconds", self.labels, time.perf_counter() - self.started)
+        if self.count:
+            metrics.inc("mlapi_stage_rows_total", self.labels, int(self.count))
+        if exc_type is not None:
+            metrics.inc("mlapi_stage_errors_total", self.labels)
+        return False
+
+
+class _NoopTimer:
+    __slots__ = ()
+
+    def rows(self, n):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_TIMER = _NoopTimer()
+
+_metrics = None
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def get_metrics():
+    """The process-wide MetricsRegistry, or None when settings.METRICS disables it."""
+    global _metrics, _configured
+    if not _configured:
+        with _configure_lock:
+            if not _configured:
+                from django.conf import settings
+                config = {**DEFAULT_METRICS, **getattr(settings, "METRICS", {})}
+                _metrics = MetricsRegistry(config["BUCKETS"]) if config["ENABLED"] else None
+                _configured = True
+    return _metrics
+
+
+def stage(component, name, rows=None):
+    """
+    `with stage("dispatch", "clustering", rows=len(df)):` records the block's
+    latency (and rows) under component/stage. A shared no-op when disabled.
+    """
+    metrics = _metrics if _configured else get_metrics()
+    if metrics is None:
+        return NOOP_TIMER
+    return _StageTimer(metrics, component, name, rows)
+
+
+def _on_model_load(name, entry):
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.inc("mlapi_model_loads_total", (name,))
+        metrics.set("mlapi_model_load_seconds", (name,), round(entry.load_seconds, 6))
+        metrics.set("mlapi_model_generation", (name,), entry.generation)
+
+
+registry.on_load(_on_model_load)
+
+
+class MetricsMiddleware:
+    """Request latency per URL name, method and status code (dropped from the chain when disabled)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.metrics = get_metrics()
+        if self.metrics is None:
+            raise MiddlewareNotUsed()
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, "resolver_match", None)
+        view = (match.url_name or match.view_name) if match is not None else "unmatched"
+        self.metrics.observe(
+            "mlapi_request_seconds", (view or "unnamed", request.method, str(response.status_code)),
+            time.perf_counter() - started
+        )
+        return response
+
+
+def render_stage(renderer_context):
+    """Timer for a response render, under the view's `metrics_component` (or its class name)."""
+    view = (renderer_context or {}).get("view")
+    component = getattr(view, "metrics_component", None) or (type(view).__name__ if view else "unknown")
+    return stage(component, "render")
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that records serialisation time as the view's render stage."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with render_stage(renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+def metrics_view(request):
+    metrics = get_metrics()
+    if metrics is None:
+        return JsonResponse({"error": "Metrics are disabled (settings.METRICS['ENABLED'])"}, status=404)
+    return HttpResponse(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,9 +1,40 @@
+import pickle
 import pandas as pd
 import numpy as np
 
+LOG_COLUMNS = ["urgency", "fragile", "temp", "capacity_required", "Assigned_Zone", "Stored", "Remaining_Unallocated"]
+# With spillover: {zone: units stored} per request, greedy zone first, then next-best zones by Q-value.
+# Assigned_Zone stays the greedy zone (the policy's pick), even when the split holds none of its units.
+SPLIT_COLUMN = "Zone_Split"
+
+
 def convert_used_to_available(used_map, max_per_cell=100):
     return {zone: max_per_cell - used for zone, used in used_map.items()}
 
+
+def compile_policy(model):
+    """
+    Precompute the greedy action and the full Q-value ranking of actions per
+    state once, so allocation and spillover are lookups instead of an argmax
+    / sort per request. Returns a new dict; the original keys are kept so
+    predict_best_zone() still works on it.
+    """
+    if "ranked_actions" in model:
+        return model
+    q_table = np.asarray(model["q_table"])
+    compiled = dict(model)
+    compiled["greedy_actions"] = np.argmax(q_table, axis=1)
+    # Best first; ties keep action order, so column 0 is always the argmax
+    compiled["ranked_actions"] = np.argsort(-q_table, axis=1, kind="stable")
+    compiled["action_names"] = np.asarray(model["actions"], dtype=object)
+    return compiled
+
+
+def load_qtable_policy(path):
+    with open(path, "rb") as f:
+        return compile_policy(pickle.load(f))
+
+
 def predict_best_zone(state, model):
     q_table = model["q_table"]
     state_to_index = model["state_to_index"]
@@ -16,48 +47,246 @@ def predict_best_zone(state, model):
     action_idx = np.argmax(q_table[state_idx])
     return actions[action_idx]
 
-def process_batch_allocations_qtable(requests, model, capacity_map):
-    log = []
-    cap = capacity_map.copy()
 
-    for i, req in enumerate(requests):
+def _int_column(values):
+    """
+    int() over a column. Clean integer/bool columns convert in one step; any
+    other column goes value by value so failures carry the same message int()
+    raises. Returns (int64 array, error array with None where ok).
+    """
+    values = np.asarray(values, dtype=object)
+    errors = np.full(len(values), None, dtype=object)
+    kind = pd.api.types.infer_dtype(values, skipna=False)
+    if kind in ("integer", "boolean"):
+        return values.astype(np.int64), errors
+
+    out = np.zeros(len(values), dtype=np.int64)
+    for i, v in enumerate(values):
         try:
-            state = (
-                req.get("urgency", "Medium"),
-                int(req.get("fragile", 0)),
-                int(req.get("temp", 0))
+            out[i] = int(v)
+        except Exception as e:
+            errors[i] = str(e)
+    return out, errors
+
+
+def _column(requests, name, default):
+    if name in requests.columns:
+        return requests[name].to_numpy(dtype=object)
+    return np.full(len(requests), default, dtype=object)
+
+
+def encode_states(urgency, fragile, temp, state_to_index):
+    """Bulk state -> Q-table row index (-1 for states the policy does not know)."""
+    u_codes, u_values = pd.factorize(pd.Series(urgency, dtype=object), use_na_sentinel=False)
+    f_codes, f_values = pd.factorize(np.asarray(fragile, dtype=np.int64))
+    t_codes, t_values = pd.factorize(np.asarray(temp, dtype=np.int64))
+
+    # One hashable int key per (urgency, fragile, temp) combination
+    key = (u_codes.astype(np.int64) * len(f_values) + f_codes) * len(t_values) + t_codes
+    combo_codes, combos = pd.factorize(key)
+
+    combo_index = np.empty(len(combos), dtype=np.int64)
+    for k, combo in enumerate(combos):
+        rest, t = divmod(int(combo), len(t_values))
+        u, f = divmod(rest, len(f_values))
+        combo_index[k] = state_to_index.get((u_values[u], int(f_values[f]), int(t_values[t])), -1)
+    return combo_index[combo_codes]
+
+
+def _deplete_by_zone(zone_idx, demand, start_capacity):
+    """
+    Per-zone sequential `stored = min(available, demand)` in request order,
+    computed from per-zone exclusive cumulative demand. Only valid when
+    demands and starting capacities are non-negative.
+    """
+    before = pd.Series(demand).groupby(zone_idx).cumsum().to_numpy() - demand
+    available = np.maximum(0, start_capacity[zone_idx] - before)
+    stored = np.minimum(available, demand)
+    remaining = np.maximum(0, demand - available)
+    return stored, remaining
+
+
+def _deplete_sequential(zone_idx, demand, start_capacity):
+    cap = start_capacity.copy()
+    stored = np.zeros(len(demand), dtype=cap.dtype)
+    remaining = np.zeros(len(demand), dtype=cap.dtype)
+    for i in range(len(demand)):
+        z = zone_idx[i]
+        available = cap[z]
+        stored[i] = min(available, demand[i])
+        remaining[i] = max(0, demand[i] - available)
+        cap[z] = max(0, available - stored[i])
+    return stored, remaining
+
+
+def _deplete_spillover(state_idx, zone_idx, demand, start_capacity, ranked_actions):
+    """
+    Like _deplete_by_zone, but demand the greedy zone cannot hold goes to the
+    state's next-best zones by Q-value, in request order. Everything before
+    the first request that overflows is the plain per-zone depletion; from
+    there each state keeps a cursor to the first zone in its ranking that
+    still has room (zones only fill up), so a step is O(1) amortised.
+    Returns (stored, remaining, per-request [(zone index, units)]).
+    """
+    stored, remaining = _deplete_by_zone(zone_idx, demand, start_capacity)
+    splits = [[(z, s)] if s > 0 else [] for z, s in zip(zone_idx.tolist(), stored.tolist())]
+    overflow = np.flatnonzero(remaining > 0)
+    if not len(overflow):
+        return stored, remaining, splits
+
+    first = overflow[0]
+    cap = start_capacity.copy()
+    np.subtract.at(cap, zone_idx[:first], stored[:first])
+    cap = cap.tolist()
+    rankings, cursors = {}, {}
+    states, demands = state_idx.tolist(), demand.tolist()
+
+    for i in range(first, len(demands)):
+        state = states[i]
+        ranking = rankings.get(state)
+        if ranking is None:
+            ranking = rankings[state] = ranked_actions[state].tolist()
+        k = cursors.get(state, 0)
+        need, parts = demands[i], []
+        while need > 0 and k < len(ranking):
+            z = ranking[k]
+            take = min(cap[z], need)
+            if take > 0:
+                cap[z] -= take
+                need -= take
+                parts.append((z, take))
+            if cap[z] <= 0:
+                k += 1
+        cursors[state] = k
+        splits[i] = parts
+        stored[i] = demands[i] - need
+        remaining[i] = need
+    return stored, remaining, splits
+
+
+def process_batch_allocations_qtable(requests, model, capacity_map, spillover=False):
+    """
+    Allocate every request to its greedy zone and deplete zone capacity in
+    request order. Accepts a DataFrame (or list of dicts) with urgency,
+    fragile, temp and capacity_required; returns (log DataFrame, updated cap).
+
+    With spillover, demand the greedy zone cannot take is stored in the next
+    best zones by Q-value, and the log gains a Zone_Split column saying where
+    the units went; Assigned_Zone is still the greedy zone. Batches with
+    negative demand or capacity keep the single-zone allocation.
+    """
+    if not isinstance(requests, pd.DataFrame):
+        requests = pd.DataFrame(list(requests), dtype=object)
+    policy = compile_policy(model)
+    n = len(requests)
+
+    urgency = _column(requests, "urgency", "Medium")
+    fragile, fragile_err = _int_column(_column(requests, "fragile", 0))
+    temp, temp_err = _int_column(_column(requests, "temp", 0))
+    demand, demand_err = _int_column(_column(requests, "capacity_required", 0))
+
+    # First failure wins, in the order the per-row code used to hit them
+    errors = fragile_err.copy()
+    for later in (temp_err, demand_err):
+        fill = pd.isna(errors) & pd.notna(later)
+        errors[fill] = later[fill]
+
+    state_idx = np.full(n, -1, dtype=np.int64)
+    parsed = pd.isna(errors)
+    try:
+        state_idx[parsed] = encode_states(urgency[parsed], fragile[parsed], temp[parsed], policy["state_to_index"])
+    except TypeError:
+        # Unhashable urgency values: look states up one by one
+        for i in np.flatnonzero(parsed):
+            try:
+                state_idx[i] = policy["state_to_index"].get((urgency[i], int(fragile[i]), int(temp[i])), -1)
+            except TypeError as e:
+                errors[i] = str(e)
+        parsed = pd.isna(errors)
+
+    for i in np.flatnonzero(parsed & (state_idx < 0)):
+        errors[i] = f"Invalid state: {(urgency[i], int(fragile[i]), int(temp[i]))}"
+    ok = pd.isna(errors)
+
+    # === Zone allocation over the whole batch ===
+    action_names = policy["action_names"]
+    cap = capacity_map.copy()
+    start_capacity = np.array([cap.get(zone, 0) for zone in action_names])
+    zone_idx = policy["greedy_actions"][state_idx[ok]]
+    d = demand[ok]
+
+    zones_hit = np.flatnonzero(np.bincount(zone_idx, minlength=len(action_names)))
+    splits = None
+
+    if (d >= 0).all() and (start_capacity[zones_hit] >= 0).all():
+        if spillover and (start_capacity >= 0).all():
+            stored, remaining, splits = _deplete_spillover(
+                state_idx[ok], zone_idx, d, start_capacity, policy["ranked_actions"]
             )
-            demand = int(req.get("capacity_required", 0))
+        else:
+            stored, remaining = _deplete_by_zone(zone_idx, d, start_capacity)
+    else:
+        stored, remaining = _deplete_sequential(zone_idx, d, start_capacity)
 
-            zone_key = predict_best_zone(state, model)
+    if len(zone_idx):
+        totals = np.zeros(len(action_names), dtype=stored.dtype)
+        if splits is None:
+            np.add.at(totals, zone_idx, stored)
+        else:
+            np.add.at(totals, [z for parts in splits for z, _ in parts],
+                      [units for parts in splits for _, units in parts])
+            zones_hit = np.union1d(zones_hit, np.flatnonzero(totals))
+        for z in zones_hit:
+            cap[action_names[z]] = max(0, (start_capacity[z] - totals[z]).item())
 
-            available = cap.get(zone_key, 0)
-            stored = min(available, demand)
-            remaining = max(0, demand - available)
+    if spillover:
+        if splits is None:
+            splits = [[(z, units)] for z, units in zip(zone_idx.tolist(), stored.tolist())]
+        split_values = np.full(n, None, dtype=object)
+        for i, parts in zip(np.flatnonzero(ok), splits):
+            split_values[i] = {action_names[z]: units for z, units in parts}
 
-            cap[zone_key] = max(0, available - stored)
+    for i in np.flatnonzero(~ok):
+        print(f"❌ Allocation error at row {i}: {errors[i]}")
 
-            log.append({
-                "urgency": state[0],
-                "fragile": state[1],
-                "temp": state[2],
-                "capacity_required": demand,
-                "Assigned_Zone": zone_key,
-                "Stored": stored,
-                "Remaining_Unallocated": remaining
-            })
+    if ok.all():
+        log = pd.DataFrame({
+            "urgency": urgency,
+            "fragile": fragile,
+            "temp": temp,
+            "capacity_required": demand,
+            "Assigned_Zone": action_names[zone_idx],
+            "Stored": stored,
+            "Remaining_Unallocated": remaining,
+        }, columns=LOG_COLUMNS)
+        if spillover:
+            log[SPLIT_COLUMN] = split_values
+        return log, cap
 
-        except Exception as e:
-            print(f"❌ Allocation error at row {i}: {e}")
-            log.append({
-                "urgency": req.get("urgency"),
-                "fragile": req.get("fragile"),
-                "temp": req.get("temp"),
-                "capacity_required": req.get("capacity_required"),
-                "Assigned_Zone": "ERROR",
-                "Stored": 0,
-                "Remaining_Unallocated": req.get("capacity_required"),
-                "error": str(e)
-            })
-
-    return pd.DataFrame(log), cap
+    # Mixed batch: build columns as Python lists so dtypes match a frame built from per-row dicts
+    bad = ~ok
+    columns = {
+        "urgency": urgency.copy(),
+        "fragile": fragile.astype(object),
+        "temp": temp.astype(object),
+        "capacity_required": demand.astype(object),
+        "Assigned_Zone": np.full(n, "ERROR", dtype=object),
+        "Stored": np.zeros(n, dtype=object),
+        "Remaining_Unallocated": np.zeros(n, dtype=object),
+    }
+    columns["Assigned_Zone"][ok] = action_names[zone_idx]
+    columns["Stored"][ok] = stored
+    columns["Remaining_Unallocated"][ok] = remaining
+    columns["urgency"][bad] = _column(requests, "urgency", None)[bad]
+    columns["fragile"][bad] = _column(requests, "fragile", None)[bad]
+    columns["temp"][bad] = _column(requests, "temp", None)[bad]
+    columns["capacity_required"][bad] = _column(requests, "capacity_required", None)[bad]
+    columns["Remaining_Unallocated"][bad] = columns["capacity_required"][bad]
+    if spillover:
+        for i in np.flatnonzero(bad):
+            split_values[i] = {}
+        columns[SPLIT_COLUMN] = split_values
+    columns["error"] = np.where(bad, errors, np.nan)
+
+    log = pd.DataFrame({name: values.tolist() for name, values in columns.items()})
+    return log, cap
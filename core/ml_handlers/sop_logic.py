@@ -1,15 +1,37 @@
 import os
 import pandas as pd
-import pickle
 import json  # ✅ for pretty printing JSON
-from core.ml_handlers.rl_utils import convert_used_to_available, process_batch_allocations_qtable
-
-# ✅ Global variable to store processed result for GET
-SOP_PROCESSED_RESULT = None
-
-def process_sop_data(payload):
-    global SOP_PROCESSED_RESULT
-
+from django.conf import settings
+from core.ml_handlers.rl_utils import (
+    convert_used_to_available, process_batch_allocations_qtable, load_qtable_policy, SPLIT_COLUMN
+)
+from core.model_registry import registry, MODELS_DIR
+from core.model_artifacts import mmap_loader
+from core.result_store import get_result_store
+from core.jobs import no_progress
+from core.metrics import stage
+from core.wire import FrameData
+
+SOP_MODEL_PATH = os.path.join(MODELS_DIR, "sop", "warehouse_rl_policy.pkl")
+# Greedy action and Q-value ranking of zones per state are precomputed once at load time
+registry.register("sop_policy", SOP_MODEL_PATH, mmap_loader(load_qtable_policy))
+
+def spillover_summary(log_df):
+    """Requests / units stored outside their greedy zone."""
+    if SPLIT_COLUMN not in log_df.columns:
+        return {"enabled": False}
+    spilled = [
+        units - split.get(zone, 0) if isinstance(split, dict) and isinstance(units, (int, float)) else 0
+        for zone, units, split in zip(log_df["Assigned_Zone"], log_df["Stored"].tolist(), log_df[SPLIT_COLUMN])
+    ]
+    return {
+        "enabled": True,
+        "requests_spilled": sum(1 for units in spilled if units > 0),
+        "units_spilled": int(sum(spilled)),
+    }
+
+
+def process_sop_data(payload, progress=no_progress):
     try:
         print("📥 /sop data received")
 
@@ -19,52 +41,73 @@ def process_sop_data(payload):
         if not isinstance(columns, list) or not columns:
             return {"error": "'columns' must be a non-empty list."}, 400
 
-        if not isinstance(data, list) or not data:
+        if not isinstance(data, (list, FrameData)) or not len(data):
             return {"error": "'data' must be a non-empty list of rows."}, 400
 
-        # ✅ Convert list of lists into list of dicts
-        structured_data = []
-        for i, row in enumerate(data):
-            if not isinstance(row, list) or len(row) != len(columns):
-                return {"error": f"Row {i} malformed"}, 400
-            structured_data.append(dict(zip(columns, row)))
+        # ♻️ Opt-in: demand the greedy zone cannot hold spills into the next-best zones by Q-value
+        spillover = payload.get("spillover", getattr(settings, "SOP_SPILLOVER", False))
+        if not isinstance(spillover, bool):
+            return {"error": "'spillover' must be true or false."}, 400
+
+        # ✅ Validate rows, then build one column-oriented frame (raw values kept as-is)
+        with stage("sop", "parse", rows=len(data)):
+            if isinstance(data, FrameData):
+                # Columnar payloads arrive as a typed frame already
+                structured_data = data.frame
+            else:
+                width = len(columns)
+                for i, row in enumerate(data):
+                    if not isinstance(row, list) or len(row) != width:
+                        return {"error": f"Row {i} malformed"}, 400
+                structured_data = pd.DataFrame(data, columns=columns, dtype=object)
+            # Repeated column names: the last one wins, as with per-row dicts
+            structured_data = structured_data.loc[:, ~structured_data.columns.duplicated(keep="last")]
 
         print(f"🟢 SOP Data received: {len(structured_data)} rows | Columns: {columns}")
 
-        model_path = "models/sop/warehouse_rl_policy.pkl"
-        if not os.path.exists(model_path):
+        if not os.path.exists(SOP_MODEL_PATH):
             return {"error": "Model file not found."}, 500
 
         try:
-            with open(model_path, "rb") as f:
-                model = pickle.load(f)
-            print("✅ Pickle Q-table Model loaded.")
+            model = registry.get("sop_policy")
+            print("✅ Pickle Q-table Model ready.")
         except Exception as e:
             return {"error": f"Model loading failed: {e}"}, 500
 
         # 📦 Used Map from first row
         zone_keys = ['A1', 'B1', 'C1', 'A2', 'B2', 'C2', 'A3', 'B3', 'C3']
-        used_map = {zone: int(structured_data[0].get(f"{zone}_used", 0)) for zone in zone_keys}
+        first_row = structured_data.iloc[0].to_dict()
+        used_map = {zone: int(first_row.get(f"{zone}_used", 0)) for zone in zone_keys}
         print("📊 Initial Used Map from Payload:")
         for k, v in used_map.items():
             print(f"  {k}: {v}")
 
         available_map = convert_used_to_available(used_map)
 
-        log_df, updated_cap = process_batch_allocations_qtable(structured_data, model, available_map)
+        progress(0.2, "allocation")
+        with stage("sop", "allocation", rows=len(structured_data)):
+            log_df, updated_cap = process_batch_allocations_qtable(structured_data, model, available_map, spillover)
+        spill_summary = spillover_summary(log_df)
 
         # ✅ Convert DataFrame to frontend-friendly format
-        result_json = {
-            "columns": log_df.columns.tolist(),
-            "data": log_df.values.tolist()
-        }
+        with stage("sop", "serialize", rows=len(log_df)):
+            result_json = {
+                "columns": log_df.columns.tolist(),
+                "data": log_df.values.tolist()
+            }
 
         # ✅ Print formatted JSON result preview
         # print("🧾 Formatted JSON Result Preview:")
         # print(json.dumps(result_json, indent=2))
 
-        # ✅ Store for GET access
-        SOP_PROCESSED_RESULT = result_json
+        # ✅ Store for GET access (keyed, shared across workers)
+        progress(0.8, "storing")
+        with stage("sop", "storing", rows=len(log_df)):
+            result_id = get_result_store().put("sop", result_json["columns"], result_json["data"], meta={
+                "updated_capacity": updated_cap,
+                "spillover": spill_summary,
+            })
+        print(f"🗄️ SOP result stored: {result_id}")
 
         # ✅ Debug output of full allocation log
         # print("📋 Allocation Log:")
@@ -76,6 +119,8 @@ def process_sop_data(payload):
             "status": "ok",
             "message": "Predictions complete",
             "rows": len(log_df),
+            "result_id": result_id,
+            "spillover": spill_summary,
             "result": result_json  # 👈 Final output is JSON style
         }, 200
 
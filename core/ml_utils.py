@@ -1,15 +1,22 @@
 import pandas as pd
 import os
 import traceback
-import pickle
 from sklearn.base import BaseEstimator
 from sklearn.preprocessing import LabelEncoder
+from .model_registry import registry, pickle_loader
+from .prediction_cache import predict_memoized
+from .metrics import stage
+from .tree_compiler import compiled_loader
+from .model_artifacts import mmap_loader
 
 # 📍 Model and Encoder Paths
 MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models', 'priority')
 MODEL_PATH = os.path.join(MODEL_DIR, 'priority_model.pkl')
 ENCODER_PATH = os.path.join(MODEL_DIR, 'priority_label_encoder.pkl')
 
+registry.register('priority_model', MODEL_PATH, mmap_loader(compiled_loader(pickle_loader)))
+registry.register('priority_encoder', ENCODER_PATH, pickle_loader)
+
 # 📊 Required Feature Columns
 # FEATURE_COLUMNS = [
 #     'Expiry_Days_Left',
@@ -42,16 +49,14 @@ def load_priority_model_and_encoder():
         if not os.path.exists(ENCODER_PATH):
             raise FileNotFoundError(f"Label encoder file not found: {ENCODER_PATH}")
 
-        with open(MODEL_PATH, 'rb') as f_model:
-            model = pickle.load(f_model)
-
-        with open(ENCODER_PATH, 'rb') as f_encoder:
-            label_encoder = pickle.load(f_encoder)
+        # 🗃️ Shared instances from the process-wide registry (loaded once)
+        model = registry.get('priority_model')
+        label_encoder = registry.get('priority_encoder')
 
         if not hasattr(model, 'predict'):
             raise AttributeError("Loaded model does not have 'predict' method.")
 
-        print("[OK] ✅ Model and encoder loaded successfully.")
+        print("[OK] ✅ Model and encoder ready.")
         return model, label_encoder
 
     except Exception as e:
@@ -83,11 +88,12 @@ def predict_priority(df: pd.DataFrame, model: BaseEstimator, label_encoder: Labe
             if not pd.api.types.is_numeric_dtype(X[col]):
                 raise TypeError(f"Feature '{col}' must be numeric.")
 
-        # 🔮 Predict encoded labels
-        encoded_preds = model.predict(X)
+        # 🔮 Predict encoded labels (repeated feature rows are scored once; small concurrent calls share one predict)
+        with stage('priority_model', 'predict', rows=len(X)):
+            encoded_preds = predict_memoized('priority_model', model, X)
 
-        # 🔠 Decode predictions
-        decoded_preds = label_encoder.inverse_transform(encoded_preds)
+            # 🔠 Decode predictions
+            decoded_preds = label_encoder.inverse_transform(encoded_preds)
 
         # 📝 Attach result
         df[PREDICTION_COLUMN] = decoded_preds
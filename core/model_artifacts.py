@@ -0,0 +1,116 @@
+import gc
+import glob
+import importlib
+import os
+import tempfile
+import time
+
+import joblib
+from django.conf import settings
+
+from .model_registry import registry, BASE_DIR, file_checksum
+
+# 🗺️ Shared model memory (override with settings.MODEL_ARTIFACTS)
+#   MMAP      -> each artifact is re-saved once as an uncompressed joblib file in CACHE_DIR and loaded
+#                with mmap_mode="r", so its NumPy arrays are read-only file-backed pages that every
+#                worker process shares through the page cache
+#   PRELOAD   -> load every registered model when mlserver.wsgi is imported, i.e. only in a serving
+#                process and, under gunicorn --preload, before it forks its workers, which then
+#                share the parent's pages (manage.py commands and tests load models on first use)
+DEFAULT_MODEL_ARTIFACTS = {
+    "MMAP": True,
+    "CACHE_DIR": os.path.join(BASE_DIR, "var", "model_cache"),
+    "PRELOAD": True,
+}
+
+# Modules whose import registers models with the registry
+MODEL_MODULES = ["core.dispatch", "core.ml_utils", "core.ml_handlers.sop_logic"]
+
+
+def _config():
+    return {**DEFAULT_MODEL_ARTIFACTS, **getattr(settings, "MODEL_ARTIFACTS", {})}
+
+
+def cache_path(path, checksum, cache_dir):
+    return os.path.join(cache_dir, f"{os.path.basename(path)}.{checksum[:16]}.joblib")
+
+
+def write_cache(obj, target):
+    """Dump atomically (temp file + rename), then drop older cached versions of the same artifact."""
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        joblib.dump(obj, tmp)
+        os.chmod(tmp, 0o644)  # mkstemp creates 0600; workers may run as another user
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    prefix = os.path.basename(target).rsplit(".", 2)[0]
+    for old in glob.glob(os.path.join(directory, glob.escape(prefix) + ".*.joblib")):
+        if old != target:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def mmap_loader(loader):
+    """
+    Registry loader serving what `loader` returns from a memory-mapped joblib
+    copy, keyed on the source file's checksum. The first process to load a
+    version writes the copy; a failure to write or read it falls back to
+    `loader` itself. The registry passes in the checksum it has already
+    computed, so the file is hashed once per load.
+    """
+    def load(path, checksum=None):
+        config = _config()
+        if not config["MMAP"]:
+            return loader(path)
+
+        target = cache_path(path, checksum or file_checksum(path), config["CACHE_DIR"])
+        if not os.path.exists(target):
+            obj = loader(path)
+            try:
+                write_cache(obj, target)
+                print(f"[OK] 🗺️ Memory-mappable copy written: {os.path.relpath(target, BASE_DIR)}")
+            except Exception as e:
+                print(f"[WARN] ⚠️ Could not write {target}: {e}; serving the in-memory model")
+                return obj
+        try:
+            return joblib.load(target, mmap_mode="r")
+        except Exception as e:
+            print(f"[WARN] ⚠️ Could not map {target}: {e}; loading {path} instead")
+            try:
+                os.remove(target)
+            except OSError:
+                pass
+            return loader(path)
+    load.takes_checksum = True
+    return load
+
+
+def preload_models():
+    """
+    Load every registered model now. Called from mlserver/wsgi.py; a missing
+    or broken artifact is reported and left to load (and fail) on first use.
+    Returns {name: seconds or error message}.
+    """
+    if not _config()["PRELOAD"]:
+        return {}
+
+    for module in MODEL_MODULES:
+        importlib.import_module(module)
+
+    started = time.perf_counter()
+    report = registry.preload()
+    loaded = sum(1 for v in report.values() if not isinstance(v, str))
+    print(f"[OK] 🚀 Preloaded {loaded}/{len(report)} models in {time.perf_counter() - started:.3f}s")
+
+    # Long-lived startup objects: keep the collector from touching (and copying) their pages after fork
+    gc.collect()
+    gc.freeze()
+    return report
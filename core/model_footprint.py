@@ -0,0 +1,139 @@
+import contextlib
+import importlib
+import io
+import multiprocessing
+import os
+import time
+import warnings
+
+import numpy as np
+
+# 📏 `python manage.py model_footprint`: cold start and per-worker memory of a pre-forking server,
+# with each combination of settings.MODEL_ARTIFACTS["PRELOAD"] / ["MMAP"]
+SCENARIOS = {
+    "baseline": {"MMAP": False, "PRELOAD": False},   # every worker unpickles its own copy
+    "preload": {"MMAP": False, "PRELOAD": True},
+    "mmap": {"MMAP": True, "PRELOAD": False},
+    "preload_mmap": {"MMAP": True, "PRELOAD": True},
+}
+
+
+def memory(pid):
+    """RSS / PSS / USS in MB from /proc/<pid>/smaps_rollup (Linux), or None."""
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 2),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 2),
+        "uss_mb": round((fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)) / 1024, 2),
+    }
+
+
+def first_request():
+    """What a worker's first dispatch request does with the models: load them and predict a few rows."""
+    import pandas as pd
+    from .model_registry import registry
+
+    registry.preload()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        try:
+            priority = registry.get("dispatch_priority")
+            names = list(priority.feature_names_in_)
+            priority.predict(pd.DataFrame(np.zeros((64, len(names))), columns=names))
+            knn = registry.get("dispatch_knn")
+            knn.predict(np.zeros((64, knn.n_features_in_)))
+        except Exception:
+            pass
+
+
+def _worker(conn, release):
+    started = time.perf_counter()
+    first_request()
+    conn.send({"pid": os.getpid(), "ready_seconds": time.perf_counter() - started})
+    release.wait()
+
+
+def _scenario(config, workers, queue):
+    """Runs in a fresh (spawned) process: Django start-up, then `workers` forked workers."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        from django.conf import settings
+        settings.MODEL_ARTIFACTS = {**getattr(settings, "MODEL_ARTIFACTS", {}), **config}
+
+        import django
+        started = time.perf_counter()
+        django.setup()
+        from .model_artifacts import MODEL_MODULES, preload_models
+        for module in MODEL_MODULES:
+            importlib.import_module(module)
+        # What mlserver/wsgi.py does in the server process before it forks
+        preload_models()
+        startup = time.perf_counter() - started
+
+        fork = multiprocessing.get_context("fork")
+        release = fork.Event()
+        procs, results = [], []
+        for _ in range(workers):
+            parent, child = fork.Pipe()
+            proc = fork.Process(target=_worker, args=(child, release), daemon=True)
+            proc.start()
+            procs.append((proc, parent))
+        for proc, parent in procs:
+            results.append(parent.recv())
+        for result in results:
+            result["memory"] = memory(result["pid"])
+        master = memory(os.getpid())
+        release.set()
+        for proc, _ in procs:
+            proc.join()
+
+    queue.put({"startup_seconds": startup, "master": master, "workers": results})
+
+
+def run_scenario(name, workers):
+    """Report for one scenario; each runs in its own interpreter so nothing is loaded beforehand."""
+    spawn = multiprocessing.get_context("spawn")
+    queue = spawn.Queue()
+    proc = spawn.Process(target=_scenario, args=(SCENARIOS[name], workers, queue))
+    proc.start()
+    raw = queue.get()
+    proc.join()
+
+    ready = [w["ready_seconds"] for w in raw["workers"]]
+    per_worker = [w["memory"] for w in raw["workers"] if w["memory"]]
+    report = {
+        "config": SCENARIOS[name],
+        "workers": workers,
+        "startup_seconds": round(raw["startup_seconds"], 4),
+        "worker_ready_seconds": round(float(np.mean(ready)), 4) if ready else None,
+        "cold_start_seconds": round(raw["startup_seconds"] + (max(ready) if ready else 0.0), 4),
+        "master": raw["master"],
+    }
+    if per_worker:
+        for key in ("rss_mb", "pss_mb", "uss_mb"):
+            report[f"worker_{key}"] = round(float(np.mean([m[key] for m in per_worker])), 2)
+        report["total_pss_mb"] = round(sum(m["pss_mb"] for m in per_worker) + (raw["master"] or {}).get("pss_mb", 0), 2)
+    return report
+
+
+def run_footprint(scenarios, workers, log=print):
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise RuntimeError("Measuring forked workers needs the 'fork' start method (Linux / macOS)")
+    if any(SCENARIOS[name]["MMAP"] for name in scenarios):
+        # Write the memory-mappable copies first, so mmap scenarios measure the steady state
+        run_scenario("mmap", 0)
+
+    results = {}
+    for name in scenarios:
+        results[name] = report = run_scenario(name, workers)
+        log(f"📏 {name:<13} cold start {report['cold_start_seconds'] * 1000:8.1f} ms  "
+            f"worker RSS {report.get('worker_rss_mb', 0):7.1f} MB  PSS {report.get('worker_pss_mb', 0):7.1f} MB  "
+            f"USS {report.get('worker_uss_mb', 0):7.1f} MB  total PSS {report.get('total_pss_mb', 0):8.1f} MB")
+    return results
@@ -0,0 +1,231 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+import traceback
+
+import joblib
+
+# 📍 All model artifacts live under <repo>/models
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MODELS_DIR = os.path.join(BASE_DIR, 'models')
+
+# ⏱️ How often (seconds) a get() is allowed to stat the file for changes
+DEFAULT_CHECK_INTERVAL = 2.0
+
+
+def pickle_loader(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def joblib_loader(path):
+    return joblib.load(path)
+
+
+def file_checksum(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LoadedModel:
+    """Immutable snapshot of one loaded artifact. Swapped as a whole on reload."""
+
+    __slots__ = ('name', 'path', 'obj', 'checksum', 'mtime_ns', 'size', 'loaded_at', 'load_seconds', 'generation')
+
+    def __init__(self, name, path, obj, checksum, mtime_ns, size, loaded_at, load_seconds, generation):
+        self.name = name
+        self.path = path
+        self.obj = obj
+        self.checksum = checksum
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.loaded_at = loaded_at
+        self.load_seconds = load_seconds
+        self.generation = generation
+
+    @property
+    def version(self):
+        return self.checksum[:12]
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "path": os.path.relpath(self.path, BASE_DIR),
+            "version": self.version,
+            "checksum": self.checksum,
+            "type": type(self.obj).__name__,
+            "size_bytes": self.size,
+            "mtime": self.mtime_ns / 1e9,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 6),
+            "generation": self.generation,
+        }
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of model artifacts.
+
+    Each artifact is deserialized once and shared read-only between requests.
+    get() re-stats the file at most every `check_interval` seconds; when the
+    mtime/size change and the checksum differs, the new file is loaded fully
+    before the reference is swapped, so in-flight requests keep the object
+    they already hold and never observe a half-loaded model.
+    """
+
+    def __init__(self, check_interval=DEFAULT_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._specs = {}
+        self._entries = {}
+        self._last_check = {}
+        self._listeners = []
+        # Guards the dicts only; each model loads under its own lock, so a slow
+        # reload of one artifact never holds up get() for the others
+        self._lock = threading.RLock()
+        self._model_locks = {}
+
+    def register(self, name, path, loader=joblib_loader):
+        """
+        `loader(path)` builds the object; a loader with a true `takes_checksum`
+        attribute is called as `loader(path, checksum=...)` with the file's
+        sha256, so it does not have to hash the file again.
+        """
+        with self._lock:
+            path = os.path.abspath(path)
+            spec = self._specs.get(name)
+            if spec is not None and spec == (path, loader):
+                return
+            self._specs[name] = (path, loader)
+            self._entries.pop(name, None)
+            self._last_check.pop(name, None)
+
+    def is_registered(self, name):
+        return name in self._specs
+
+    def on_load(self, callback):
+        """Call `callback(name, entry)` whenever a new object is loaded for a model."""
+        self._listeners.append(callback)
+
+    def current(self, name):
+        """The loaded entry as-is (no load, no file check), or None."""
+        return self._entries.get(name)
+
+    def get(self, name):
+        return self.entry(name).obj
+
+    def entry(self, name):
+        if name not in self._specs:
+            raise KeyError(f"Model '{name}' is not registered")
+
+        current = self._entries.get(name)
+        if current is None:
+            return self._load(name)
+
+        now = time.monotonic()
+        if now - self._last_check.get(name, 0.0) < self.check_interval:
+            return current
+
+        self._last_check[name] = now
+        try:
+            stat = os.stat(current.path)
+        except FileNotFoundError:
+            # Keep serving the last good model if the file disappears mid-deploy
+            return current
+
+        if stat.st_mtime_ns == current.mtime_ns and stat.st_size == current.size:
+            return current
+        return self._load(name, previous=current)
+
+    def reload(self, name=None):
+        names = [name] if name else list(self._entries)
+        for n in names:
+            self._load(n, previous=self._entries.get(n), force=True)
+        return self.info()
+
+    def info(self):
+        return {name: entry.to_dict() for name, entry in self._entries.items()}
+
+    def preload(self):
+        """Load every registered model that is not loaded yet. Returns {name: load seconds or error}."""
+        report = {}
+        for name in list(self._specs):
+            try:
+                report[name] = round(self.entry(name).load_seconds, 6)
+            except Exception as e:
+                print(f"[WARN] ⚠️ Model '{name}' not preloaded: {e}")
+                report[name] = f"{type(e).__name__}: {e}"
+        return report
+
+    def _model_lock(self, name):
+        with self._lock:
+            lock = self._model_locks.get(name)
+            if lock is None:
+                lock = self._model_locks[name] = threading.Lock()
+            return lock
+
+    def _load(self, name, previous=None, force=False):
+        with self._model_lock(name):
+            current = self._entries.get(name)
+            # Another thread may have finished the reload while we waited
+            if current is not None and current is not previous and not force:
+                return current
+
+            with self._lock:
+                path, loader = self._specs[name]
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Model file not found: {path}")
+
+            stat = os.stat(path)
+            checksum = file_checksum(path)
+
+            if current is not None and current.checksum == checksum and not force:
+                # Touched but unchanged: keep the loaded object, refresh the stat
+                refreshed = LoadedModel(
+                    name, path, current.obj, checksum, stat.st_mtime_ns, stat.st_size,
+                    current.loaded_at, current.load_seconds, current.generation
+                )
+                self._store(name, refreshed)
+                return refreshed
+
+            print(f"[INFO] 🔄 Loading model '{name}' from: {path}")
+            started = time.perf_counter()
+            try:
+                if getattr(loader, "takes_checksum", False):
+                    obj = loader(path, checksum=checksum)
+                else:
+                    obj = loader(path)
+            except Exception:
+                print(f"[ERR] ❌ Failed to load model '{name}':")
+                traceback.print_exc()
+                if current is not None:
+                    return current
+                raise
+            elapsed = time.perf_counter() - started
+
+            generation = current.generation + 1 if current is not None else 1
+            loaded = LoadedModel(
+                name, path, obj, checksum, stat.st_mtime_ns, stat.st_size,
+                time.time(), elapsed, generation
+            )
+            self._store(name, loaded)
+            print(f"[OK] ✅ Model '{name}' v{loaded.version} loaded in {elapsed:.3f}s")
+            for callback in self._listeners:
+                try:
+                    callback(name, loaded)
+                except Exception:
+                    traceback.print_exc()
+            return loaded
+
+    def _store(self, name, entry):
+        with self._lock:
+            self._entries[name] = entry
+            self._last_check[name] = time.monotonic()
+
+
+# ✅ Shared process-wide registry
+registry = ModelRegistry()
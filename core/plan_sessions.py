@@ -0,0 +1,512 @@
+import json
+import threading
+import time
+import traceback
+import uuid
+
+import numpy as np
+from django.conf import settings
+from rest_framework.views import APIView
+from rest_framework.response import Response
+
+from .result_store import SQLiteStore, DEFAULT_RESULT_STORE, json_dumps
+from .wire import PAYLOAD_PARSERS, FrameData
+from .vehicle_assignment import FleetState, PACKING_MODES, pack, summarize_fleet
+from .cluster_engine import CLUSTER_MODES
+from .dispatch import (
+    FINAL_COLUMNS, orders_frame, score_and_cluster, planning_order, default_cluster_mode, request_fleet
+)
+
+# 🗓️ Incremental dispatch plan sessions (override with settings.DISPATCH_SESSIONS)
+DEFAULT_SESSIONS = {
+    "TTL_SECONDS": 24 * 3600,   # a session untouched this long is dropped
+    "MAX_SESSIONS": 50,
+}
+
+# 📄 GET /api/dispatch/sessions/<id>/ order pagination
+DEFAULT_PAGE_ROWS = 1000
+MAX_PAGE_ROWS = 10000
+
+SESSION_COLUMNS = ["Order_ID"] + FINAL_COLUMNS
+# Stored once per order; status + vehicle are kept in their own columns and joined back on read
+ROW_COLUMNS = FINAL_COLUMNS[:-2]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plan_sessions (
+    id TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    packing_mode TEXT NOT NULL,
+    cluster_mode TEXT NOT NULL,
+    next_seq INTEGER NOT NULL DEFAULT 0,
+    orders_total INTEGER NOT NULL DEFAULT 0,
+    orders_assigned INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS plan_session_vehicles (
+    session_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    vehicle_id TEXT NOT NULL,
+    vehicle_type TEXT NOT NULL,
+    property TEXT NOT NULL,
+    capacity_kg REAL NOT NULL,
+    capacity_L REAL NOT NULL,
+    remaining_kg REAL NOT NULL,
+    remaining_L REAL NOT NULL,
+    orders INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (session_id, idx)
+);
+CREATE TABLE IF NOT EXISTS plan_session_orders (
+    session_id TEXT NOT NULL,
+    order_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    vehicle_idx INTEGER NOT NULL,
+    load_type TEXT NOT NULL,
+    weight REAL NOT NULL,
+    volume REAL NOT NULL,
+    priority REAL NOT NULL,
+    cluster INTEGER NOT NULL,
+    row TEXT NOT NULL,
+    PRIMARY KEY (session_id, order_id)
+);
+CREATE INDEX IF NOT EXISTS plan_session_orders_seq ON plan_session_orders (session_id, seq);
+CREATE INDEX IF NOT EXISTS plan_session_orders_vehicle ON plan_session_orders (session_id, vehicle_idx);
+"""
+
+
+class SessionNotFound(Exception):
+    pass
+
+
+class SessionConflict(Exception):
+    pass
+
+
+class PlanSessionStore(SQLiteStore):
+    """
+    Dispatch plan sessions in the result-store SQLite file: each session's
+    fleet (remaining kg / L and order count per vehicle) and every order it
+    has placed. Adding orders packs only the new ones (plus, on request, the
+    still-unassigned ones) against the stored remaining capacity, and writes
+    back only the vehicles that changed, so a call costs O(delta + fleet)
+    rather than re-planning the whole day. Each change runs in one
+    BEGIN IMMEDIATE transaction, so concurrent calls on a session serialise.
+    """
+
+    schema = SCHEMA
+
+    def __init__(self, path, ttl_seconds=24 * 3600, max_sessions=50):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        super().__init__(path)
+
+    def create(self, vehicle_df, packing_mode, cluster_mode):
+        session_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            self._prune(conn)
+            conn.execute(
+                "INSERT INTO plan_sessions (id, created, updated, packing_mode, cluster_mode) VALUES (?, ?, ?, ?, ?)",
+                (session_id, now, now, packing_mode, cluster_mode)
+            )
+            conn.executemany(
+                "INSERT INTO plan_session_vehicles (session_id, idx, vehicle_id, vehicle_type, property, "
+                "capacity_kg, capacity_L, remaining_kg, remaining_L) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (session_id, i, v.Vehicle_ID, v.Vehicle_Type, v.Vehicle_Property,
+                     float(v.Capacity_kg), float(v.Capacity_L), float(v.Capacity_kg), float(v.Capacity_L))
+                    for i, v in enumerate(vehicle_df.itertuples(index=False))
+                ]
+            )
+        return session_id
+
+    def session(self, session_id, conn=None):
+        conn = conn or self._connection()
+        row = conn.execute(
+            "SELECT created, updated, packing_mode, cluster_mode, next_seq, orders_total, orders_assigned "
+            "FROM plan_sessions WHERE id = ?", (session_id,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            raise SessionNotFound(f"Unknown or expired plan session: {session_id}")
+        keys = ["created", "updated", "packing_mode", "cluster_mode", "next_seq", "orders_total", "orders_assigned"]
+        return {"session_id": session_id, **dict(zip(keys, row))}
+
+    def fleet(self, session_id, conn=None):
+        conn = conn or self._connection()
+        rows = conn.execute(
+            "SELECT vehicle_id, vehicle_type, property, capacity_kg, capacity_L, remaining_kg, remaining_L, orders "
+            "FROM plan_session_vehicles WHERE session_id = ? ORDER BY idx", (session_id,)
+        ).fetchall()
+        ids, types, props, cap_kg, cap_L, rem_kg, rem_L, orders = zip(*rows)
+        return FleetState(ids, types, props, cap_kg, cap_L, rem_kg, rem_L, np.asarray(orders) > 0), np.array(orders)
+
+    def add_orders(self, session_id, df, sequence, order_ids=None, retry_unassigned=False):
+        """
+        Pack scored orders into the session, taking the rows of `df` in the
+        planning order given by `sequence` (positions). Without `order_ids`
+        the orders are numbered from the session's counter, in row order.
+        With `retry_unassigned`, orders the session could not place earlier
+        are packed again together with the new ones, in planning order.
+        Returns (order IDs, vehicle index per order, retried, retried_assigned, fleet).
+        """
+        now = time.time()
+        with self._connect() as conn:
+            info = self.session(session_id, conn)
+            if order_ids is None:
+                order_ids = [str(info["next_seq"] + i) for i in range(len(df))]
+            taken = self._existing(conn, session_id, order_ids)
+            if taken:
+                raise SessionConflict(f"Orders already in session: {taken[:20]}")
+            fleet, order_counts = self.fleet(session_id, conn)
+            before_kg, before_L = fleet.remaining_kg.copy(), fleet.remaining_L.copy()
+
+            load_types = df["Load_Type"].to_numpy(dtype=object)
+            weights = df["Total_Weight"].to_numpy(dtype=np.float64)
+            volumes = df["Total_Volume"].to_numpy(dtype=np.float64)
+            clusters = df["Cluster"].to_numpy()
+            priorities = df["ML_Priority_Score"].to_numpy(dtype=np.float64)
+
+            pending = []
+            if retry_unassigned:
+                pending = conn.execute(
+                    "SELECT order_id, load_type, weight, volume, priority, cluster FROM plan_session_orders "
+                    "WHERE session_id = ? AND vehicle_idx < 0", (session_id,)
+                ).fetchall()
+            if pending:
+                # Old and new orders share one planning order: cluster, then priority (highest first)
+                p_ids, p_types, p_w, p_v, p_prio, p_cluster = zip(*pending)
+                all_types = np.concatenate([np.asarray(p_types, dtype=object), load_types])
+                all_w = np.concatenate([p_w, weights])
+                all_v = np.concatenate([p_v, volumes])
+                sequence = np.lexsort((-np.concatenate([p_prio, priorities]), np.concatenate([p_cluster, clusters])))
+            else:
+                p_ids, all_types, all_w, all_v = (), load_types, weights, volumes
+            placed = np.full(len(all_w), -1, dtype=np.intp)
+            placed[sequence] = pack(fleet, all_types[sequence], all_w[sequence], all_v[sequence],
+                                    mode=info["packing_mode"])
+            retried, assigned = placed[:len(pending)], placed[len(pending):]
+
+            rows = df[ROW_COLUMNS].values.tolist()
+            conn.executemany(
+                "INSERT INTO plan_session_orders (session_id, order_id, seq, vehicle_idx, load_type, weight, volume, "
+                "priority, cluster, row) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (session_id, order_ids[i], info["next_seq"] + i, int(assigned[i]), load_types[i],
+                     float(weights[i]), float(volumes[i]), float(priorities[i]), int(clusters[i]), json_dumps(rows[i]))
+                    for i in range(len(order_ids))
+                ]
+            )
+            retried_hit = np.flatnonzero(retried >= 0)
+            conn.executemany(
+                "UPDATE plan_session_orders SET vehicle_idx = ? WHERE session_id = ? AND order_id = ?",
+                [(int(retried[i]), session_id, p_ids[i]) for i in retried_hit]
+            )
+
+            placed_on = np.concatenate([assigned[assigned >= 0], retried[retried_hit]])
+            order_counts += np.bincount(placed_on, minlength=len(order_counts))
+            self._write_vehicles(conn, session_id, fleet, order_counts,
+                                 np.flatnonzero((fleet.remaining_kg != before_kg) | (fleet.remaining_L != before_L)))
+
+            newly_assigned = int((assigned >= 0).sum()) + len(retried_hit)
+            conn.execute(
+                "UPDATE plan_sessions SET updated = ?, next_seq = next_seq + ?, orders_total = orders_total + ?, "
+                "orders_assigned = orders_assigned + ? WHERE id = ?",
+                (now, len(order_ids), len(order_ids), newly_assigned, session_id)
+            )
+        fleet.used = (order_counts > 0).astype(np.int8)
+        return order_ids, assigned, len(pending), len(retried_hit), fleet
+
+    def remove_orders(self, session_id, order_ids, cancel):
+        """
+        Take orders off their vehicles and give the capacity back.
+        cancel=True deletes them from the session; otherwise they stay as
+        unassigned (retried by a later add with retry_unassigned).
+        Returns (orders affected, unknown IDs).
+        """
+        with self._connect() as conn:
+            self.session(session_id, conn)
+            found = self._existing(conn, session_id, order_ids, with_vehicle=True)
+            known = {order_id for order_id, _ in found}
+            unknown = [order_id for order_id in order_ids if order_id not in known]
+            vehicles = sorted({v for _, v in found if v >= 0})
+            was_assigned = sum(1 for _, v in found if v >= 0)
+
+            if cancel:
+                conn.executemany(
+                    "DELETE FROM plan_session_orders WHERE session_id = ? AND order_id = ?",
+                    [(session_id, order_id) for order_id, _ in found]
+                )
+            else:
+                conn.executemany(
+                    "UPDATE plan_session_orders SET vehicle_idx = -1 WHERE session_id = ? AND order_id = ?",
+                    [(session_id, order_id) for order_id, v in found if v >= 0]
+                )
+
+            # Remaining capacity recomputed from the orders still on each touched vehicle (no float drift)
+            for idx in vehicles:
+                count, kg, L = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(weight), 0), COALESCE(SUM(volume), 0) FROM plan_session_orders "
+                    "WHERE session_id = ? AND vehicle_idx = ?", (session_id, idx)
+                ).fetchone()
+                conn.execute(
+                    "UPDATE plan_session_vehicles SET remaining_kg = capacity_kg - ?, remaining_L = capacity_L - ?, "
+                    "orders = ? WHERE session_id = ? AND idx = ?",
+                    (kg, L, count, session_id, idx)
+                )
+            conn.execute(
+                "UPDATE plan_sessions SET updated = ?, orders_total = orders_total - ?, "
+                "orders_assigned = orders_assigned - ? WHERE id = ?",
+                (time.time(), len(found) if cancel else 0, was_assigned, session_id)
+            )
+        return len(found), unknown
+
+    def orders(self, session_id, offset=0, limit=DEFAULT_PAGE_ROWS):
+        conn = self._connection()
+        rows = conn.execute(
+            "SELECT o.order_id, o.row, o.vehicle_idx, v.vehicle_id FROM plan_session_orders o "
+            "LEFT JOIN plan_session_vehicles v ON v.session_id = o.session_id AND v.idx = o.vehicle_idx "
+            "WHERE o.session_id = ? ORDER BY o.seq LIMIT ? OFFSET ?", (session_id, limit, offset)
+        ).fetchall()
+        return [
+            [order_id] + json.loads(row) + (["Assigned", vehicle_id] if idx >= 0 else ["Not_Assigned", None])
+            for order_id, row, idx, vehicle_id in rows
+        ]
+
+    def delete(self, session_id):
+        with self._connect() as conn:
+            self._delete(conn, [session_id])
+
+    def recent(self, limit=50):
+        rows = self._connection().execute(
+            "SELECT id, created, updated, packing_mode, cluster_mode, orders_total, orders_assigned "
+            "FROM plan_sessions WHERE updated >= ? ORDER BY updated DESC LIMIT ?",
+            (time.time() - self.ttl_seconds, limit)
+        ).fetchall()
+        keys = ["session_id", "created", "updated", "packing_mode", "cluster_mode", "orders_total", "orders_assigned"]
+        return [dict(zip(keys, row)) for row in rows]
+
+    def _existing(self, conn, session_id, order_ids, with_vehicle=False):
+        found = []
+        column = "order_id, vehicle_idx" if with_vehicle else "order_id"
+        # SQLite caps bound parameters per statement
+        for start in range(0, len(order_ids), 500):
+            batch = order_ids[start:start + 500]
+            found.extend(conn.execute(
+                f"SELECT {column} FROM plan_session_orders WHERE session_id = ? "
+                f"AND order_id IN ({', '.join('?' * len(batch))})", (session_id, *batch)
+            ).fetchall())
+        return found if with_vehicle else [r[0] for r in found]
+
+    def _write_vehicles(self, conn, session_id, fleet, order_counts, changed):
+        conn.executemany(
+            "UPDATE plan_session_vehicles SET remaining_kg = ?, remaining_L = ?, orders = ? WHERE session_id = ? AND idx = ?",
+            [
+                (float(fleet.remaining_kg[i]), float(fleet.remaining_L[i]), int(order_counts[i]), session_id, int(i))
+                for i in changed
+            ]
+        )
+
+    def _delete(self, conn, ids):
+        for table, column in (("plan_sessions", "id"), ("plan_session_vehicles", "session_id"),
+                              ("plan_session_orders", "session_id")):
+            conn.executemany(f"DELETE FROM {table} WHERE {column} = ?", [(i,) for i in ids])
+
+    def _prune(self, conn):
+        expired = [r[0] for r in conn.execute(
+            "SELECT id FROM plan_sessions WHERE updated < ?", (time.time() - self.ttl_seconds,)
+        )]
+        oldest = [r[0] for r in conn.execute(
+            "SELECT id FROM plan_sessions ORDER BY updated DESC LIMIT -1 OFFSET ?", (self.max_sessions - 1,)
+        )]
+        self._delete(conn, sorted(set(expired) | set(oldest)))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_session_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                config = {**DEFAULT_SESSIONS, **getattr(settings, "DISPATCH_SESSIONS", {})}
+                path = {**DEFAULT_RESULT_STORE, **getattr(settings, "RESULT_STORE", {})}["PATH"]
+                _store = PlanSessionStore(path, config["TTL_SECONDS"], config["MAX_SESSIONS"])
+    return _store
+
+
+def session_summary(store, session_id, fleet=None):
+    info = store.session(session_id)
+    if fleet is None:
+        fleet, _ = store.fleet(session_id)
+    fleet_summary = summarize_fleet(fleet)
+    fleet_summary["orders_assigned"] = info["orders_assigned"]
+    fleet_summary["orders_unassigned"] = info["orders_total"] - info["orders_assigned"]
+    return info, fleet_summary
+
+
+def add_session_orders(store, session_id, payload):
+    """Score, cluster and pack one batch of orders into a session. Returns (body, status_code)."""
+    columns = payload.get("columns", [])
+    data = payload.get("data", [])
+    if not columns or not data:
+        return {"error": "Missing 'columns' or 'data' in request"}, 400
+
+    info = store.session(session_id)
+    df, error = orders_frame(columns, data)
+    if error:
+        return {"error": error}, 400
+
+    order_ids = None
+    if "Order_ID" in df.columns:
+        order_ids = df["Order_ID"].astype(str).tolist()
+        if len(set(order_ids)) != len(order_ids):
+            return {"error": "Duplicate Order_ID values in batch"}, 400
+
+    df = df.reset_index(drop=True)
+    clustering = score_and_cluster(df, info["cluster_mode"], payload.get("cluster_check"))
+    sequence = df.index.get_indexer(planning_order(df))
+    order_ids, assigned, retried, retried_assigned, fleet = store.add_orders(
+        session_id, df, sequence, order_ids, bool(payload.get("retry_unassigned"))
+    )
+
+    hit = assigned >= 0
+    df["Order_ID"] = order_ids
+    df["Assignment_Status"] = np.where(hit, "Assigned", "Not_Assigned").astype(object)
+    vehicle_ids = np.full(len(assigned), None, dtype=object)
+    vehicle_ids[hit] = fleet.vehicle_ids[assigned[hit]]
+    df["Assigned_Vehicle_ID"] = vehicle_ids
+
+    info, fleet_summary = session_summary(store, session_id, fleet)
+    print(f"✅ Session {session_id}: {int(hit.sum())}/{len(df)} new orders assigned, {retried_assigned}/{retried} retried")
+    return {
+        "session_id": session_id,
+        "columns": SESSION_COLUMNS,
+        "data": FrameData(df[SESSION_COLUMNS]),
+        "batch": {
+            "orders": len(df),
+            "assigned": int(hit.sum()),
+            "retried": retried,
+            "retried_assigned": retried_assigned,
+        },
+        "fleet": fleet_summary,
+        "clustering": clustering,
+    }, 200
+
+
+def _session_error(e):
+    if isinstance(e, SessionNotFound):
+        return Response({"error": str(e)}, status=404)
+    if isinstance(e, SessionConflict):
+        return Response({"error": str(e)}, status=409)
+    print("❌ Exception in dispatch plan session:")
+    traceback.print_exc()
+    return Response({"error": str(e)}, status=500)
+
+
+# ✅ Create a plan session (optionally with a first batch of orders) / list open sessions
+class DispatchSessionsView(APIView):
+    parser_classes = PAYLOAD_PARSERS
+    metrics_component = "dispatch_sessions"
+
+    def get(self, request):
+        return Response({"sessions": get_session_store().recent()}, status=200)
+
+    def post(self, request):
+        payload = request.data
+        packing_mode = payload.get("packing_mode", "first_fit")
+        if packing_mode not in PACKING_MODES:
+            return Response({"error": f"Unknown packing_mode '{packing_mode}'. Use one of {PACKING_MODES}"}, status=400)
+        cluster_mode = payload.get("cluster_mode", default_cluster_mode())
+        if cluster_mode not in CLUSTER_MODES:
+            return Response({"error": f"Unknown cluster_mode '{cluster_mode}'. Use one of {CLUSTER_MODES}"}, status=400)
+        try:
+            vehicle_df = request_fleet(payload.get("fleet"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        try:
+            store = get_session_store()
+            session_id = store.create(vehicle_df, packing_mode, cluster_mode)
+            print(f"🗓️ Plan session {session_id} created with {len(vehicle_df)} vehicles.")
+            if payload.get("data"):
+                body, code = add_session_orders(store, session_id, payload)
+                if code >= 400:
+                    store.delete(session_id)
+                return Response(body, status=201 if code == 200 else code)
+            info, fleet_summary = session_summary(store, session_id)
+            return Response({**info, "fleet": fleet_summary}, status=201)
+        except Exception as e:
+            return _session_error(e)
+
+
+# ✅ Session state + paginated orders / drop the session
+class DispatchSessionView(APIView):
+    metrics_component = "dispatch_sessions"
+
+    def get(self, request, session_id):
+        try:
+            offset = int(request.query_params.get("offset", 0))
+            limit = int(request.query_params.get("limit", DEFAULT_PAGE_ROWS))
+        except ValueError:
+            return Response({"error": "offset and limit must be integers"}, status=400)
+        if offset < 0 or not 0 < limit <= MAX_PAGE_ROWS:
+            return Response({"error": f"offset must be >= 0 and limit between 1 and {MAX_PAGE_ROWS}"}, status=400)
+
+        try:
+            store = get_session_store()
+            info, fleet_summary = session_summary(store, session_id)
+            end = min(info["orders_total"], offset + limit)
+            return Response({
+                **info,
+                "fleet": fleet_summary,
+                "columns": SESSION_COLUMNS,
+                "data": store.orders(session_id, offset, limit),
+                "offset": offset,
+                "limit": limit,
+                "next_offset": end if end < info["orders_total"] else None,
+            }, status=200)
+        except Exception as e:
+            return _session_error(e)
+
+    def delete(self, request, session_id):
+        try:
+            store = get_session_store()
+            store.session(session_id)
+            store.delete(session_id)
+            return Response({"message": "Session deleted", "session_id": session_id}, status=200)
+        except Exception as e:
+            return _session_error(e)
+
+
+# ✅ Add orders to a session, or release / cancel orders already in it
+class DispatchSessionOrdersView(APIView):
+    parser_classes = PAYLOAD_PARSERS
+    metrics_component = "dispatch_sessions"
+    actions = ["orders", "release", "cancel"]
+
+    def post(self, request, session_id, action):
+        if action not in self.actions:
+            return Response({"error": f"Unknown action '{action}'. Use one of {self.actions}"}, status=404)
+        try:
+            store = get_session_store()
+            if action == "orders":
+                body, code = add_session_orders(store, session_id, request.data)
+                return Response(body, status=code)
+
+            order_ids = request.data.get("order_ids")
+            if not isinstance(order_ids, list) or not order_ids:
+                return Response({"error": "'order_ids' must be a non-empty list"}, status=400)
+            order_ids = [str(order_id) for order_id in order_ids]
+            affected, unknown = store.remove_orders(session_id, order_ids, cancel=action == "cancel")
+            info, fleet_summary = session_summary(store, session_id)
+            print(f"✅ Session {session_id}: {affected} orders {'cancelled' if action == 'cancel' else 'released'}")
+            return Response({
+                "session_id": session_id,
+                "action": action,
+                "orders": affected,
+                "unknown_order_ids": unknown,
+                "fleet": fleet_summary,
+            }, status=200)
+        except Exception as e:
+            return _session_error(e)
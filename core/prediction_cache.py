@@ -0,0 +1,200 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .batching import predict_batched
+from .model_registry import registry
+
+# 🧠 Row-level memo of model outputs (override with settings.PREDICTION_CACHE)
+DEFAULT_PREDICTION_CACHE = {
+    "ENABLED": True,
+    "MAX_ENTRIES": 100000,   # distinct feature rows remembered per model (LRU)
+}
+
+
+class PredictionCache:
+    """
+    Bounded LRU memo of one registry model's per-row outputs, keyed on the
+    exact float64 feature vector and the loaded artifact's checksum.
+
+    predict() collapses duplicate rows in the batch, looks the unique rows
+    up, runs the model only on the ones it has not seen and scatters the
+    results back to every row. Tree ensembles, KNN and scalers score rows
+    independently, so the output is identical to scoring the whole batch.
+
+    Calls the cache cannot key safely (non-numeric or non-finite features,
+    a model object that is not the registry's current one) go straight to
+    the model.
+    """
+
+    def __init__(self, name, max_entries=100000):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._version = None
+        self._template = None
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.bypassed = 0
+        self.rows = 0
+        self.unique_rows = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.clears = 0
+
+    def _current_version(self, model):
+        entry = registry.current(self.name)
+        if entry is None or entry.obj is not model:
+            return None
+        return entry.checksum
+
+    def _bypass(self, model, X, predict):
+        with self._lock:
+            self.calls += 1
+            self.bypassed += 1
+        return predict(model, X)
+
+    def predict(self, model, X, predict):
+        version = self._current_version(model)
+        if version is None or len(X) == 0:
+            return self._bypass(model, X, predict)
+        try:
+            matrix = np.asarray(X, dtype=np.float64)
+        except (TypeError, ValueError):
+            return self._bypass(model, X, predict)
+        if matrix.ndim != 2 or not np.isfinite(matrix).all():
+            return self._bypass(model, X, predict)
+
+        # One key per distinct row: the row's bytes (+ 0.0 folds -0.0 into 0.0)
+        matrix = np.ascontiguousarray(matrix + 0.0)
+        row_keys = matrix.view(np.dtype((np.void, matrix.shape[1] * matrix.itemsize))).ravel()
+        inverse, unique_keys = pd.factorize(row_keys)
+        _, first_row = np.unique(inverse, return_index=True)
+
+        keys = [key.tobytes() for key in unique_keys]
+        values = [None] * len(keys)
+        missing = []
+        with self._lock:
+            if self._version != version:
+                self._reset(version)
+            template = self._template
+            for i, key in enumerate(keys):
+                value = self._entries.get(key)
+                if value is None:
+                    missing.append(i)
+                else:
+                    self._entries.move_to_end(key)
+                    values[i] = value
+
+        if missing:
+            rows = first_row[missing]
+            fresh = predict(model, X.iloc[rows] if isinstance(X, pd.DataFrame) else np.asarray(X)[rows])
+            fresh = np.asarray(fresh)
+            template = (fresh.dtype, fresh.shape[1:])
+            for i, value in zip(missing, fresh):
+                values[i] = value.copy() if fresh.ndim > 1 else value
+
+        with self._lock:
+            self.calls += 1
+            self.rows += len(inverse)
+            self.unique_rows += len(keys)
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+            if missing and self._version == version:
+                self._template = template
+                for i in missing:
+                    self._entries[keys[i]] = values[i]
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        dtype, tail = template
+        out = np.empty((len(keys),) + tail, dtype=dtype)
+        for i, value in enumerate(values):
+            out[i] = value
+        return out[inverse]
+
+    def _reset(self, version=None):
+        if self._entries:
+            self.clears += 1
+        self._entries.clear()
+        self._version = version
+        self._template = None
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "max_entries": self.max_entries,
+                "entries": len(self._entries),
+                "version": self._version[:12] if self._version else None,
+                "calls": self.calls,
+                "bypassed_calls": self.bypassed,
+                "rows": self.rows,
+                "unique_rows": self.unique_rows,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                # rows answered without running the model (in-batch duplicates + cache hits)
+                "rows_saved": self.rows - self.misses,
+                "evictions": self.evictions,
+                "clears": self.clears,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _config():
+    try:
+        from django.conf import settings
+        return {**DEFAULT_PREDICTION_CACHE, **getattr(settings, "PREDICTION_CACHE", {})}
+    except Exception:
+        return dict(DEFAULT_PREDICTION_CACHE)
+
+
+def get_prediction_cache(name):
+    cache = _caches.get(name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(name)
+            if cache is None:
+                cache = PredictionCache(name, _config()["MAX_ENTRIES"])
+                _caches[name] = cache
+    return cache
+
+
+def predict_memoized(name, model, X):
+    """
+    model.predict(X) for registry model `name`, memoised per distinct row.
+    Rows still to be scored go through the micro-batcher.
+    """
+    def predict(model, X):
+        return predict_batched(name, model, X)
+
+    if not _config()["ENABLED"]:
+        return predict(model, X)
+    return get_prediction_cache(name).predict(model, X, predict)
+
+
+def prediction_cache_stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def _on_model_load(name, entry):
+    cache = _caches.get(name)
+    if cache is not None:
+        cache.clear()
+
+
+# 🔄 A (re)loaded artifact invalidates everything memoised for it
+registry.on_load(_on_model_load)
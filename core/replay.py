@@ -0,0 +1,197 @@
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import numpy as np
+
+from .capture import REPLAY_HEADER, decode_body
+
+# 🔁 `python manage.py replay_traffic`: captured requests sent back through the app
+#   client -> Django test client, in-process (no sockets)
+#   wsgi   -> a local threaded WSGI server on 127.0.0.1, over HTTP
+#   url    -> an already running server (e.g. gunicorn) at --url
+TARGETS = ["client", "wsgi", "url"]
+
+PERCENTILES = [50, 90, 95, 99]
+
+
+def load_captures(path, paths=None, limit=None):
+    """Records from a capture file, optionally only for the given request paths."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                raise ValueError(f"{path}:{number} is not a JSON line")
+            if paths and record.get("path") not in paths:
+                continue
+            records.append(record)
+            if limit and len(records) >= limit:
+                break
+    return records
+
+
+def _prepare(record):
+    query = record.get("query") or ""
+    return {
+        "method": record.get("method", "POST"),
+        "path": record["path"],
+        "url": record["path"] + ("?" + query if query else ""),
+        "headers": {**record.get("headers", {}), REPLAY_HEADER: "1"},
+        "body": decode_body(record),
+        "status": record.get("status"),
+    }
+
+
+class ClientSender:
+    """One Django test client per thread; streamed responses are read to the end."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def __call__(self, request):
+        from django.test import Client
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = Client(raise_request_exception=False)
+        headers = dict(request["headers"])
+        content_type = headers.pop("Content-Type", "application/octet-stream")
+        response = client.generic(
+            request["method"], request["url"], data=request["body"], content_type=content_type, headers=headers
+        )
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        return response.status_code, size
+
+
+class HTTPSender:
+    """Plain HTTP/1.1 to base_url, one connection per request."""
+
+    def __init__(self, base_url, timeout=300):
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Not an http(s) URL: {base_url}")
+        self.parts = parts
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+
+    def __call__(self, request):
+        connection_class = http.client.HTTPSConnection if self.parts.scheme == "https" else http.client.HTTPConnection
+        conn = connection_class(self.parts.hostname, self.parts.port, timeout=self.timeout)
+        try:
+            conn.request(request["method"], self.prefix + request["url"], body=request["body"], headers=request["headers"])
+            response = conn.getresponse()
+            return response.status, len(response.read())
+        finally:
+            conn.close()
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_wsgi_server(port=0):
+    """The project's WSGI app on a threaded local server in a daemon thread; returns (server, base_url)."""
+    from mlserver.wsgi import application
+    server = make_server("127.0.0.1", port, application, server_class=_ThreadingWSGIServer, handler_class=_QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def replay(records, send, concurrency=4, rate=None, repeat=1):
+    """
+    Send every record (`repeat` times over) through `send` from `concurrency`
+    threads. With `rate` (requests/s over all threads) request i is not sent
+    before start + i / rate; without it they go out as fast as the threads
+    allow. Returns one sample per request, in send order.
+    """
+    requests = [_prepare(record) for record in records] * repeat
+    samples = [None] * len(requests)
+    cursor = iter(range(len(requests)))
+    lock = threading.Lock()
+    started = time.perf_counter()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(cursor, None)
+            if i is None:
+                return
+            if rate:
+                delay = started + i / rate - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            request = requests[i]
+            sent = time.perf_counter()
+            try:
+                status, size = send(request)
+                error = None
+            except Exception as e:
+                status, size, error = None, 0, f"{type(e).__name__}: {e}"
+            samples[i] = {
+                "path": request["path"],
+                "method": request["method"],
+                "latency": time.perf_counter() - sent,
+                "status": status,
+                "expected_status": request["status"],
+                "bytes": size,
+                "error": error,
+            }
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(max(1, min(concurrency, len(requests))))]:
+            future.result()
+    return samples, time.perf_counter() - started
+
+
+def _summary(samples, elapsed):
+    latencies = np.array([s["latency"] for s in samples]) * 1000
+    failed = sum(1 for s in samples if s["error"] is not None or s["status"] >= 500)
+    status = {}
+    for s in samples:
+        key = str(s["status"]) if s["error"] is None else "exception"
+        status[key] = status.get(key, 0) + 1
+    return {
+        "requests": len(samples),
+        "errors": failed,
+        "error_rate": round(failed / len(samples), 4),
+        "status_mismatches": sum(
+            1 for s in samples if s["expected_status"] is not None and s["status"] != s["expected_status"]
+        ),
+        "throughput_rps": round(len(samples) / elapsed, 3) if elapsed > 0 else None,
+        "latency_ms": {
+            **{f"p{p}": round(float(np.percentile(latencies, p)), 3) for p in PERCENTILES},
+            "mean": round(float(latencies.mean()), 3),
+            "max": round(float(latencies.max()), 3),
+        },
+        "bytes_received": sum(s["bytes"] for s in samples),
+        "status": dict(sorted(status.items())),
+        "sample_errors": sorted({s["error"] for s in samples if s["error"]})[:5],
+    }
+
+
+def summarize(samples, elapsed):
+    """Throughput, latency percentiles and error rates per endpoint ("METHOD path") and overall."""
+    endpoints = {}
+    for s in samples:
+        endpoints.setdefault(f"{s['method']} {s['path']}", []).append(s)
+    return {
+        "elapsed_seconds": round(elapsed, 4),
+        "endpoints": {name: _summary(group, elapsed) for name, group in sorted(endpoints.items())},
+        "overall": _summary(samples, elapsed) if samples else None,
+    }
@@ -0,0 +1,227 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# 📦 Rows per stored chunk; GET pages read only the chunks they need
+STORE_CHUNK_ROWS = 1000
+
+DEFAULT_RESULT_STORE = {
+    "PATH": os.path.join(os.path.dirname(__file__), '..', 'var', 'results.sqlite3'),
+    "TTL_SECONDS": 3600,
+    "MAX_ENTRIES": 500,
+    "MAX_BYTES": 256 * 1024 * 1024,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    total_rows INTEGER NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    columns TEXT NOT NULL,
+    meta TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS result_chunks (
+    id TEXT NOT NULL,
+    chunk INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (id, chunk)
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+
+def _json_default(obj):
+    if hasattr(obj, "item"):
+        return obj.item()
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return str(obj)
+
+
+def json_dumps(obj):
+    return json.dumps(obj, default=_json_default, separators=(",", ":"))
+
+
+class SQLiteStore:
+    """One SQLite connection per thread (WAL), with BEGIN IMMEDIATE transactions via _connect()."""
+
+    schema = ""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # executescript() commits on its own, so it runs outside a transaction
+        self._connection().executescript(self.schema)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _connect(self):
+        return _Transaction(self._connection())
+
+    def _read(self):
+        """Deferred transaction: a consistent view across several SELECTs without taking the write lock."""
+        return _Transaction(self._connection(), "BEGIN")
+
+
+class ResultStore(SQLiteStore):
+    """
+    Results keyed by ID in a local SQLite file, so every WSGI worker on the
+    host sees the same entries. Rows are stored in fixed-size chunks, so a
+    paginated read only decodes the chunks it needs. Entries expire after
+    `ttl_seconds`; past `max_entries` or `max_bytes`, the least recently read
+    entries are evicted first.
+    """
+
+    schema = SCHEMA
+
+    def __init__(self, path, ttl_seconds=3600, max_entries=500, max_bytes=256 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        super().__init__(path)
+
+    def put(self, kind, columns, data, meta=None):
+        result_id = uuid.uuid4().hex
+        now = time.time()
+        chunks = [
+            json_dumps(data[start:start + STORE_CHUNK_ROWS])
+            for start in range(0, len(data), STORE_CHUNK_ROWS)
+        ]
+        size = sum(len(c) for c in chunks)
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO results (id, kind, created, accessed, total_rows, size_bytes, columns, meta) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (result_id, kind, now, now, len(data), size, json_dumps(columns), json_dumps(meta or {}))
+            )
+            conn.executemany(
+                "INSERT INTO result_chunks (id, chunk, data) VALUES (?, ?, ?)",
+                [(result_id, i, c) for i, c in enumerate(chunks)]
+            )
+            self._evict(conn, keep=result_id)
+        return result_id
+
+    def get(self, result_id, offset=0, limit=None):
+        """One page of a stored result, or None if it is unknown or expired."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT kind, created, total_rows, columns, meta FROM results WHERE id = ?", (result_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            kind, created, total_rows, columns, meta = row
+            if now - created > self.ttl_seconds:
+                self._delete(conn, [result_id])
+                return None
+            conn.execute("UPDATE results SET accessed = ? WHERE id = ?", (now, result_id))
+
+            offset = max(0, offset)
+            end = total_rows if limit is None else min(total_rows, offset + limit)
+            data = []
+            if offset < end:
+                first, last = offset // STORE_CHUNK_ROWS, (end - 1) // STORE_CHUNK_ROWS
+                for chunk, payload in conn.execute(
+                    "SELECT chunk, data FROM result_chunks WHERE id = ? AND chunk BETWEEN ? AND ? ORDER BY chunk",
+                    (result_id, first, last)
+                ):
+                    rows = json.loads(payload)
+                    base = chunk * STORE_CHUNK_ROWS
+                    data.extend(rows[max(0, offset - base):max(0, end - base)])
+
+        return {
+            "result_id": result_id,
+            "kind": kind,
+            "columns": json.loads(columns),
+            "data": data,
+            "total_rows": total_rows,
+            "offset": offset,
+            "limit": limit,
+            "next_offset": end if end < total_rows else None,
+            "meta": json.loads(meta),
+        }
+
+    def delete(self, result_id):
+        with self._connect() as conn:
+            self._delete(conn, [result_id])
+
+    def stats(self):
+        with self._connect() as conn:
+            count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM results").fetchone()
+        return {"entries": count, "size_bytes": size, "max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+    def _delete(self, conn, ids):
+        if not ids:
+            return
+        conn.executemany("DELETE FROM results WHERE id = ?", [(i,) for i in ids])
+        conn.executemany("DELETE FROM result_chunks WHERE id = ?", [(i,) for i in ids])
+
+    def _evict(self, conn, keep=None):
+        expired = [r[0] for r in conn.execute(
+            "SELECT id FROM results WHERE created < ?", (time.time() - self.ttl_seconds,)
+        )]
+        self._delete(conn, expired)
+
+        count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM results").fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+
+        evict = []
+        for result_id, entry_size in conn.execute("SELECT id, size_bytes FROM results ORDER BY accessed"):
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            if result_id == keep:
+                continue
+            evict.append(result_id)
+            count -= 1
+            size -= entry_size
+        self._delete(conn, evict)
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE (or a plain, read-only BEGIN) / COMMIT around a block on an autocommit connection."""
+
+    def __init__(self, conn, begin="BEGIN IMMEDIATE"):
+        self.conn = conn
+        self.begin = begin
+
+    def __enter__(self):
+        self.conn.execute(self.begin)
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_result_store():
+    """Process-wide store configured from settings.RESULT_STORE."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                from django.conf import settings
+                config = {**DEFAULT_RESULT_STORE, **getattr(settings, "RESULT_STORE", {})}
+                _store = ResultStore(
+                    config["PATH"], config["TTL_SECONDS"], config["MAX_ENTRIES"], config["MAX_BYTES"]
+                )
+    return _store
@@ -0,0 +1,84 @@
+import itertools
+import json
+import traceback
+
+import pandas as pd
+
+from .file_handler import prepare_orders
+from .ml_utils import predict_priority
+
+# 📡 /api/data/?stream=<format> output formats
+#   ndjson   -> one JSON object per row
+#   columnar -> one {"chunk", "columns", "data"} object per chunk
+STREAM_FORMATS = ["ndjson", "columnar"]
+STREAM_CONTENT_TYPE = "application/x-ndjson"
+
+DEFAULT_CHUNK_ROWS = 50000
+MAX_CHUNK_ROWS = 500000
+
+
+def ndjson_line(obj):
+    return json.dumps(obj, default=str) + "\n"
+
+
+def parse_chunk_rows(value):
+    """chunk_size query param -> int within bounds. Raises ValueError."""
+    if value in (None, ""):
+        return DEFAULT_CHUNK_ROWS
+    rows = int(value)
+    if rows <= 0 or rows > MAX_CHUNK_ROWS:
+        raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_ROWS}")
+    return rows
+
+
+def read_csv_chunks(file_obj, chunk_rows):
+    """Iterator over DataFrames of at most `chunk_rows` rows from an uploaded CSV."""
+    return pd.read_csv(file_obj, chunksize=chunk_rows)
+
+
+def serialize_chunk(df, fmt, index):
+    if fmt == "ndjson":
+        body = df.to_json(orient="records", lines=True, date_format="iso")
+        return body if body.endswith("\n") else body + "\n"
+    return '{"chunk":%d,"rows":%d,"columns":%s,"data":%s}\n' % (
+        index, len(df), json.dumps(df.columns.tolist()), df.to_json(orient="values", date_format="iso")
+    )
+
+
+def stream_predictions(first_chunk, chunks, features, model, label_encoder, fmt):
+    """
+    Enrich + predict each chunk and yield it as soon as it is ready, so peak
+    memory is bounded by the chunk size rather than the upload size.
+
+    Control lines are wrapped in "__meta__", "__summary__" or "__error__" so
+    clients can tell them apart from rows. Errors after the first byte can no
+    longer change the status code, so they are reported as an __error__ line.
+    """
+    yield ndjson_line({"__meta__": {"format": fmt, "uploaded_columns": first_chunk.columns.tolist()}})
+
+    total_rows = 0
+    prediction_counts = {}
+    index = 0
+    try:
+        for index, chunk in enumerate(itertools.chain([first_chunk], chunks)):
+            df = prepare_orders(chunk, features)
+            df = predict_priority(df, model, label_encoder)
+
+            total_rows += len(df)
+            for label, count in df["Predicted_Priority"].value_counts().items():
+                prediction_counts[str(label)] = prediction_counts.get(str(label), 0) + int(count)
+
+            yield serialize_chunk(df, fmt, index)
+            print(f"[OK] 📤 Streamed chunk {index} ({len(df)} rows, {total_rows} total)")
+
+    except Exception as e:
+        print("[ERR] ❌ Streaming failed:")
+        traceback.print_exc()
+        yield ndjson_line({"__error__": {"error": str(e), "rows_streamed": total_rows, "chunk": index}})
+        return
+
+    yield ndjson_line({"__summary__": {
+        "rows": total_rows,
+        "chunks": index + 1,
+        "prediction_counts": prediction_counts,
+    }})
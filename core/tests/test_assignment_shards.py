@@ -0,0 +1,117 @@
+import contextlib
+import io
+import json
+import os
+import unittest
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from core.assignment_shards import apportion, assign_vehicles_sharded, partition_fleet, too_few_vehicles
+from core.dispatch import KNN_MODEL_PATH, PRIORITY_MODEL_PATH, SCALER_PATH, plan_dispatch, planning_order, request_fleet
+from core.tests.test_low_memory import dispatch_payload
+from core.tests.test_plan_sessions import scored_orders
+from core.vehicle_assignment import FleetState, assign_vehicles
+
+
+class PartitionTests(SimpleTestCase):
+    def test_apportion_sums_to_total(self):
+        self.assertEqual(apportion(10, [1, 1, 1]).tolist(), [4, 3, 3])
+        self.assertEqual(apportion(5, [0, 0]).tolist(), [3, 2])
+        self.assertEqual(apportion(0, [2, 1]).tolist(), [0, 0])
+
+    def test_every_cluster_with_demand_gets_each_type(self):
+        fleet = FleetState.from_frame(request_fleet({"per_type": 6}))
+        general = np.array([0.9, 0.02, 0.02, 0.03, 0.0])
+        specialised = np.array([0.5, 0.3, 0.0, 0.1, 0.1])
+        parts = partition_fleet(fleet, specialised, general)
+        self.assertEqual(sorted(np.concatenate(parts).tolist()), list(range(len(fleet))))
+        for c, part in enumerate(parts):
+            for vehicle_type in set(fleet.vehicle_types):
+                prop = fleet.properties[fleet.vehicle_types == vehicle_type][0]
+                needed = (general if prop == "General" else specialised)[c] > 0
+                self.assertEqual(vehicle_type in set(fleet.vehicle_types[part]), needed, (c, vehicle_type))
+
+    def test_small_fleets_are_flagged(self):
+        self.assertIsNotNone(too_few_vehicles(FleetState.from_frame(request_fleet({"per_type": 4})), 5))
+        self.assertIsNone(too_few_vehicles(FleetState.from_frame(request_fleet({"per_type": 5})), 5))
+        self.assertIsNone(too_few_vehicles(FleetState.from_frame(request_fleet({"per_type": 1})), 1))
+
+
+class ShardedAssignmentTests(SimpleTestCase):
+    def orders(self, n, seed):
+        df = scored_orders(n, seed, heavy=True)
+        df["Cluster"] = np.random.default_rng(seed).choice(5, n, p=[0.1, 0.1, 0.6, 0.1, 0.1])
+        df["Assignment_Status"] = "Not_Assigned"
+        df["Assigned_Vehicle_ID"] = None
+        return df
+
+    def assign(self, df, per_type, **kwargs):
+        df = df.copy()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fleet, stats = assign_vehicles_sharded(df, request_fleet({"per_type": per_type}), planning_order(df),
+                                                   **kwargs)
+        return df, fleet, stats
+
+    def check_capacity(self, df, fleet):
+        hit = df["Assignment_Status"] == "Assigned"
+        position = {v: i for i, v in enumerate(fleet.vehicle_ids)}
+        vehicle = df.loc[hit, "Assigned_Vehicle_ID"].map(position).to_numpy()
+        loaded_kg = np.bincount(vehicle, weights=df.loc[hit, "Total_Weight"], minlength=len(fleet))
+        np.testing.assert_allclose(fleet.capacity_kg - fleet.remaining_kg, loaded_kg, atol=1e-6)
+        self.assertTrue((fleet.remaining_kg >= -1e-9).all() and (fleet.remaining_L >= -1e-9).all())
+
+    def test_pool_matches_in_process(self):
+        df = self.orders(600, 1)
+        local, local_fleet, local_stats = self.assign(df, 10, workers=2, min_pool_orders=10 ** 9)
+        pooled, pooled_fleet, pooled_stats = self.assign(df, 10, workers=2, min_pool_orders=0)
+        self.assertEqual((local_stats["runner"], pooled_stats["runner"]), ("in_process", "process_pool"))
+        self.assertEqual(local["Assigned_Vehicle_ID"].tolist(), pooled["Assigned_Vehicle_ID"].tolist())
+        np.testing.assert_array_equal(local_fleet.remaining_kg, pooled_fleet.remaining_kg)
+        self.check_capacity(pooled, pooled_fleet)
+
+    def test_sharded_keeps_up_with_serial(self):
+        df = self.orders(1500, 2)
+        for per_type in (5, 12, 40):
+            with self.subTest(per_type=per_type):
+                sharded, fleet, stats = self.assign(df, per_type)
+                serial = df.copy()
+                assign_vehicles(serial, request_fleet({"per_type": per_type}), planning_order(serial))
+                self.assertEqual(sharded.columns.tolist(), serial.columns.tolist())
+                self.assertEqual(stats["runner"], "in_process")
+                got = (sharded["Assignment_Status"] == "Assigned").sum()
+                expected = (serial["Assignment_Status"] == "Assigned").sum()
+                self.assertGreaterEqual(got, 0.9 * expected)
+                self.check_capacity(sharded, fleet)
+                tf = sharded["Load_Type"] == "TF"
+                on = sharded.loc[tf & (sharded["Assignment_Status"] == "Assigned"), "Assigned_Vehicle_ID"]
+                self.assertTrue(set(fleet.properties[np.isin(fleet.vehicle_ids, on)]) <= {"Specialised"})
+
+    def test_small_fleet_falls_back_to_serial(self):
+        df = self.orders(400, 3)
+        sharded, _, stats = self.assign(df, 4)
+        self.assertEqual(stats["runner"], "serial")
+        self.assertIn("fallback_reason", stats)
+        serial = df.copy()
+        assign_vehicles(serial, request_fleet({"per_type": 4}), planning_order(serial))
+        self.assertEqual(sharded["Assigned_Vehicle_ID"].tolist(), serial["Assigned_Vehicle_ID"].tolist())
+
+
+@unittest.skipUnless(all(os.path.exists(p) for p in (PRIORITY_MODEL_PATH, SCALER_PATH, KNN_MODEL_PATH)),
+                     "dispatch models not present")
+class ShardedDispatchTests(SimpleTestCase):
+    def plan(self, payload):
+        with contextlib.redirect_stdout(io.StringIO()):
+            body, code = plan_dispatch(payload)
+        self.assertEqual(code, 200, body)
+        return json.loads(json.dumps({**body, "data": body["data"].tolist()}, default=str))
+
+    def test_default_fleet_plan_matches_serial(self):
+        payload = dispatch_payload(3000, seed=5)
+        for fleet in ({}, {"per_type": 20}):
+            with self.subTest(fleet=fleet):
+                serial = self.plan({**payload, "fleet": fleet})
+                sharded = self.plan({**payload, "fleet": fleet, "assignment_mode": "sharded"})
+                self.assertEqual(sharded["columns"], serial["columns"])
+                self.assertGreaterEqual(sharded["fleet"]["orders_assigned"], 0.9 * serial["fleet"]["orders_assigned"])
+        self.assertEqual(self.plan({**payload, "assignment_mode": "sharded"})["fleet"]["sharding"]["runner"], "serial")
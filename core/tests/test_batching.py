@@ -0,0 +1,79 @@
+import threading
+import time
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from core.batching import PredictionBatcher
+
+
+class DoublingModel:
+    """predict() = 2 * X; records the thread and row count of each call, optionally held on an event."""
+
+    def __init__(self, hold=None):
+        self.hold = hold
+        self.calls = []
+        self.entered = threading.Event()
+
+    def predict(self, X):
+        self.calls.append((threading.current_thread().name, len(X)))
+        self.entered.set()
+        if self.hold is not None and len(self.calls) == 1:
+            self.hold.wait(5)
+        return np.asarray(X) * 2
+
+
+class PredictionBatcherTests(SimpleTestCase):
+    def test_idle_call_runs_at_once_on_the_caller_thread(self):
+        batcher = PredictionBatcher("t", window_ms=500)
+        model = DoublingModel()
+        started = time.perf_counter()
+        out = batcher.predict(model, np.arange(4).reshape(-1, 1))
+        self.assertLess(time.perf_counter() - started, 0.25)
+        np.testing.assert_array_equal(out.ravel(), [0, 2, 4, 6])
+        self.assertEqual(model.calls, [(threading.current_thread().name, 4)])
+        stats = batcher.stats()
+        self.assertEqual((stats["requests"], stats["idle_requests"], stats["batches"]), (1, 1, 0))
+
+    def test_calls_arriving_while_busy_share_a_batch(self):
+        hold = threading.Event()
+        model = DoublingModel(hold)
+        batcher = PredictionBatcher("t", window_ms=200)
+        results = {}
+
+        def call(key, X):
+            results[key] = batcher.predict(model, X)
+
+        first = threading.Thread(target=call, args=("first", np.ones((2, 1))))
+        first.start()
+        self.assertTrue(model.entered.wait(5))
+        queued = [threading.Thread(target=call, args=(i, np.full((i + 1, 1), i))) for i in range(3)]
+        for t in queued:
+            t.start()
+        for t in queued:
+            t.join(5)
+        hold.set()
+        first.join(5)
+
+        np.testing.assert_array_equal(results["first"].ravel(), [2, 2])
+        for i in range(3):
+            np.testing.assert_array_equal(results[i].ravel(), [2 * i] * (i + 1))
+        # The idle call ran alone on its own thread; the three that queued behind it ran as one batch
+        self.assertEqual(model.calls[1], ("batcher-t", 6))
+        stats = batcher.stats()
+        self.assertEqual((stats["requests"], stats["idle_requests"], stats["batches"]), (4, 1, 1))
+        self.assertEqual(stats["max_batch_requests"], 3)
+
+    def test_large_calls_bypass_the_queue(self):
+        batcher = PredictionBatcher("t", window_ms=500, bypass_rows=8)
+        model = DoublingModel()
+        batcher.predict(model, np.zeros((8, 1)))
+        self.assertEqual(batcher.stats()["direct_requests"], 1)
+
+    def test_errors_reach_the_caller(self):
+        class Broken:
+            def predict(self, X):
+                raise ValueError("bad input")
+
+        with self.assertRaisesRegex(ValueError, "bad input"):
+            PredictionBatcher("t").predict(Broken(), np.zeros((1, 1)))
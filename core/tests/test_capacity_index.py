@@ -0,0 +1,82 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from core.capacity_index import CapacityBlocks, CapacityTree
+from core.vehicle_assignment import fleet_from_spec
+
+
+def brute_best_fit(indices, remaining_kg, remaining_L, weight, volume):
+    fits = [(remaining_kg[i], i) for i in indices if remaining_kg[i] >= weight and remaining_L[i] >= volume]
+    return min(fits)[1] if fits else -1
+
+
+def brute_leftmost(positions, remaining_kg, remaining_L, weight, volume):
+    for i in positions:
+        if remaining_kg[i] >= weight and remaining_L[i] >= volume:
+            return i
+    return -1
+
+
+class CapacityIndexTests(SimpleTestCase):
+    def fleet(self, n, seed):
+        rng = np.random.default_rng(seed)
+        # Weight and volume deliberately uncorrelated, so the kg order says nothing about L
+        return rng, np.round(rng.uniform(100, 2000, n), 1), np.round(rng.uniform(100, 6000, n), 1)
+
+    def test_tree_matches_brute_force_best_fit(self):
+        for seed in range(4):
+            rng, kg, L = self.fleet(300, seed)
+            indices = np.flatnonzero(rng.random(len(kg)) < 0.7)
+            tree = CapacityTree(indices, kg, L, seed=seed)
+            self.assertEqual(len(tree), len(indices))
+            for _ in range(600):
+                w, v = float(rng.uniform(5, 400)), float(rng.uniform(5, 1200))
+                j = tree.best_fit(w, v)
+                self.assertEqual(j, brute_best_fit(indices, kg, L, w, v))
+                if j >= 0:
+                    old = float(kg[j])
+                    kg[j] -= w
+                    L[j] -= v
+                    tree.update(j, old, float(kg[j]), float(L[j]))
+
+    def test_tree_breaks_kg_ties_on_vehicle_index(self):
+        kg = np.array([500.0, 500.0, 500.0])
+        L = np.array([10.0, 900.0, 900.0])
+        tree = CapacityTree([2, 1, 0], kg, L)
+        self.assertEqual(tree.best_fit(100, 50), 1)
+        self.assertEqual(tree.best_fit(100, 5), 0)
+        self.assertEqual(tree.best_fit(600, 5), -1)
+
+    def test_empty_tree(self):
+        self.assertEqual(CapacityTree([], np.array([]), np.array([])).best_fit(1, 1), -1)
+
+    def test_blocks_match_brute_force_leftmost(self):
+        rng, kg, L = self.fleet(500, 7)
+        positions = rng.permutation(len(kg))[:400]
+        blocks = CapacityBlocks(positions, kg, L, block_size=16)
+        for _ in range(500):
+            w, v = float(rng.uniform(5, 400)), float(rng.uniform(5, 1200))
+            j = blocks.leftmost(w, v)
+            self.assertEqual(j, brute_leftmost(positions, kg, L, w, v))
+            if j >= 0:
+                kg[j] -= w
+                L[j] -= v
+                blocks.update(j, kg[j], L[j])
+
+
+class FleetSpecTests(SimpleTestCase):
+    template = {"Vehicle_Type": "Van", "Capacity_kg": 300, "Capacity_L": 900, "Vehicle_Property": "General"}
+
+    def test_rejects_non_string_vehicle_type(self):
+        for bad in (123, None, ["Van"], ""):
+            with self.subTest(vehicle_type=bad):
+                with self.assertRaisesRegex(ValueError, "Vehicle_Type"):
+                    fleet_from_spec({"vehicles": [{**self.template, "Vehicle_Type": bad}]}, [], 1)
+
+    def test_rejects_non_string_vehicle_property(self):
+        with self.assertRaisesRegex(ValueError, "Vehicle_Property"):
+            fleet_from_spec({"vehicles": [{**self.template, "Vehicle_Property": 1}]}, [], 1)
+
+    def test_builds_inline_fleet(self):
+        pool = fleet_from_spec({"vehicles": [{**self.template, "count": 3}]}, [], 1)
+        self.assertEqual(list(pool["Vehicle_ID"]), ["VAN_001", "VAN_002", "VAN_003"])
@@ -0,0 +1,114 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.capture import REPLAY_HEADER, CaptureMiddleware, decode_body
+from core.replay import ClientSender, load_captures, replay, summarize
+from core.tests.test_result_store import SOP_ZONES, TempResultStoreMixin
+
+
+def sop_body(n, urgency="Low"):
+    columns = ["urgency", "fragile", "temp", "capacity_required"] + [f"{z}_used" for z in SOP_ZONES]
+    return json.dumps({"columns": columns, "data": [[urgency, 0, 0, i + 1] + [20] * len(SOP_ZONES) for i in range(n)]})
+
+
+class CaptureMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "captures", "requests.jsonl")
+        self.factory = RequestFactory()
+
+    def middleware(self, **config):
+        config = {"ENABLED": True, "PATH": self.path, "SAMPLE_RATE": 1.0, **config}
+        with override_settings(REQUEST_CAPTURE=config):
+            return CaptureMiddleware(lambda request: HttpResponse(status=201))
+
+    def post(self, middleware, path="/api/sop/", body='{"columns": [], "data": []}', **headers):
+        return middleware(self.factory.post(path, body, content_type="application/json", headers=headers))
+
+    def records(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def test_records_method_body_and_status(self):
+        self.post(self.middleware(), body='{"a": 1}')
+        [record] = self.records()
+        self.assertEqual((record["method"], record["path"], record["status"]), ("POST", "/api/sop/", 201))
+        self.assertEqual(decode_body(record), b'{"a": 1}')
+        self.assertEqual(record["headers"], {"Content-Type": "application/json"})
+
+    def test_sampling(self):
+        middleware = self.middleware(SAMPLE_RATE=0.25)
+        with mock.patch("core.capture.random.random", side_effect=[0.1, 0.3, 0.24, 0.9]):
+            for _ in range(4):
+                self.assertEqual(self.post(middleware).status_code, 201)
+        self.assertEqual(len(self.records()), 2)
+
+    def test_unlisted_paths_and_replayed_requests_are_skipped(self):
+        middleware = self.middleware()
+        self.post(middleware, path="/api/jobs/")
+        self.post(middleware, **{REPLAY_HEADER: "1"})
+        self.assertEqual(self.records(), [])
+        self.post(middleware)
+        self.assertEqual(len(self.records()), 1)
+
+    def test_oversized_and_unsized_bodies_are_skipped(self):
+        middleware = self.middleware(MAX_BODY_BYTES=16)
+        self.post(middleware, body=json.dumps({"pad": "x" * 32}))
+        chunked = self.factory.post("/api/sop/", "{}", content_type="application/json")
+        del chunked.META["CONTENT_LENGTH"]
+        self.assertEqual(middleware(chunked).status_code, 201)
+        self.assertFalse(hasattr(chunked, "_body"))   # the stream was left for the view
+        self.assertEqual(self.records(), [])
+
+    def test_capture_stops_at_file_cap(self):
+        middleware = self.middleware(MAX_FILE_BYTES=1000)
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            for _ in range(20):
+                self.assertEqual(self.post(middleware).status_code, 201)
+        self.assertTrue(middleware.writer.full)
+        self.assertLessEqual(os.path.getsize(self.path), 1000)
+        self.assertGreater(len(self.records()), 0)
+        self.assertEqual(out.getvalue().count("capture stopped"), 1)
+
+    def test_disabled_by_default(self):
+        with override_settings(REQUEST_CAPTURE={}), self.assertRaises(MiddlewareNotUsed):
+            CaptureMiddleware(lambda request: HttpResponse())
+
+
+class ReplayTests(TempResultStoreMixin, SimpleTestCase):
+    def test_capture_then_replay(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "requests.jsonl")
+        with override_settings(REQUEST_CAPTURE={"ENABLED": True, "PATH": path, "SAMPLE_RATE": 1.0}), \
+                contextlib.redirect_stdout(io.StringIO()):
+            for body in (sop_body(3), sop_body(5, urgency="High"), '{"columns": ["urgency"]}'):
+                self.client.post("/api/sop/", body, content_type="application/json")
+            self.client.post("/api/data/", "{}", content_type="application/json")
+            records = load_captures(path)
+            self.assertEqual([r["status"] for r in records], [200, 200, 400, 400])
+            self.assertEqual(len(load_captures(path, paths=["/api/sop/"])), 3)
+
+            samples, elapsed = replay(records, ClientSender(), concurrency=2, repeat=2)
+            # Replayed requests carry the replay header and are not captured again
+            self.assertEqual(len(load_captures(path)), 4)
+
+        summary = summarize(samples, elapsed)
+        sop = summary["endpoints"]["POST /api/sop/"]
+        self.assertEqual(set(summary["endpoints"]), {"POST /api/sop/", "POST /api/data/"})
+        self.assertEqual((sop["requests"], sop["errors"], sop["status_mismatches"]), (6, 0, 0))
+        self.assertEqual(sop["status"], {"200": 4, "400": 2})
+        self.assertEqual(summary["overall"]["requests"], 8)
+        self.assertEqual(summary["overall"]["status_mismatches"], 0)
+        self.assertEqual(set(sop["latency_ms"]), {"p50", "p90", "p95", "p99", "mean", "max"})
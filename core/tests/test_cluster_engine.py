@@ -0,0 +1,179 @@
+import contextlib
+import io
+import os
+import pickle
+import tempfile
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+
+from core import cluster_engine, dispatch
+from core.cluster_engine import CLUSTER_FEATURES, ClusterGrid, assign_clusters, load_cluster_grid
+from core.model_registry import ModelRegistry, file_checksum, pickle_loader
+
+# A coarse grid keeps the build to a few thousand KNN calls
+SMALL_AXES = {"Total_Weight": (16, 4, 3), "Total_Volume": (16, 4, 3), "ML_Priority_Score": (12, 2, 1)}
+
+
+def cluster_frame(n, seed, odd_tags=0):
+    """Orders in raw units; `odd_tags` rows get tags other than 0/1."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Total_Weight": rng.uniform(0, 400, n),
+        "Total_Volume": rng.uniform(0, 900, n),
+        "ML_Priority_Score": rng.uniform(0, 1, n),
+        "Fragility_Tag": rng.integers(0, 2, n).astype(float),
+        "Temp_Tag": rng.integers(0, 2, n).astype(float),
+    })
+    if odd_tags:
+        df.loc[:odd_tags - 1, "Fragility_Tag"] = 2.0
+    return df
+
+
+def fit_models(seed=0):
+    train = cluster_frame(300, seed)
+    labels = ((train["Total_Weight"] > 200).astype(int) + 2 * (train["ML_Priority_Score"] > 0.5)
+              + 4 * train["Temp_Tag"].astype(int))
+    scaler = StandardScaler().fit(train)
+    knn = KNeighborsClassifier(5).fit(scaler.transform(train), labels)
+    return scaler, knn
+
+
+def build_grid(scaler, knn, knn_checksum="knn", scaler_checksum="scaler"):
+    with mock.patch.dict(cluster_engine.GRID_AXES, SMALL_AXES):
+        return ClusterGrid.build(knn, scaler, knn_checksum, scaler_checksum)
+
+
+class ClusterEngineTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.scaler, cls.knn = fit_models()
+        cls.grid = build_grid(cls.scaler, cls.knn)
+
+    def exact(self, df):
+        return self.knn.predict(self.scaler.transform(df[CLUSTER_FEATURES]))
+
+    def recording(self):
+        sent = []
+
+        def predict(model, X):
+            sent.append(np.array(X))
+            return model.predict(X)
+        return sent, predict
+
+    def test_exact_mode_is_knn_predict(self):
+        df = cluster_frame(500, 1, odd_tags=5)
+        for grid in (None, self.grid):
+            labels, stats = assign_clusters(df, self.scaler, self.knn, grid, "exact")
+            np.testing.assert_array_equal(labels, self.exact(df))
+            self.assertEqual(stats, {"rows_exact": 500})
+        # No grid: every mode is exact
+        np.testing.assert_array_equal(assign_clusters(df, self.scaler, self.knn, None, "fast")[0], self.exact(df))
+
+    def test_fast_mode_sends_boundary_cells_and_odd_tags_to_knn(self):
+        df = cluster_frame(2000, 2, odd_tags=25)
+        sent, predict = self.recording()
+        labels, stats = assign_clusters(df, self.scaler, self.knn, self.grid, "fast", predict=predict)
+
+        scaled = cluster_engine.scale_features(df, self.scaler)
+        cont = scaled[:, [CLUSTER_FEATURES.index(f) for f in cluster_engine.CONTINUOUS_FEATURES]]
+        grid_labels, needs_exact = self.grid.lookup(cont, df["Fragility_Tag"].to_numpy(), df["Temp_Tag"].to_numpy())
+        self.assertTrue(needs_exact[:25].all())
+        self.assertTrue(needs_exact[25:].any() and not needs_exact[25:].all())   # boundary cells, 0/1 tags
+
+        self.assertEqual(len(sent), 1)
+        np.testing.assert_array_equal(sent[0], scaled[needs_exact])
+        self.assertEqual(stats, {"rows_grid": int((~needs_exact).sum()), "rows_exact": int(needs_exact.sum())})
+        np.testing.assert_array_equal(labels[needs_exact], self.exact(df)[needs_exact])
+        np.testing.assert_array_equal(labels[~needs_exact], grid_labels[~needs_exact])
+        self.assertGreater((labels == self.exact(df)).mean(), 0.95)
+
+    def test_grid_mode_only_sends_odd_tags(self):
+        df = cluster_frame(1000, 3, odd_tags=10)
+        sent, predict = self.recording()
+        labels, stats = assign_clusters(df, self.scaler, self.knn, self.grid, "grid", predict=predict)
+        self.assertEqual(stats, {"rows_grid": 990, "rows_exact": 10})
+        self.assertEqual(len(sent[0]), 10)
+        np.testing.assert_array_equal(labels[:10], self.exact(df)[:10])
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "grid.npz")
+            self.grid.save(path)
+            loaded = load_cluster_grid(path)
+        np.testing.assert_array_equal(loaded.labels, self.grid.labels)
+        np.testing.assert_array_equal(loaded.boundary, self.grid.boundary)
+        self.assertEqual((loaded.knn_checksum, loaded.scaler_checksum), ("knn", "scaler"))
+        for got, expected in zip(loaded.axes, self.grid.axes):
+            np.testing.assert_array_equal(got, expected)
+
+
+class ClusterGridVersionTests(SimpleTestCase):
+    """The dispatch pipeline only uses a grid built from the KNN and scaler it has loaded."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.scaler, self.knn = fit_models()
+        paths = {name: os.path.join(tmp.name, f"{name}.pkl") for name in ("priority", "scaler", "knn")}
+        train = cluster_frame(100, 4)
+        priority = RandomForestRegressor(n_estimators=3, random_state=0).fit(
+            train[["Total_Weight", "Total_Volume"]], train["ML_Priority_Score"])
+        for name, obj in (("priority", priority), ("scaler", self.scaler), ("knn", self.knn)):
+            with open(paths[name], "wb") as f:
+                pickle.dump(obj, f)
+        self.paths = paths
+        self.grid_path = os.path.join(tmp.name, "knn_grid.npz")
+
+        self.registry = ModelRegistry(check_interval=0)
+        self.registry.register("dispatch_priority", paths["priority"], pickle_loader)
+        self.registry.register("dispatch_scaler", paths["scaler"], pickle_loader)
+        self.registry.register("dispatch_knn", paths["knn"], pickle_loader)
+        self.registry.register("dispatch_knn_grid", self.grid_path, load_cluster_grid)
+        patcher = mock.patch.object(dispatch, "registry", self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def save_grid(self, knn_checksum):
+        build_grid(self.scaler, self.knn, knn_checksum, file_checksum(self.paths["scaler"])).save(self.grid_path)
+
+    def cluster(self, mode):
+        df = cluster_frame(400, 5)
+        with contextlib.redirect_stdout(io.StringIO()):
+            clustering = dispatch.score_and_cluster(df, mode)
+        return df, clustering
+
+    def current_grid(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return dispatch.current_cluster_grid()
+
+    def test_missing_grid_falls_back_to_exact(self):
+        grid, reason = self.current_grid()
+        self.assertIsNone(grid)
+        self.assertIn("No cluster grid", reason)
+
+    def test_grid_from_another_knn_falls_back_to_exact(self):
+        self.save_grid("0" * 64)
+        grid, reason = self.current_grid()
+        self.assertIsNone(grid)
+        self.assertIn("different KNN", reason)
+
+        df, clustering = self.cluster("fast")
+        self.assertEqual((clustering["mode"], clustering["engine"]), ("fast", "exact"))
+        self.assertEqual(clustering["fallback_reason"], reason)
+        self.assertEqual(clustering["rows_exact"], len(df))
+        np.testing.assert_array_equal(df["Cluster"], self.knn.predict(self.scaler.transform(df[CLUSTER_FEATURES])))
+
+    def test_matching_grid_is_used(self):
+        self.save_grid(file_checksum(self.paths["knn"]))
+        self.assertIsNotNone(self.current_grid()[0])
+        df, clustering = self.cluster("fast")
+        self.assertEqual(clustering["engine"], "fast")
+        self.assertNotIn("fallback_reason", clustering)
+        self.assertEqual(clustering["rows_grid"] + clustering["rows_exact"], len(df))
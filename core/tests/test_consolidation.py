@@ -0,0 +1,113 @@
+import contextlib
+import io
+import time
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from core.consolidation import Consolidator, consolidate_plan, optimize_budget
+from core.dispatch import plan_dispatch, planning_order, request_fleet
+from core.tests.test_low_memory import dispatch_payload
+from core.tests.test_plan_sessions import scored_orders
+from core.vehicle_assignment import FleetState, assign_vehicles
+
+
+class OptimizeBudgetTests(SimpleTestCase):
+    def test_valid_budgets(self):
+        self.assertIsNone(optimize_budget(None))
+        self.assertIsNone(optimize_budget(False))
+        self.assertEqual(optimize_budget(True), 0.2)
+        self.assertEqual(optimize_budget({}), 0.2)
+        self.assertEqual(optimize_budget({"time_budget_ms": 50}), 0.05)
+        self.assertEqual(optimize_budget({"time_budget_ms": "10000"}), 10.0)
+
+    @override_settings(DISPATCH_OPTIMIZER={"MAX_TIME_BUDGET_MS": 500})
+    def test_invalid_budgets(self):
+        for option in ("yes", 1, [200], {"time_budget_ms": "soon"}, {"time_budget_ms": None},
+                       {"time_budget_ms": 0}, {"time_budget_ms": -5}, {"time_budget_ms": 501}):
+            with self.subTest(option=option):
+                with self.assertRaises(ValueError):
+                    optimize_budget(option)
+
+    def test_dispatch_rejects_bad_budgets_with_a_400(self):
+        for option in ({"time_budget_ms": 10 ** 6}, "fast"):
+            with self.subTest(option=option), contextlib.redirect_stdout(io.StringIO()):
+                body, code = plan_dispatch({**dispatch_payload(3), "optimize": option})
+            self.assertEqual(code, 400)
+            self.assertIn("optimize", body["error"])
+
+
+class ConsolidationTests(SimpleTestCase):
+    def greedy_plan(self, n, seed, per_type):
+        df = scored_orders(n, seed, heavy=True)
+        df["Assignment_Status"] = "Not_Assigned"
+        df["Assigned_Vehicle_ID"] = None
+        order_index = planning_order(df)
+        fleet = assign_vehicles(df, request_fleet({"per_type": per_type}), order_index)
+        return df, order_index, fleet
+
+    def check_plan(self, df, fleet):
+        hit = (df["Assignment_Status"] == "Assigned").to_numpy()
+        vehicle = {v: i for i, v in enumerate(fleet.vehicle_ids)}
+        on = df.loc[hit, "Assigned_Vehicle_ID"].map(vehicle).to_numpy()
+        loaded_kg = np.bincount(on, weights=df.loc[hit, "Total_Weight"], minlength=len(fleet))
+        loaded_L = np.bincount(on, weights=df.loc[hit, "Total_Volume"], minlength=len(fleet))
+        self.assertTrue((loaded_kg <= fleet.capacity_kg + 1e-6).all())
+        self.assertTrue((loaded_L <= fleet.capacity_L + 1e-6).all())
+        np.testing.assert_allclose(fleet.remaining_kg, fleet.capacity_kg - loaded_kg, atol=1e-6)
+        np.testing.assert_allclose(fleet.remaining_L, fleet.capacity_L - loaded_L, atol=1e-6)
+        np.testing.assert_array_equal(fleet.used.astype(bool), np.bincount(on, minlength=len(fleet)) > 0)
+        tf_on = on[(df.loc[hit, "Load_Type"] == "TF").to_numpy()]
+        self.assertTrue(fleet.specialised_mask[tf_on].all())
+
+    def test_never_worse_than_greedy(self):
+        for seed, n, per_type in ((0, 120, 2), (1, 300, 4), (2, 60, 6)):
+            with self.subTest(seed=seed):
+                df, order_index, fleet = self.greedy_plan(n, seed, per_type)
+                before = ((df["Assignment_Status"] == "Assigned").sum(), int(fleet.used.sum()))
+                report = consolidate_plan(df, order_index, fleet, time_budget=0.15, seed=seed)
+                after = ((df["Assignment_Status"] == "Assigned").sum(), int(fleet.used.sum()))
+
+                self.assertEqual((report["greedy"]["orders_assigned"], report["greedy"]["vehicles_used"]), before)
+                self.assertEqual((report["optimized"]["orders_assigned"], report["optimized"]["vehicles_used"]), after)
+                self.assertGreaterEqual(after[0], before[0])
+                if after[0] == before[0]:
+                    self.assertLessEqual(after[1], before[1])
+                self.assertEqual(report["improvement"]["orders_added"], after[0] - before[0])
+                self.check_plan(df, fleet)
+
+    def test_it_finds_room_greedy_missed(self):
+        # The 9 kg order fits V1 only once the 4 kg order moves over to V2
+        fleet = FleetState(["V1", "V2"], ["S", "S"], ["General", "General"], [10.0, 6.0], [100.0, 100.0],
+                           remaining_kg=[6.0, 5.0], remaining_L=[99.0, 99.0], used=[1, 1])
+        search = Consolidator(fleet, ["N", "N", "N"], [4.0, 9.0, 1.0], [1.0, 1.0, 1.0], [0, -1, 1])
+        report = search.run(time.perf_counter() + 1)
+        self.assertEqual(search.assigned.tolist()[:2], [1, 0])
+        self.assertEqual(report["inserted"], 1)
+        self.check_search(search)
+
+    def test_tf_orders_stay_on_specialised_vehicles(self):
+        def fleet():
+            return FleetState(["G", "S"], ["Large", "Special_Small"], ["General", "Specialised"], [100.0, 5.0],
+                              [100.0, 100.0], remaining_kg=[99.0, 2.0], remaining_L=[99.0, 99.0], used=[1, 1])
+
+        # The N order on S makes way for the TF order
+        search = Consolidator(fleet(), ["TF", "N", "N"], [4.0, 3.0, 1.0], [1.0, 1.0, 1.0], [-1, 1, 0])
+        search.run(time.perf_counter() + 0.2)
+        self.assertEqual(search.assigned.tolist()[:2], [1, 0])
+        self.check_search(search)
+        # A TF order in the way cannot move to the general vehicle
+        search = Consolidator(fleet(), ["TF", "TF", "N"], [4.0, 3.0, 1.0], [1.0, 1.0, 1.0], [-1, 1, 0])
+        search.run(time.perf_counter() + 0.2)
+        self.assertEqual(search.assigned.tolist()[:2], [-1, 1])
+        self.check_search(search)
+
+    def check_search(self, search):
+        """Remaining kg / L agree with the orders placed, nothing is over capacity, TF only on Specialised."""
+        on = search.assigned >= 0
+        loaded_kg = np.bincount(search.assigned[on], weights=search.weights[on], minlength=len(search.loads))
+        loaded_L = np.bincount(search.assigned[on], weights=search.volumes[on], minlength=len(search.loads))
+        np.testing.assert_allclose(search.remaining_kg, search.capacity_kg - loaded_kg)
+        np.testing.assert_allclose(search.remaining_L, search.capacity_L - loaded_L)
+        self.assertTrue((search.remaining_kg >= 0).all() and (search.remaining_L >= 0).all())
+        self.assertTrue(search.specialised[search.assigned[on & search.specialised_only]].all())
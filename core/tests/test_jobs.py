@@ -0,0 +1,117 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from core.jobs import JobQueueFull, JobRunner, JobStore
+from core.tests.test_result_store import SOP_ZONES, TempResultStoreMixin
+
+
+def quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def echo(value, progress):
+    progress(0.5, "halfway")
+    return {"value": value}, 200
+
+
+def rejected(progress):
+    return {"error": "bad batch"}, 400
+
+
+def crash(progress):
+    raise RuntimeError("boom")
+
+
+class JobRunnerTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = JobStore(os.path.join(tmp.name, "results.sqlite3"))
+
+    def runner(self, **limits):
+        runner = JobRunner(self.store, **limits)
+        self.addCleanup(runner._executor.shutdown, wait=True)
+        return runner
+
+    def wait(self, job_id, timeout=10):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = self.store.get(job_id)
+            if job["status"] not in ("queued", "running"):
+                return job
+            time.sleep(0.01)
+        self.fail(f"job {job_id} still {job['status']}")
+
+    def test_submit_then_poll_until_done(self):
+        runner = self.runner()
+        with quiet():
+            job_id = runner.submit("test", echo, [1, 2])
+            job = self.wait(job_id)
+        self.assertEqual((job["status"], job["status_code"], job["result"]), ("succeeded", 200, {"value": [1, 2]}))
+        self.assertEqual((job["progress"], job["stage"]), (1.0, "done"))
+        self.assertIsNotNone(job["finished"])
+        self.assertEqual(runner.info()["active_in_process"], 0)
+
+    def test_failures_are_recorded(self):
+        runner = self.runner()
+        with quiet(), contextlib.redirect_stderr(io.StringIO()):
+            bad = self.wait(runner.submit("test", rejected))
+            crashed = self.wait(runner.submit("test", crash))
+        self.assertEqual((bad["status"], bad["status_code"], bad["error"]), ("failed", 400, "bad batch"))
+        self.assertEqual((crashed["status"], crashed["status_code"], crashed["error"]), ("failed", 500, "boom"))
+
+    def test_full_queue_is_refused(self):
+        runner = self.runner(max_workers=1, max_queued=1)
+        release = threading.Event()
+
+        def blocked(progress):
+            release.wait(10)
+            return {}, 200
+
+        with quiet():
+            first = runner.submit("test", blocked)
+            second = runner.submit("test", blocked)
+            with self.assertRaises(JobQueueFull):
+                runner.submit("test", blocked)
+            release.set()
+            self.wait(first)
+            self.wait(second)
+            # Slots are handed back once jobs finish
+            self.wait(runner.submit("test", echo, 3))
+
+    def test_job_of_a_dead_process_is_failed(self):
+        job_id = self.store.create("test")
+        self.store.update(job_id, status="running", pid=2 ** 22 + 12345)
+        job = self.store.get(job_id)
+        self.assertEqual(job["status"], "failed")
+        self.assertIn("exited", job["error"])
+        self.assertEqual(self.store.get(job_id, include_result=False)["status"], "failed")
+
+
+class AsyncEndpointTests(TempResultStoreMixin, SimpleTestCase):
+    def test_async_sop_job(self):
+        columns = ["urgency", "fragile", "temp", "capacity_required"] + [f"{z}_used" for z in SOP_ZONES]
+        data = [[["Low", "Medium", "High"][i % 3], i % 2, 0, i + 1] + [20] * len(SOP_ZONES) for i in range(12)]
+        with quiet():
+            queued = self.client.post("/api/sop/?async=1", json.dumps({"columns": columns, "data": data}),
+                                      content_type="application/json")
+            self.assertEqual(queued.status_code, 202)
+            status_url = queued.json()["status_url"]
+            deadline = time.monotonic() + 10
+            while True:
+                job = self.client.get(status_url).json()
+                if job["status"] not in ("queued", "running") or time.monotonic() > deadline:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(self.client.get("/api/jobs/unknown/").status_code, 404)
+            listing = self.client.get("/api/jobs/").json()
+        self.assertEqual(job["status"], "succeeded", job)
+        self.assertEqual(len(job["result"]["result"]["data"]), 12)
+        self.assertEqual([j["job_id"] for j in listing["jobs"]], [job["job_id"]])
@@ -0,0 +1,84 @@
+import contextlib
+import io
+import json
+import os
+import unittest
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase, override_settings
+
+from core.dispatch import KNN_MODEL_PATH, PRIORITY_MODEL_PATH, SCALER_PATH, plan_dispatch
+from core.low_memory import chunks, column_frame, compact_column
+
+COLUMNS = ["Product_ID", "Product_Name", "Product_Category", "Quantity_Dispatched", "Total_Weight", "Total_Volume",
+           "Fragility_Tag", "Temp_Tag", "Expiry_Duration_Months", "Dispatch_Duration_Days"]
+
+
+def dispatch_payload(n, seed=0):
+    rng = np.random.default_rng(seed)
+    data = []
+    for i in range(n):
+        q = int(rng.integers(1, 50))
+        data.append([f"P{i}", f"Name{i}", "Cat", q, float(round(q * rng.uniform(0.1, 5), 2)),
+                     float(round(q * rng.uniform(0.1, 8), 2)), int(rng.integers(0, 2)), int(rng.integers(0, 2)),
+                     int(rng.integers(1, 36)), int(rng.integers(1, 30))])
+    return {"columns": COLUMNS, "data": data}
+
+
+class CompactColumnTests(SimpleTestCase):
+    def test_compaction_is_lossless(self):
+        cases = {
+            "small ints": pd.Series([0, 5, 200]),
+            "negative ints": pd.Series([-3, 40, 1000]),
+            "exact floats": pd.Series([0.5, 1.25, -8.0]),
+            "inexact floats": pd.Series([0.1, 1 / 3, 2.2]),
+            "repeated labels": pd.Series(["Cat", "Cat", "Dog", "Cat"], dtype=object),
+            "unique labels": pd.Series(["a", "b", "c"], dtype=object),
+        }
+        for name, values in cases.items():
+            with self.subTest(name):
+                compact = compact_column(values)
+                self.assertEqual(compact.tolist(), values.tolist())
+        self.assertEqual(compact_column(cases["small ints"]).dtype, np.uint8)
+        self.assertEqual(compact_column(cases["exact floats"]).dtype, np.float32)
+        self.assertEqual(compact_column(cases["inexact floats"]).dtype, np.float64)
+        self.assertIsInstance(compact_column(cases["repeated labels"]).dtype, pd.CategoricalDtype)
+        self.assertEqual(compact_column(cases["unique labels"]).dtype, object)
+
+    def test_column_frame_matches_row_frame(self):
+        payload = dispatch_payload(50)
+        pd.testing.assert_frame_equal(
+            column_frame(payload["columns"], payload["data"]), pd.DataFrame(payload["data"], columns=COLUMNS)
+        )
+        with self.assertRaisesRegex(ValueError, "10 columns passed"):
+            column_frame(COLUMNS, payload["data"][:2] + [payload["data"][2][:-1]])
+
+    def test_chunks_cover_every_row_once(self):
+        self.assertEqual(chunks(10, 4), [slice(0, 4), slice(4, 8), slice(8, 10)])
+        self.assertEqual(chunks(10), [slice(0, 10)])
+        self.assertEqual(chunks(0, 4), [])
+
+
+@unittest.skipUnless(all(os.path.exists(p) for p in (PRIORITY_MODEL_PATH, SCALER_PATH, KNN_MODEL_PATH)),
+                     "dispatch models not present")
+@override_settings(DISPATCH_MEMORY={"CHUNK_ROWS": 170})
+class LowMemoryPlanMatchesStandard(SimpleTestCase):
+    """memory_mode "low" must return the same plan as "standard"; only the memory report may differ."""
+
+    def plan(self, payload):
+        with contextlib.redirect_stdout(io.StringIO()):
+            body, code = plan_dispatch(payload)
+        self.assertEqual(code, 200, body)
+        body = json.loads(json.dumps({**body, "data": body["data"].tolist()}, default=str))
+        body.pop("memory", None)
+        return body
+
+    def test_modes(self):
+        payload = dispatch_payload(1000, seed=3)
+        for extra in ({}, {"cluster_mode": "fast"}, {"cluster_mode": "grid"},
+                      {"packing_mode": "best_fit_decreasing"}, {"fleet": {"per_type": 40}}):
+            with self.subTest(**{k: str(v) for k, v in extra.items()}):
+                standard = self.plan({**payload, **extra})
+                low = self.plan({**payload, **extra, "memory_mode": "low"})
+                self.assertEqual(low, standard)
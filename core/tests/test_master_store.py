@@ -0,0 +1,155 @@
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from core.file_handler import ProductMaster, enrich_orders, normalize_master_columns
+from core.master_store import MasterStore
+from core.tests.test_order_enrichment import order_batch, product_master
+
+
+def rows(*specs):
+    return pd.DataFrame([{"Product_ID": pid, "Name": name, "Qty": qty} for pid, name, qty in specs])
+
+
+class MasterStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = self.make_store()
+        self.store.replace(rows(("P1", "a", 1), ("P2", "b", 2), ("P3", "c", 3)), source="seed")
+
+    def make_store(self, keep_versions=500):
+        return MasterStore(os.path.join(self.tmp.name, f"master-{keep_versions}.sqlite3"), keep_versions)
+
+    def master(self):
+        return self.store.load()[1].set_index("Product_ID").sort_index()
+
+    def test_replace_is_one_version_and_skips_no_op_writes(self):
+        self.assertEqual(self.store.version(), 1)
+        report = self.store.replace(rows(("P1", "a", 1), ("P2", "b", 2), ("P3", "c", 3)))
+        self.assertEqual((report["version"], report["unchanged"]), (1, 3))
+        self.assertEqual(self.store.version(), 1)
+
+    def test_upsert_inserts_and_updates_given_columns_only(self):
+        report = self.store.upsert(pd.DataFrame({"Product_ID": ["P1", "P4"], "Qty": [10, 40]}))
+        self.assertEqual((report["version"], report["inserted"], report["updated"]), (2, 1, 1))
+        self.assertEqual(report["product_ids"], {"inserted": ["P4"], "updated": ["P1"], "deleted": []})
+        master = self.master()
+        self.assertEqual(master.loc["P1"].tolist(), ["a", 10])
+        self.assertEqual(master.loc["P4", "Qty"], 40)
+        self.assertTrue(pd.isna(master.loc["P4", "Name"]))
+        self.assertEqual(master.loc["P2"].tolist(), ["b", 2])
+        self.assertEqual(self.store.head()["rows"], 4)
+
+    def test_upsert_rejects_bad_rows(self):
+        with self.assertRaisesRegex(ValueError, "Unknown master columns"):
+            self.store.upsert(pd.DataFrame({"Product_ID": ["P1"], "Colour": ["red"]}))
+        with self.assertRaisesRegex(ValueError, "Duplicate Product_ID"):
+            self.store.upsert(rows(("P1", "x", 1), ("P1", "y", 2)))
+        self.assertEqual(self.store.version(), 1)
+
+    def test_delete_reports_missing_and_is_idempotent(self):
+        report = self.store.delete(["P2", "NOPE", "P2"])
+        self.assertEqual((report["version"], report["deleted"], report["missing"]), (2, 1, ["NOPE"]))
+        self.assertEqual(sorted(self.master().index), ["P1", "P3"])
+        self.assertEqual(self.store.delete(["P2"])["version"], 2)
+
+    def test_delta_and_change_feed(self):
+        self.store.upsert(rows(("P1", "a2", 1), ("P4", "d", 4)))
+        self.store.delete(["P2"])
+        self.store.upsert(rows(("P4", "d2", 4),))
+
+        head, changed, deleted = self.store.delta(1)
+        self.assertEqual(head["version"], 4)
+        self.assertEqual(sorted(changed["Product_ID"]), ["P1", "P4"])
+        self.assertEqual(changed.set_index("Product_ID").loc["P4", "Name"], "d2")
+        self.assertEqual(deleted, ["P2"])
+        self.assertEqual(len(self.store.delta(4)[1]), 0)
+
+        feed = self.store.changes(1)
+        self.assertEqual(feed["total"], 3)
+        self.assertEqual([(c["product_id"], c["op"], c["version"]) for c in feed["changes"]],
+                         [("P1", "upsert", 2), ("P2", "delete", 3), ("P4", "upsert", 4)])
+        page = self.store.changes(1, offset=1, limit=1)
+        self.assertEqual([c["product_id"] for c in page["changes"]], ["P2"])
+        self.assertEqual(self.store.changes(1, until=2)["total"], 2)
+        self.assertEqual([v["version"] for v in self.store.versions()], [4, 3, 2, 1])
+
+    def test_pruned_change_log_asks_for_a_full_reload(self):
+        store = self.make_store(keep_versions=2)
+        for qty in range(4):
+            store.replace(rows(("P1", "a", qty)))
+        self.assertIsNone(store.delta(0))
+        self.assertTrue(store.changes(0)["full_reload"])
+        self.assertIsNotNone(store.delta(2))
+
+
+class ProductMasterDeltaTests(SimpleTestCase):
+    """A snapshot refreshed from the change log must serve the same products as a full rebuild."""
+
+    def test_delta_refresh_matches_full_rebuild(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        store = MasterStore(os.path.join(tmp.name, "master.sqlite3"))
+        seed = normalize_master_columns(product_master(40, seed=1))
+        store.replace(seed, source="seed")
+        missing_csv = os.path.join(tmp.name, "products.csv")
+        cached = ProductMaster(missing_csv, check_interval=0, store=store)
+        refreshes = []
+        cached.on_change(lambda snapshot, changes: refreshes.append(changes["full"]))
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            before = cached.snapshot()
+            changed = seed.iloc[[1, 2]].copy()
+            changed["Unit_Weight_kg"] = [9.5, 0.25]
+            changed["Batch_Number"] = ["B99", "B31"]
+            new = seed.iloc[[0]].assign(Product_ID="P-NEW", Expiry_Date="2030-01-01")
+            store.upsert(pd.concat([changed, new]))
+            store.delete(["P-0007"])
+            after = cached.snapshot()
+            full = ProductMaster(missing_csv, check_interval=0, store=store).snapshot()
+
+        self.assertEqual((before.version, after.version, full.version), (1, 3, 3))
+        self.assertEqual(refreshes, [True, False])
+        self.assertEqual(len(after), len(full))
+        order = after.features.index.argsort()
+        self.assertEqual(after.features.index[order].tolist(), sorted(full.features.index))
+        for name, values in after.features.columns.items():
+            np.testing.assert_array_equal(values[order], full.features.columns[name][full.features.index.argsort()])
+
+        orders = order_batch(seed[seed["Product_ID"] != "P-0007"], 200, seed=3)
+        orders.loc[0, "Product_ID"] = "P-NEW"
+        pd.testing.assert_frame_equal(enrich_orders(orders, after.features), enrich_orders(orders, full.features))
+        with self.assertRaisesRegex(ValueError, "P-0007"):
+            enrich_orders(orders.assign(Product_ID="P-0007"), after.features)
+
+    def test_cold_start_loads_once(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        store = MasterStore(os.path.join(tmp.name, "master.sqlite3"))
+        store.replace(normalize_master_columns(product_master(40, seed=1)), source="seed")
+        cached = ProductMaster(os.path.join(tmp.name, "products.csv"), check_interval=60, store=store)
+        load = store.load
+
+        def slow_load():
+            time.sleep(0.05)
+            return load()
+
+        snapshots = []
+        with mock.patch.object(store, "load", side_effect=slow_load) as loads, \
+                contextlib.redirect_stdout(io.StringIO()):
+            threads = [threading.Thread(target=lambda: snapshots.append(cached.snapshot())) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(loads.call_count, 1)
+        self.assertEqual(len({id(s) for s in snapshots}), 1)
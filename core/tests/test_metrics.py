@@ -0,0 +1,118 @@
+import contextlib
+import io
+import json
+import re
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core import metrics
+from core.metrics import NOOP_TIMER, PROMETHEUS_CONTENT_TYPE, MetricsRegistry, get_metrics, stage
+from core.tests.test_result_store import SOP_ZONES, TempResultStoreMixin
+
+BUCKETS = [0.001, 0.01, 0.1, 1.0]
+
+# name{labels} value, as the text exposition format writes a sample
+SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)\{([^}]*)\} (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_prometheus(text):
+    """{(name, ((label, value), ...)): float} for every sample; fails on a line that is not valid text format."""
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith("# HELP ") or line.startswith("# TYPE "):
+            continue
+        match = SAMPLE_LINE.match(line)
+        if match is None:
+            raise AssertionError(f"not a Prometheus sample line: {line!r}")
+        name, labels, value = match.groups()
+        pairs = tuple(LABEL.findall(labels))
+        if ",".join(f'{k}="{v}"' for k, v in pairs) != labels:
+            raise AssertionError(f"bad label set: {line!r}")
+        samples[(name, pairs)] = float(value)
+    return samples
+
+
+@contextlib.contextmanager
+def metrics_registry(registry):
+    """Routes stage() / get_metrics() to `registry` (None: metrics disabled)."""
+    with mock.patch.object(metrics, "_metrics", registry), mock.patch.object(metrics, "_configured", True):
+        yield registry
+
+
+class StageTests(SimpleTestCase):
+    def test_stage_records_latency_rows_and_errors(self):
+        with metrics_registry(MetricsRegistry(BUCKETS)) as registry:
+            with stage("sop", "allocation", rows=12) as timer:
+                timer.rows(10)
+            with self.assertRaises(ValueError), stage("sop", "allocation"):
+                raise ValueError("bad batch")
+        histogram = registry._values["mlapi_stage_seconds"][("sop", "allocation")]
+        self.assertEqual(histogram.count, 2)
+        self.assertEqual(sum(histogram.counts), 2)
+        self.assertGreaterEqual(histogram.sum, 0.0)
+        self.assertEqual(registry._values["mlapi_stage_rows_total"], {("sop", "allocation"): 10})
+        self.assertEqual(registry._values["mlapi_stage_errors_total"], {("sop", "allocation"): 1})
+
+    def test_disabled_stage_is_a_noop(self):
+        with metrics_registry(None):
+            with stage("sop", "allocation", rows=3) as timer:
+                timer.rows(4)
+            self.assertIs(stage("sop", "parse"), NOOP_TIMER)
+            with self.assertRaises(KeyError), stage("sop", "parse"):
+                raise KeyError("still raised")
+
+    def test_settings_switch_metrics_off(self):
+        with mock.patch.object(metrics, "_metrics", None), mock.patch.object(metrics, "_configured", False):
+            with override_settings(METRICS={"ENABLED": False}):
+                self.assertIsNone(get_metrics())
+        with mock.patch.object(metrics, "_metrics", None), mock.patch.object(metrics, "_configured", False):
+            with override_settings(METRICS={"ENABLED": True, "BUCKETS": BUCKETS}):
+                self.assertEqual(get_metrics().buckets, BUCKETS)
+
+
+class RenderTests(SimpleTestCase):
+    def test_render_is_valid_exposition_text(self):
+        registry = MetricsRegistry(BUCKETS)
+        for seconds in (0.0005, 0.005, 0.005, 0.5, 7.0):
+            registry.observe("mlapi_stage_seconds", ("dispatch", "clustering"), seconds)
+        registry.inc("mlapi_stage_rows_total", ("dispatch", "clustering"), 300)
+        registry.set("mlapi_model_generation", ('odd "name"\\x',), 2)
+        text = registry.render()
+        samples = parse_prometheus(text)
+
+        for name, (kind, _, _) in MetricsRegistry.METRICS.items():
+            self.assertIn(f"# TYPE {name} {kind}\n", text)
+        labels = (("component", "dispatch"), ("stage", "clustering"))
+        buckets = [samples[("mlapi_stage_seconds_bucket", labels + (("le", le),))]
+                   for le in ("0.001", "0.01", "0.1", "1.0", "+Inf")]
+        self.assertEqual(buckets, [1, 3, 3, 4, 5])
+        self.assertEqual(samples[("mlapi_stage_seconds_count", labels)], 5)
+        self.assertAlmostEqual(samples[("mlapi_stage_seconds_sum", labels)], 7.5105)
+        self.assertEqual(samples[("mlapi_stage_rows_total", labels)], 300)
+        self.assertEqual(samples[("mlapi_model_generation", (("model", 'odd \\"name\\"\\\\x'),))], 2)
+
+
+class MetricsEndpointTests(TempResultStoreMixin, SimpleTestCase):
+    def test_metrics_view_shows_stage_histograms(self):
+        columns = ["urgency", "fragile", "temp", "capacity_required"] + [f"{z}_used" for z in SOP_ZONES]
+        payload = {"columns": columns, "data": [["High", 0, 0, 2] + [10] * len(SOP_ZONES)] * 4}
+        with metrics_registry(MetricsRegistry(BUCKETS)), contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(self.client.post("/api/sop/", json.dumps(payload),
+                                              content_type="application/json").status_code, 200)
+            response = self.client.get("/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], PROMETHEUS_CONTENT_TYPE)
+        samples = parse_prometheus(response.content.decode())
+        for stage_name in ("parse", "allocation", "serialize", "storing", "render"):
+            labels = (("component", "sop"), ("stage", stage_name))
+            self.assertEqual(samples[("mlapi_stage_seconds_count", labels)], 1, stage_name)
+        self.assertEqual(samples[("mlapi_stage_rows_total", (("component", "sop"), ("stage", "allocation")))], 4)
+        request = (("view", "sop"), ("method", "POST"), ("status", "200"))
+        self.assertEqual(samples[("mlapi_request_seconds_count", request)], 1)
+
+    def test_metrics_view_is_a_404_when_disabled(self):
+        with metrics_registry(None):
+            response = self.client.get("/metrics/")
+        self.assertEqual(response.status_code, 404)
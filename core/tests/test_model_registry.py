@@ -0,0 +1,122 @@
+import contextlib
+import io
+import os
+import pickle
+import tempfile
+import threading
+
+from django.test import SimpleTestCase
+
+from core.model_registry import ModelRegistry, pickle_loader
+
+
+def _quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.registry = ModelRegistry(check_interval=0)
+
+    def write(self, name, obj, mtime=None):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "wb") as f:
+            pickle.dump(obj, f)
+        if mtime is not None:
+            os.utime(path, ns=(mtime, mtime))
+        return path
+
+    def test_loads_once_and_shares_the_object(self):
+        self.registry.register("m", self.write("m.pkl", {"v": 1}))
+        with _quiet():
+            first = self.registry.get("m")
+            second = self.registry.get("m")
+        self.assertIs(first, second)
+        self.assertEqual(self.registry.entry("m").generation, 1)
+
+    def test_reloads_a_changed_file(self):
+        path = self.write("m.pkl", {"v": 1}, mtime=1_000_000_000)
+        self.registry.register("m", path)
+        with _quiet():
+            old = self.registry.get("m")
+            self.write("m.pkl", {"v": 2}, mtime=2_000_000_000)
+            new = self.registry.get("m")
+        self.assertEqual(old, {"v": 1})
+        self.assertEqual(new, {"v": 2})
+        self.assertEqual(self.registry.entry("m").generation, 2)
+
+    def test_touched_but_unchanged_file_keeps_the_object(self):
+        path = self.write("m.pkl", {"v": 1}, mtime=1_000_000_000)
+        self.registry.register("m", path)
+        with _quiet():
+            old = self.registry.get("m")
+            os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+            self.assertIs(self.registry.get("m"), old)
+        self.assertEqual(self.registry.entry("m").generation, 1)
+
+    def test_keeps_serving_when_the_file_disappears(self):
+        path = self.write("m.pkl", {"v": 1})
+        self.registry.register("m", path)
+        with _quiet():
+            old = self.registry.get("m")
+            os.remove(path)
+            self.assertIs(self.registry.get("m"), old)
+
+    def test_failed_reload_keeps_the_last_good_model(self):
+        path = self.write("m.pkl", {"v": 1}, mtime=1_000_000_000)
+        self.registry.register("m", path)
+        with _quiet(), contextlib.redirect_stderr(io.StringIO()):
+            old = self.registry.get("m")
+            with open(path, "wb") as f:
+                f.write(b"not a pickle")
+            os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+            self.assertIs(self.registry.get("m"), old)
+
+    def test_forced_reload_and_listeners(self):
+        self.registry.register("m", self.write("m.pkl", {"v": 1}))
+        seen = []
+        self.registry.on_load(lambda name, entry: seen.append((name, entry.generation)))
+        with _quiet():
+            self.registry.get("m")
+            self.registry.reload("m")
+        self.assertEqual(seen, [("m", 1), ("m", 2)])
+
+    def test_slow_load_does_not_block_other_models(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_loader(path):
+            started.set()
+            release.wait(5)
+            return pickle_loader(path)
+
+        self.registry.register("slow", self.write("slow.pkl", "slow"), slow_loader)
+        self.registry.register("fast", self.write("fast.pkl", "fast"))
+        with _quiet():
+            loading = threading.Thread(target=self.registry.get, args=("slow",))
+            loading.start()
+            try:
+                self.assertTrue(started.wait(5))
+                got = []
+                reader = threading.Thread(target=lambda: got.append(self.registry.get("fast")))
+                reader.start()
+                reader.join(2)
+                self.assertEqual(got, ["fast"])
+            finally:
+                release.set()
+                loading.join()
+
+    def test_checksum_is_passed_to_loaders_that_take_it(self):
+        seen = []
+
+        def loader(path, checksum=None):
+            seen.append(checksum)
+            return pickle_loader(path)
+        loader.takes_checksum = True
+
+        self.registry.register("m", self.write("m.pkl", {"v": 1}), loader)
+        with _quiet():
+            self.registry.get("m")
+        self.assertEqual(seen, [self.registry.entry("m").checksum])
+        self.assertEqual(len(seen[0]), 64)
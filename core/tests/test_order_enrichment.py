@@ -0,0 +1,146 @@
+import contextlib
+import io
+import json
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from core.file_handler import build_product_features, enrich_orders, normalize_master_columns
+
+
+def product_master(n, seed):
+    rng = np.random.default_rng(seed)
+    mfg = np.datetime64("2024-01-01") + rng.integers(0, 365, n).astype("timedelta64[D]")
+    expiry = mfg + rng.integers(30, 900, n).astype("timedelta64[D]")
+    df = pd.DataFrame({
+        "Product_ID": [f"P-{i:04d}" for i in range(n)],
+        "Product_Name": rng.choice(["VeeWormex Plus", "VeeMune-L", "Calci Gold"], n),
+        "SKU_Code": [f"SKU-{1000 + i}" for i in range(n)],
+        "Batch_Number": rng.choice(["B31", "B59", "B07"], n),
+        "Manufacture_Date": pd.Series(mfg).dt.strftime("%Y-%m-%d"),
+        "Expiry_Date": pd.Series(expiry).dt.strftime("%Y-%m-%d"),
+        "Unit_Weight (kg)": np.round(rng.uniform(0.1, 5, n), 2),
+        "Unit_Volume (L)": np.round(rng.uniform(0.1, 5, n), 2),
+        "Fragile_Flag": rng.integers(0, 2, n),
+        "Temp_Sensitive_Flag": rng.integers(0, 2, n),
+    })
+    df.loc[3, "Expiry_Date"] = "not a date"
+    df.loc[5, "Manufacture_Date"] = "03/15/2024"
+    return df
+
+
+def order_batch(master, n, seed, messy=False):
+    rng = np.random.default_rng(seed)
+    dispatch = np.datetime64("2025-07-01") + rng.integers(0, 30, n).astype("timedelta64[D]")
+    delivery = dispatch + rng.integers(0, 10, n).astype("timedelta64[D]")
+    df = pd.DataFrame({
+        "Assignment_ID": [f"A{i}" for i in range(n)],
+        "Product_ID": master["Product_ID"].to_numpy()[rng.integers(0, len(master), n)],
+        "Quantity_Assigned": rng.integers(1, 100, n),
+        "Unit_Weight_(kg)": np.round(rng.uniform(0.1, 5, n), 2),
+        "Unit_Volume_(L)": np.round(rng.uniform(0.1, 5, n), 2),
+        "Urgent_Flag": rng.integers(0, 2, n),
+        "Dispatch_Window": pd.Series(dispatch).dt.strftime("%Y-%m-%d"),
+        "Delivery_Window": pd.Series(delivery).dt.strftime("%Y-%m-%d"),
+        "Fragile_Flag": rng.integers(0, 2, n),
+        "Temp_Sensitive_Flag": rng.integers(0, 2, n),
+        "Zone": rng.choice(["A", "B", "C"], n),
+        "Rack": rng.integers(1, 20, n),
+        "UID": rng.integers(1000, 9999, n),
+        "Vehicle_No": rng.choice(["MH12AB1234", "GJ01XY9999"], n),
+    })
+    if messy:
+        df.loc[df.index[::7], "Dispatch_Window"] = "2025-07-03 14:30"
+        df.loc[df.index[::11], "Delivery_Window"] = "07/15/2025"
+        df.loc[df.index[::13], "Delivery_Window"] = "garbage"
+        df.loc[df.index[::17], "Dispatch_Window"] = None
+    return df
+
+
+def legacy_enrich(df, product_df):
+    """The original per-row enrichment (DataFrame.apply), kept as the reference."""
+    product_map = normalize_master_columns(product_df.copy()).set_index("Product_ID").to_dict(orient="index")
+
+    def enrich(row):
+        fragile = int(row.get('Fragile_Flag', 0))
+        temp_sens = int(row.get('Temp_Sensitive_Flag', 0))
+        if fragile and temp_sens:
+            row['Handle'] = 'TF'
+        elif fragile:
+            row['Handle'] = 'F'
+        elif temp_sens:
+            row['Handle'] = 'T'
+        else:
+            row['Handle'] = 'N'
+
+        pid = row['Product_ID']
+        if pid not in product_map:
+            raise ValueError(f"❌ Expiry_Date not found for Product_ID: {pid}")
+        product = product_map[pid]
+
+        dispatch = pd.to_datetime(row['Dispatch_Window'], errors='coerce')
+        delivery = pd.to_datetime(row['Delivery_Window'], errors='coerce')
+        expiry = pd.to_datetime(product['Expiry_Date'], errors='coerce')
+        mfg_date = pd.to_datetime(product['Manufacture_Date'], errors='coerce')
+        qty = float(row['Quantity_Assigned'])
+        row['Total_Weight'] = qty * float(row['Unit_Weight_(kg)'])
+        row['Total_Volume'] = qty * float(row['Unit_Volume_(L)'])
+        row['Delivery_Window_Days'] = (delivery - dispatch).days if pd.notna(dispatch) and pd.notna(delivery) else None
+        row['Expiry_Days_Left'] = (expiry - mfg_date).days if pd.notna(expiry) and pd.notna(mfg_date) else None
+        row['Expiry_Date'] = expiry.strftime("%Y-%m-%d") if pd.notna(expiry) else None
+        row['Assignment_ID'] = f"{row['Zone']}::{row['Rack']}::{row['UID']}::{row['Vehicle_No']}"
+        row['Product_ID'] = (
+            f"{product['Product_Name'].split()[0]}-{product['SKU_Code']}-{product['Batch_Number']}-{row['UID']}"
+        )
+        return row
+
+    return df.apply(enrich, axis=1)
+
+
+class ColumnarEnrichmentMatchesLegacy(SimpleTestCase):
+    """enrich_orders() must give the same frame (values and dtypes) as the original row-wise apply."""
+
+    def setUp(self):
+        self.master = product_master(40, seed=1)
+        self.features = build_product_features(normalize_master_columns(self.master.copy()))
+
+    def check(self, df):
+        expected = legacy_enrich(df.copy(), self.master)
+        got = enrich_orders(df, self.features)
+        pd.testing.assert_frame_equal(got, expected)
+
+    def test_clean_batches(self):
+        for seed in range(2):
+            with self.subTest(seed=seed):
+                self.check(order_batch(self.master, 200, seed))
+
+    def test_messy_dates(self):
+        for seed in range(2):
+            with self.subTest(seed=seed):
+                self.check(order_batch(self.master, 200, seed, messy=True))
+
+    def test_unknown_product(self):
+        df = order_batch(self.master, 5, 0)
+        df.loc[2, "Product_ID"] = "NOPE"
+        with self.assertRaisesRegex(ValueError, "Product_ID: NOPE"):
+            enrich_orders(df, self.features)
+
+
+class OrderValidationTests(SimpleTestCase):
+    def test_duplicate_master_ids_are_named(self):
+        master = normalize_master_columns(product_master(6, seed=2))
+        master.loc[4, "Product_ID"] = master.loc[1, "Product_ID"]
+        with self.assertRaisesRegex(ValueError, r"Duplicate Product_ID values in the product master: \['P-0001'\]"):
+            build_product_features(master)
+
+    def test_data_endpoint_requires_unit_and_handling_columns(self):
+        orders = order_batch(product_master(5, seed=0), 3, 0)
+        for col in ["Unit_Weight_(kg)", "Unit_Volume_(L)", "Fragile_Flag", "Temp_Sensitive_Flag"]:
+            with self.subTest(column=col):
+                df = orders.drop(columns=[col])
+                payload = {"columns": df.columns.tolist(), "data": df.astype(object).values.tolist()}
+                with contextlib.redirect_stdout(io.StringIO()):
+                    response = self.client.post("/api/data/", json.dumps(payload), content_type="application/json")
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(col, response.json()["error"])
@@ -0,0 +1,218 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from core.dispatch import KNN_MODEL_PATH, PRIORITY_MODEL_PATH, SCALER_PATH, planning_order, request_fleet
+from core.plan_sessions import ROW_COLUMNS, PlanSessionStore, SessionConflict, SessionNotFound
+from core.tests.test_low_memory import dispatch_payload
+from core.tests.test_result_store import TempResultStoreMixin
+from core.vehicle_assignment import classify_load_type
+
+
+def scored_orders(n, seed, heavy=False):
+    """An order batch as score_and_cluster() leaves it: the stored row columns plus load type, score and cluster."""
+    rng = np.random.default_rng(seed)
+    fragile, temp = rng.integers(0, 2, n), rng.integers(0, 2, n)
+    df = pd.DataFrame({
+        "Product_ID": [f"P{seed}-{i}" for i in range(n)],
+        "Product_Name": "Name",
+        "Product_Category": "Cat",
+        "Quantity_Dispatched": rng.integers(1, 50, n),
+        "Total_Weight": np.round(rng.uniform(50, 900 if heavy else 400, n), 2),
+        "Total_Volume": np.round(rng.uniform(50, 2500 if heavy else 1000, n), 2),
+        "ML_Priority_Score": rng.random(n),
+        "Cluster": rng.integers(0, 4, n),
+    })
+    df["Load_Type"] = classify_load_type(pd.Series(fragile), pd.Series(temp))
+    return df
+
+
+class PlanSessionStoreTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = PlanSessionStore(os.path.join(tmp.name, "results.sqlite3"), ttl_seconds=3600, max_sessions=3)
+        self.session_id = self.store.create(request_fleet({"per_type": 2}), "first_fit", "exact")
+
+    def add(self, df, order_ids=None, retry=False):
+        sequence = df.index.get_indexer(planning_order(df))
+        return self.store.add_orders(self.session_id, df, sequence, order_ids, retry)
+
+    def check_accounting(self):
+        """Every vehicle's remaining kg / L and order count match the orders the session has on it."""
+        conn = self.store._connection()
+        orders = pd.read_sql_query(
+            "SELECT order_id, vehicle_idx, weight, volume FROM plan_session_orders WHERE session_id = ?",
+            conn, params=(self.session_id,)
+        )
+        vehicles = pd.read_sql_query(
+            "SELECT idx, capacity_kg, capacity_L, remaining_kg, remaining_L, orders FROM plan_session_vehicles "
+            "WHERE session_id = ? ORDER BY idx", conn, params=(self.session_id,)
+        )
+        on_vehicle = orders[orders["vehicle_idx"] >= 0].groupby("vehicle_idx")
+        loaded_kg = on_vehicle["weight"].sum().reindex(vehicles["idx"], fill_value=0).to_numpy()
+        loaded_L = on_vehicle["volume"].sum().reindex(vehicles["idx"], fill_value=0).to_numpy()
+        counts = on_vehicle.size().reindex(vehicles["idx"], fill_value=0).to_numpy()
+
+        np.testing.assert_allclose(vehicles["remaining_kg"], vehicles["capacity_kg"] - loaded_kg, atol=1e-6)
+        np.testing.assert_allclose(vehicles["remaining_L"], vehicles["capacity_L"] - loaded_L, atol=1e-6)
+        np.testing.assert_array_equal(vehicles["orders"], counts)
+        self.assertTrue((vehicles["remaining_kg"] >= -1e-9).all() and (vehicles["remaining_L"] >= -1e-9).all())
+
+        info = self.store.session(self.session_id)
+        self.assertEqual(info["orders_total"], len(orders))
+        self.assertEqual(info["orders_assigned"], int((orders["vehicle_idx"] >= 0).sum()))
+        return orders
+
+    def test_add_release_cancel_retry_keep_capacity_consistent(self):
+        order_ids, assigned, retried, _, fleet = self.add(scored_orders(60, 0, heavy=True))
+        self.assertEqual(order_ids, [str(i) for i in range(60)])
+        self.assertEqual(retried, 0)
+        self.assertGreater((assigned < 0).sum(), 0, "the fleet should run out of room")
+        orders = self.check_accounting()
+        self.assertEqual(sorted(fleet.vehicle_ids[assigned[assigned >= 0]].tolist()),
+                         sorted(fleet.vehicle_ids[orders.loc[orders["vehicle_idx"] >= 0, "vehicle_idx"]].tolist()))
+
+        placed = [order_ids[i] for i in np.flatnonzero(assigned >= 0)]
+        affected, unknown = self.store.remove_orders(self.session_id, placed[:5] + ["nope"], cancel=False)
+        self.assertEqual((affected, unknown), (5, ["nope"]))
+        orders = self.check_accounting()
+        self.assertTrue((orders.set_index("order_id").loc[placed[:5], "vehicle_idx"] == -1).all())
+
+        affected, _ = self.store.remove_orders(self.session_id, placed[5:10], cancel=True)
+        self.assertEqual(affected, 5)
+        orders = self.check_accounting()
+        self.assertEqual(len(orders), 55)
+        self.assertFalse(set(placed[5:10]) & set(orders["order_id"]))
+
+        # Cancelling an unassigned order frees nothing but still drops it from the totals
+        unplaced = [order_ids[i] for i in np.flatnonzero(assigned < 0)][:2]
+        self.store.remove_orders(self.session_id, unplaced, cancel=True)
+        self.check_accounting()
+
+        waiting = int((self.check_accounting()["vehicle_idx"] < 0).sum())
+        new_ids, new_assigned, retried, retried_assigned, _ = self.add(scored_orders(5, 1))
+        self.assertEqual(new_ids, [str(i) for i in range(60, 65)])
+        self.assertEqual(retried, 0)
+        self.check_accounting()
+
+        _, _, retried, retried_assigned, _ = self.add(scored_orders(3, 2), order_ids=["x1", "x2", "x3"], retry=True)
+        self.assertEqual(retried, waiting + int((new_assigned < 0).sum()))
+        self.assertGreater(retried_assigned, 0, "released capacity should take back some waiting orders")
+        self.check_accounting()
+
+    def test_stored_rows_come_back_in_order(self):
+        df = scored_orders(8, 3)
+        order_ids, assigned, _, _, fleet = self.add(df, order_ids=[f"o{i}" for i in range(8)])
+        rows = self.store.orders(self.session_id, offset=2, limit=3)
+        self.assertEqual([r[0] for r in rows], ["o2", "o3", "o4"])
+        for row, i in zip(rows, range(2, 5)):
+            self.assertEqual(row[1:-2], json.loads(json.dumps(df[ROW_COLUMNS].values.tolist()[i], default=float)))
+            expected = ["Assigned", fleet.vehicle_ids[assigned[i]]] if assigned[i] >= 0 else ["Not_Assigned", None]
+            self.assertEqual(row[-2:], expected)
+
+    def test_duplicate_order_ids_conflict(self):
+        self.add(scored_orders(3, 0), order_ids=["a", "b", "c"])
+        with self.assertRaisesRegex(SessionConflict, "'b'"):
+            self.add(scored_orders(2, 1), order_ids=["b", "d"])
+        # The rejected batch left nothing behind
+        self.assertEqual(len(self.check_accounting()), 3)
+
+    def test_expired_and_unknown_sessions(self):
+        with self.assertRaises(SessionNotFound):
+            self.store.session("nope")
+        expired = self.store.session(self.session_id)["updated"] + 3601
+        with mock.patch("core.plan_sessions.time.time", return_value=expired):
+            with self.assertRaises(SessionNotFound):
+                self.store.session(self.session_id)
+            with self.assertRaises(SessionNotFound):
+                self.add(scored_orders(2, 0))
+            self.assertEqual(self.store.recent(), [])
+        self.assertEqual(self.store.session(self.session_id)["orders_total"], 0)
+
+    def test_prune_drops_expired_and_oldest_sessions(self):
+        start = self.store.session(self.session_id)["updated"]
+        with mock.patch("core.plan_sessions.time.time") as now:
+            now.return_value = start + 10
+            second = self.store.create(request_fleet({"per_type": 1}), "first_fit", "exact")
+            now.return_value += 10
+            third = self.store.create(request_fleet({"per_type": 1}), "first_fit", "exact")
+            now.return_value += 10
+            fourth = self.store.create(request_fleet({"per_type": 1}), "first_fit", "exact")
+            # MAX_SESSIONS 3: the oldest went to make room
+            self.assertEqual({s["session_id"] for s in self.store.recent()}, {second, third, fourth})
+            now.return_value += 3601
+            fifth = self.store.create(request_fleet({"per_type": 1}), "first_fit", "exact")
+        rows = self.store._connection().execute("SELECT id FROM plan_sessions").fetchall()
+        self.assertEqual([r[0] for r in rows], [fifth])
+        self.assertEqual(self.store._connection().execute(
+            "SELECT COUNT(DISTINCT session_id) FROM plan_session_vehicles").fetchone()[0], 1)
+
+
+@unittest.skipUnless(all(os.path.exists(p) for p in (PRIORITY_MODEL_PATH, SCALER_PATH, KNN_MODEL_PATH)),
+                     "dispatch models not present")
+class PlanSessionEndpointTests(TempResultStoreMixin, SimpleTestCase):
+    def call(self, method, url, body=None):
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            if body is None:
+                return getattr(self.client, method)(url)
+            return getattr(self.client, method)(url, json.dumps(body), content_type="application/json")
+
+    def batch(self, n, seed, first_id=0):
+        payload = dispatch_payload(n, seed)
+        payload["columns"] = ["Order_ID"] + payload["columns"]
+        payload["data"] = [[f"o{first_id + i}"] + row for i, row in enumerate(payload["data"])]
+        return payload
+
+    def test_session_lifecycle(self):
+        created = self.call("post", "/api/dispatch/sessions/", {**self.batch(40, 0), "fleet": {"per_type": 1}})
+        self.assertEqual(created.status_code, 201)
+        body = created.json()
+        session_id = body["session_id"]
+        self.assertEqual(body["batch"]["orders"], 40)
+        self.assertEqual(body["fleet"]["orders_assigned"] + body["fleet"]["orders_unassigned"], 40)
+
+        added = self.call("post", f"/api/dispatch/sessions/{session_id}/orders/", self.batch(10, 1, first_id=40))
+        self.assertEqual(added.status_code, 200)
+        duplicate = self.call("post", f"/api/dispatch/sessions/{session_id}/orders/", self.batch(2, 2, first_id=45))
+        self.assertEqual(duplicate.status_code, 409)
+
+        assigned = [row[0] for row in body["data"] if row[-2] == "Assigned"]
+        released = self.call("post", f"/api/dispatch/sessions/{session_id}/release/", {"order_ids": assigned[:3]})
+        self.assertEqual((released.status_code, released.json()["orders"]), (200, 3))
+        cancelled = self.call("post", f"/api/dispatch/sessions/{session_id}/cancel/", {"order_ids": ["o0", "zz"]})
+        self.assertEqual(cancelled.json()["unknown_order_ids"], ["zz"])
+
+        state = self.call("get", f"/api/dispatch/sessions/{session_id}/?limit=20")
+        self.assertEqual(state.status_code, 200)
+        self.assertEqual((state.json()["orders_total"], len(state.json()["data"]), state.json()["next_offset"]),
+                         (49, 20, 20))
+        fleet = state.json()["fleet"]
+        self.assertEqual(fleet["orders_assigned"] + fleet["orders_unassigned"], 49)
+
+        self.assertEqual(self.call("delete", f"/api/dispatch/sessions/{session_id}/").status_code, 200)
+        self.assertEqual(self.call("get", f"/api/dispatch/sessions/{session_id}/").status_code, 404)
+
+    def test_expired_session_is_a_404(self):
+        session_id = self.call("post", "/api/dispatch/sessions/", {}).json()["session_id"]
+        with mock.patch("core.plan_sessions.time.time", return_value=4_000_000_000.0):
+            self.assertEqual(self.call("get", f"/api/dispatch/sessions/{session_id}/").status_code, 404)
+            added = self.call("post", f"/api/dispatch/sessions/{session_id}/orders/", self.batch(2, 0))
+            self.assertEqual(added.status_code, 404)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.call("post", "/api/dispatch/sessions/", {"packing_mode": "nope"}).status_code, 400)
+        session_id = self.call("post", "/api/dispatch/sessions/", {}).json()["session_id"]
+        self.assertEqual(self.call("post", f"/api/dispatch/sessions/{session_id}/release/", {}).status_code, 400)
+        self.assertEqual(self.call("post", f"/api/dispatch/sessions/{session_id}/explode/", {}).status_code, 404)
+        payload = self.batch(2, 0)
+        payload["data"][1][0] = payload["data"][0][0]
+        self.assertEqual(self.call("post", f"/api/dispatch/sessions/{session_id}/orders/", payload).status_code, 400)
@@ -0,0 +1,141 @@
+import contextlib
+import io
+import os
+import pickle
+import tempfile
+import warnings
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.neighbors import KNeighborsClassifier
+
+from core import prediction_cache
+from core.model_registry import ModelRegistry, pickle_loader
+from core.prediction_cache import PredictionCache
+
+
+def training_data(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame({"weight": rng.uniform(0, 50, n).round(1), "volume": rng.uniform(0, 80, n).round(1),
+                      "fragile": rng.integers(0, 2, n).astype(float)})
+    return X, X["weight"] * 2 + X["fragile"] * 10 + rng.normal(size=n)
+
+
+def batch_with_duplicates(X, n, seed):
+    """n rows drawn (with repeats) from X, plus a -0.0 that must key like 0.0."""
+    rows = X.iloc[np.random.default_rng(seed).integers(0, 40, n)].reset_index(drop=True)
+    rows.loc[0, "fragile"] = -0.0
+    return rows
+
+
+class PredictionCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.X, y = training_data()
+        self.path = os.path.join(tmp.name, "model.pkl")
+        self.save(RandomForestRegressor(n_estimators=5, random_state=0).fit(self.X, y))
+
+        self.registry = ModelRegistry(check_interval=0)
+        self.registry.register("memo", self.path, pickle_loader)
+        self.registry.on_load(prediction_cache._on_model_load)
+        patcher = mock.patch.object(prediction_cache, "registry", self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = PredictionCache("memo")
+        patcher = mock.patch.dict(prediction_cache._caches, {"memo": self.cache})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.scored = []
+
+    def save(self, model):
+        with open(self.path, "wb") as f:
+            pickle.dump(model, f)
+
+    def model(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.registry.get("memo")
+
+    def predict(self, model, X):
+        self.scored.append(len(X))
+        return model.predict(X)
+
+    def test_memoized_output_equals_predict(self):
+        model = self.model()
+        batch = batch_with_duplicates(self.X, 500, seed=1)
+        for X in (batch, batch.to_numpy()):
+            with self.subTest(type=type(X).__name__), warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)   # the forest was fitted with feature names
+                np.testing.assert_array_equal(self.cache.predict(model, X, self.predict), model.predict(X))
+        # Only the distinct rows ran, once: the ndarray call was all hits
+        self.assertEqual(self.scored, [len(batch.drop_duplicates())])
+
+    def test_multi_column_outputs(self):
+        X, y = training_data(seed=2)
+        knn = KNeighborsClassifier(3).fit(X.to_numpy(), (y > y.median()).astype(int))
+        with mock.patch.object(self.cache, "_current_version", return_value="knn"):
+            batch = batch_with_duplicates(X, 300, seed=3).to_numpy()
+            got = self.cache.predict(knn, batch, lambda m, X: m.predict_proba(X))
+        np.testing.assert_array_equal(got, knn.predict_proba(batch))
+
+    def test_second_call_hits(self):
+        model = self.model()
+        batch = batch_with_duplicates(self.X, 100, seed=4)
+        first = self.cache.predict(model, batch, self.predict)
+        second = self.cache.predict(model, batch.iloc[::-1].reset_index(drop=True), self.predict)
+        np.testing.assert_array_equal(second, first[::-1])
+        self.assertEqual(len(self.scored), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats["calls"], stats["misses"], stats["hits"]), (2, self.scored[0], self.scored[0]))
+
+    def test_reload_clears(self):
+        model = self.model()
+        batch = batch_with_duplicates(self.X, 50, seed=5)
+        self.cache.predict(model, batch, self.predict)
+        self.assertGreater(self.cache.stats()["entries"], 0)
+
+        X, y = training_data(seed=9)
+        self.save(RandomForestRegressor(n_estimators=3, random_state=1).fit(X, y * 3))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.registry.reload("memo")
+        self.assertEqual(self.cache.stats()["entries"], 0)
+        self.assertEqual(self.cache.stats()["clears"], 1)
+
+        new_model = self.model()
+        np.testing.assert_array_equal(self.cache.predict(new_model, batch, self.predict), new_model.predict(batch))
+        self.assertEqual(len(self.scored), 2)
+
+    def test_unkeyable_calls_bypass(self):
+        model = self.model()
+        batch = batch_with_duplicates(self.X, 30, seed=6)
+        with_nan = batch.copy()
+        with_nan.loc[3, "weight"] = np.nan
+        text = batch.astype(object)
+        text.loc[2, "volume"] = "heavy"
+        stranger = pickle.loads(pickle.dumps(model))
+
+        cases = [(with_nan, model, lambda m, X: np.zeros(len(X))), (text, model, lambda m, X: np.ones(len(X))),
+                 (batch, stranger, self.predict)]
+        for X, m, predict in cases:
+            np.testing.assert_array_equal(self.cache.predict(m, X, predict), predict(m, X))
+        stats = self.cache.stats()
+        self.assertEqual((stats["bypassed_calls"], stats["entries"]), (3, 0))
+
+    def test_eviction_is_lru(self):
+        cache = PredictionCache("memo", max_entries=10)
+        model = self.model()
+        cache.predict(model, self.X.iloc[:8], self.predict)
+        cache.predict(model, self.X.iloc[:2], self.predict)
+        cache.predict(model, self.X.iloc[8:12], self.predict)
+        self.assertEqual((cache.stats()["entries"], cache.stats()["evictions"]), (10, 2))
+        self.scored.clear()
+        cache.predict(model, self.X.iloc[:2], self.predict)
+        self.assertEqual(self.scored, [])
+
+    def test_registry_hook_is_installed(self):
+        from core.model_registry import registry
+        self.assertIn(prediction_cache._on_model_load, registry._listeners)
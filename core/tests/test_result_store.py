@@ -0,0 +1,141 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core import jobs, plan_sessions, result_store
+from core.result_store import STORE_CHUNK_ROWS, ResultStore
+
+SOP_ZONES = ["A1", "B1", "C1", "A2", "B2", "C2", "A3", "B3", "C3"]
+
+
+def reset_stores():
+    """Drop the process-wide stores so the next call opens them from the current settings."""
+    result_store._store = None
+    plan_sessions._store = None
+    jobs._runner = None
+
+
+class TempResultStoreMixin:
+    """Points settings.RESULT_STORE at a temporary file, so endpoint tests never write to var/."""
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store_path = os.path.join(tmp.name, "results.sqlite3")
+        override = override_settings(RESULT_STORE={"PATH": self.store_path})
+        override.enable()
+        self.addCleanup(override.disable)
+        reset_stores()
+        self.addCleanup(reset_stores)
+
+
+class ResultStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def make_store(self, **limits):
+        return ResultStore(os.path.join(self.tmp.name, "results.sqlite3"), **limits)
+
+    def test_put_get_round_trip(self):
+        store = self.make_store()
+        rows = [[i, f"zone-{i % 9}", i * 0.5] for i in range(2 * STORE_CHUNK_ROWS + 17)]
+        result_id = store.put("sop", ["n", "zone", "half"], rows, meta={"updated_capacity": {"A1": 3}})
+        page = store.get(result_id)
+        self.assertEqual(page["data"], rows)
+        self.assertEqual((page["kind"], page["columns"], page["total_rows"]), ("sop", ["n", "zone", "half"], len(rows)))
+        self.assertEqual(page["meta"], {"updated_capacity": {"A1": 3}})
+        self.assertIsNone(page["next_offset"])
+        self.assertIsNone(store.get("nope"))
+
+    def test_pagination(self):
+        store = self.make_store()
+        rows = [[i] for i in range(2500)]
+        result_id = store.put("sop", ["n"], rows)
+
+        # A page spanning a chunk boundary
+        page = store.get(result_id, offset=990, limit=20)
+        self.assertEqual(page["data"], rows[990:1010])
+        self.assertEqual(page["next_offset"], 1010)
+
+        collected, offset = [], 0
+        while offset is not None:
+            page = store.get(result_id, offset=offset, limit=700)
+            collected.extend(page["data"])
+            offset = page["next_offset"]
+        self.assertEqual(collected, rows)
+
+        past_end = store.get(result_id, offset=5000, limit=10)
+        self.assertEqual((past_end["data"], past_end["total_rows"], past_end["next_offset"]), ([], 2500, None))
+
+    def test_ttl_expiry(self):
+        store = self.make_store(ttl_seconds=60)
+        with mock.patch("core.result_store.time.time", return_value=1_000_000.0):
+            result_id = store.put("sop", ["n"], [[1]])
+        with mock.patch("core.result_store.time.time", return_value=1_000_030.0):
+            self.assertIsNotNone(store.get(result_id))
+        with mock.patch("core.result_store.time.time", return_value=1_000_061.0):
+            self.assertIsNone(store.get(result_id))
+        self.assertEqual(store.stats()["entries"], 0)
+
+    def test_lru_eviction_by_count(self):
+        store = self.make_store(max_entries=2)
+        with mock.patch("core.result_store.time.time") as now:
+            now.return_value = 100.0
+            first = store.put("sop", ["n"], [[1]])
+            now.return_value = 101.0
+            second = store.put("sop", ["n"], [[2]])
+            # Reading `first` makes `second` the least recently used
+            now.return_value = 102.0
+            store.get(first)
+            now.return_value = 103.0
+            third = store.put("sop", ["n"], [[3]])
+            self.assertIsNotNone(store.get(first))
+            self.assertIsNone(store.get(second))
+            self.assertIsNotNone(store.get(third))
+
+    def test_size_cap_eviction(self):
+        store = self.make_store(max_bytes=3000)
+        rows = [["x" * 90] for _ in range(10)]   # ~950 bytes per entry
+        ids = []
+        with mock.patch("core.result_store.time.time") as now:
+            for i in range(5):
+                now.return_value = 100.0 + i
+                ids.append(store.put("sop", ["s"], rows))
+            stats = store.stats()
+            self.assertLessEqual(stats["size_bytes"], 3000)
+            self.assertEqual([store.get(i) is not None for i in ids], [False, False, True, True, True])
+
+    def test_newest_entry_is_kept_even_past_the_cap(self):
+        store = self.make_store(max_bytes=10)
+        result_id = store.put("sop", ["s"], [["x" * 100]])
+        self.assertIsNotNone(store.get(result_id))
+
+
+class SopResultEndpointTests(TempResultStoreMixin, SimpleTestCase):
+    def test_get_by_result_id(self):
+        columns = ["urgency", "fragile", "temp", "capacity_required"] + [f"{z}_used" for z in SOP_ZONES]
+        data = [[["Low", "Medium", "High"][i % 3], i % 2, i // 2 % 2, i + 1] + [50] * len(SOP_ZONES)
+                for i in range(30)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            posted = self.client.post("/api/sop/", json.dumps({"columns": columns, "data": data}),
+                                      content_type="application/json")
+            self.assertEqual(posted.status_code, 200)
+            result_id = posted.json()["result_id"]
+
+            page = self.client.get(f"/api/sop/{result_id}/", {"offset": 10, "limit": 5})
+            self.assertEqual(page.status_code, 200)
+            self.assertEqual(page.json()["data"], posted.json()["result"]["data"][10:15])
+            self.assertEqual(page.json()["next_offset"], 15)
+            self.assertEqual(self.client.get("/api/sop/", {"result_id": result_id}).json()["total_rows"], 30)
+
+            self.assertEqual(self.client.get("/api/sop/unknown/").status_code, 404)
+            self.assertEqual(self.client.get("/api/sop/").status_code, 400)
+            self.assertEqual(self.client.get(f"/api/sop/{result_id}/", {"limit": 0}).status_code, 400)
+        self.assertTrue(os.path.exists(self.store_path))
@@ -0,0 +1,162 @@
+import contextlib
+import io
+import itertools
+import json
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from core.ml_handlers.rl_utils import compile_policy, predict_best_zone, process_batch_allocations_qtable
+from core.tests.test_result_store import TempResultStoreMixin
+
+ZONES = ["A1", "B1", "C1", "A2", "B2", "C2", "A3", "B3", "C3"]
+URGENCY = ["Low", "Medium", "High"]
+
+
+def random_policy(seed):
+    rng = np.random.default_rng(seed)
+    states = list(itertools.product(URGENCY, [0, 1], [0, 1]))
+    return {
+        "q_table": rng.normal(size=(len(states), len(ZONES))),
+        "state_to_index": {state: i for i, state in enumerate(states)},
+        "actions": list(ZONES),
+    }
+
+
+def random_requests(n, seed):
+    rng = np.random.default_rng(seed)
+    return [
+        {"urgency": str(u), "fragile": int(f), "temp": int(t), "capacity_required": int(d)}
+        for u, f, t, d in zip(rng.choice(URGENCY, n), rng.integers(0, 2, n), rng.integers(0, 2, n),
+                              rng.integers(0, 30, n))
+    ]
+
+
+def legacy_allocate(requests, model, capacity_map):
+    """The original per-request loop, kept as the reference."""
+    log = []
+    cap = capacity_map.copy()
+    for i, req in enumerate(requests):
+        try:
+            state = (req.get("urgency", "Medium"), int(req.get("fragile", 0)), int(req.get("temp", 0)))
+            demand = int(req.get("capacity_required", 0))
+            zone_key = predict_best_zone(state, model)
+            available = cap.get(zone_key, 0)
+            stored = min(available, demand)
+            remaining = max(0, demand - available)
+            cap[zone_key] = max(0, available - stored)
+            log.append({
+                "urgency": state[0], "fragile": state[1], "temp": state[2], "capacity_required": demand,
+                "Assigned_Zone": zone_key, "Stored": stored, "Remaining_Unallocated": remaining,
+            })
+        except Exception as e:
+            log.append({
+                "urgency": req.get("urgency"), "fragile": req.get("fragile"), "temp": req.get("temp"),
+                "capacity_required": req.get("capacity_required"), "Assigned_Zone": "ERROR", "Stored": 0,
+                "Remaining_Unallocated": req.get("capacity_required"), "error": str(e),
+            })
+    return pd.DataFrame(log), cap
+
+
+class VectorizedAllocationMatchesLegacy(SimpleTestCase):
+    """process_batch_allocations_qtable() must reproduce the original per-request loop exactly."""
+
+    def check(self, requests, capacity, seed=0):
+        model = random_policy(seed)
+        expected, expected_cap = legacy_allocate(requests, model, capacity)
+        with contextlib.redirect_stdout(io.StringIO()):
+            got, got_cap = process_batch_allocations_qtable(
+                pd.DataFrame(requests, dtype=object), compile_policy(model), capacity
+            )
+        pd.testing.assert_frame_equal(got, expected)
+        self.assertEqual(
+            [type(v) for v in got.to_numpy().ravel()], [type(v) for v in expected.to_numpy().ravel()]
+        )
+        self.assertEqual(got_cap, expected_cap)
+
+    def test_clean_batches(self):
+        for seed in range(4):
+            with self.subTest(seed=seed):
+                rng = np.random.default_rng(seed)
+                capacity = {z: int(c) for z, c in zip(ZONES, rng.integers(0, 200, len(ZONES)))}
+                self.check(random_requests(500, seed), capacity, seed)
+
+    def test_bad_rows(self):
+        requests = random_requests(200, 9)
+        requests[3]["urgency"] = "Urgent"
+        requests[5]["fragile"] = None
+        requests[7]["temp"] = "1"
+        requests[9]["capacity_required"] = "abc"
+        requests[13]["fragile"] = True
+        requests[15]["capacity_required"] = 5.7
+        requests[17]["urgency"] = None
+        self.check(requests, {z: 100 for z in ZONES})
+
+    def test_negative_demand_and_capacity(self):
+        requests = random_requests(200, 10)
+        requests[4]["capacity_required"] = -5
+        self.check(requests, {z: 100 for z in ZONES})
+        self.check(random_requests(200, 11), {z: -50 for z in ZONES})
+
+    def test_missing_columns_use_defaults(self):
+        requests = [{"capacity_required": d} for d in range(1, 40)]
+        self.check(requests, {z: 60 for z in ZONES})
+
+
+class SpilloverTests(SimpleTestCase):
+    def allocate(self, requests, capacity, spillover, seed=0):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return process_batch_allocations_qtable(
+                pd.DataFrame(requests, dtype=object), compile_policy(random_policy(seed)), capacity, spillover
+            )
+
+    def test_spillover_conserves_units(self):
+        for seed in range(3):
+            with self.subTest(seed=seed):
+                capacity = {z: 40 for z in ZONES}
+                requests = random_requests(300, seed)
+                plain, _ = self.allocate(requests, capacity, False, seed)
+                log, cap = self.allocate(requests, capacity, True, seed)
+
+                # Assigned_Zone is the greedy zone either way
+                self.assertEqual(log["Assigned_Zone"].tolist(), plain["Assigned_Zone"].tolist())
+                np.testing.assert_array_equal(log["Stored"] + log["Remaining_Unallocated"], log["capacity_required"])
+                self.assertEqual([sum(split.values()) for split in log["Zone_Split"]], log["Stored"].tolist())
+                self.assertGreaterEqual(log["Stored"].sum(), plain["Stored"].sum())
+                for zone in ZONES:
+                    placed = sum(split.get(zone, 0) for split in log["Zone_Split"])
+                    self.assertEqual(cap[zone], capacity[zone] - placed)
+                # Nothing is left unallocated while some zone still has room
+                if log["Remaining_Unallocated"].sum():
+                    self.assertEqual(sum(cap.values()), 0)
+
+    def test_without_spillover_there_is_no_split_column(self):
+        log, _ = self.allocate(random_requests(20, 0), {z: 5 for z in ZONES}, False)
+        self.assertNotIn("Zone_Split", log.columns)
+
+
+class SopEndpointSpilloverTests(TempResultStoreMixin, SimpleTestCase):
+    def post(self, **extra):
+        columns = ["urgency", "fragile", "temp", "capacity_required"] + [f"{z}_used" for z in ZONES]
+        data = [[r["urgency"], r["fragile"], r["temp"], r["capacity_required"]] + [90] * len(ZONES)
+                for r in random_requests(60, 4)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = self.client.post("/api/sop/", json.dumps({"columns": columns, "data": data, **extra}),
+                                        content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_spillover_is_opt_in(self):
+        body = self.post()
+        self.assertEqual(body["spillover"], {"enabled": False})
+        self.assertNotIn("Zone_Split", body["result"]["columns"])
+
+        body = self.post(spillover=True)
+        self.assertTrue(body["spillover"]["enabled"])
+        self.assertIn("Zone_Split", body["result"]["columns"])
+
+    def test_setting_turns_it_on(self):
+        with self.settings(SOP_SPILLOVER=True):
+            self.assertTrue(self.post()["spillover"]["enabled"])
+            self.assertEqual(self.post(spillover=False)["spillover"], {"enabled": False})
@@ -0,0 +1,126 @@
+import contextlib
+import io
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+from sklearn.preprocessing import LabelEncoder
+from sklearn.tree import DecisionTreeClassifier
+
+from core.file_handler import build_product_features, normalize_master_columns, prepare_orders
+from core.ml_utils import FEATURE_COLUMNS, predict_priority
+from core.streaming import read_csv_chunks, stream_predictions
+from core.tests.test_order_enrichment import order_batch, product_master
+
+
+def quiet():
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def parse(stream):
+    return [json.loads(line) for line in "".join(stream).splitlines()]
+
+
+def priority_model(features, master):
+    """A small tree on enriched orders, with the Low / Medium / High encoder the API expects."""
+    with quiet():
+        X = prepare_orders(order_batch(master, 300, seed=9), features)[FEATURE_COLUMNS]
+    encoder = LabelEncoder().fit(["High", "Low", "Medium"])
+    labels = np.where(X["Urgent_Order_Flag"] == 1, "High", np.where(X["Delivery_Window_Days"] > 4, "Low", "Medium"))
+    return DecisionTreeClassifier(max_depth=3, random_state=0).fit(X, encoder.transform(labels)), encoder
+
+
+class PriorityFixture:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.master = product_master(40, seed=1)
+        cls.features = build_product_features(normalize_master_columns(cls.master.copy()))
+        cls.model, cls.encoder = priority_model(cls.features, cls.master)
+
+    def expected(self, df):
+        with quiet():
+            scored = predict_priority(prepare_orders(df, self.features), self.model, self.encoder)
+        return scored["Predicted_Priority"].tolist()
+
+
+class StreamPredictionsTests(PriorityFixture, SimpleTestCase):
+    def stream(self, df, fmt, chunk_rows=100):
+        chunks = read_csv_chunks(io.BytesIO(df.to_csv(index=False).encode()), chunk_rows)
+        first = next(chunks)
+        with quiet(), contextlib.redirect_stderr(io.StringIO()):
+            return parse(stream_predictions(first, chunks, self.features, self.model, self.encoder, fmt))
+
+    def test_ndjson_rows_between_meta_and_summary(self):
+        orders = order_batch(self.master, 250, seed=2)
+        lines = self.stream(orders, "ndjson")
+        meta, rows, summary = lines[0], lines[1:-1], lines[-1]
+        self.assertEqual(meta, {"__meta__": {"format": "ndjson", "uploaded_columns": orders.columns.tolist()}})
+        self.assertEqual([r["Predicted_Priority"] for r in rows], self.expected(orders))
+        self.assertEqual([r["Quantity_Assigned"] for r in rows], orders["Quantity_Assigned"].tolist())
+        counts = {label: self.expected(orders).count(label) for label in set(self.expected(orders))}
+        self.assertEqual(summary, {"__summary__": {"rows": 250, "chunks": 3, "prediction_counts": counts}})
+
+    def test_columnar_emits_one_line_per_chunk(self):
+        orders = order_batch(self.master, 250, seed=3)
+        lines = self.stream(orders, "columnar")
+        chunks = lines[1:-1]
+        self.assertEqual([(c["chunk"], c["rows"], len(c["data"])) for c in chunks], [(0, 100, 100), (1, 100, 100),
+                                                                                     (2, 50, 50)])
+        column = chunks[0]["columns"].index("Predicted_Priority")
+        self.assertEqual([row[column] for c in chunks for row in c["data"]], self.expected(orders))
+        self.assertEqual(lines[-1]["__summary__"]["rows"], 250)
+
+    def test_failing_chunk_ends_with_an_error_line(self):
+        orders = order_batch(self.master, 250, seed=4)
+        orders.loc[150, "Product_ID"] = "NOPE"
+        lines = self.stream(orders, "ndjson")
+        self.assertIn("__meta__", lines[0])
+        self.assertEqual(len(lines), 1 + 100 + 1)
+        error = lines[-1]["__error__"]
+        self.assertEqual((error["chunk"], error["rows_streamed"]), (1, 100))
+        self.assertIn("NOPE", error["error"])
+        self.assertFalse(any("__summary__" in line for line in lines))
+
+    def test_missing_column_in_a_later_chunk(self):
+        orders = order_batch(self.master, 150, seed=5)
+        chunks = iter([orders.iloc[100:].drop(columns=["Quantity_Assigned"])])
+        with quiet(), contextlib.redirect_stderr(io.StringIO()):
+            lines = parse(stream_predictions(orders.iloc[:100], chunks, self.features, self.model, self.encoder,
+                                             "columnar"))
+        self.assertEqual(lines[1]["rows"], 100)
+        self.assertEqual(lines[-1]["__error__"]["chunk"], 1)
+        self.assertIn("Quantity_Assigned", lines[-1]["__error__"]["error"])
+
+
+class StreamEndpointTests(PriorityFixture, SimpleTestCase):
+    def post(self, orders, query):
+        upload = SimpleUploadedFile("orders.csv", orders.to_csv(index=False).encode(), content_type="text/csv")
+        snapshot = SimpleNamespace(features=self.features)
+        with quiet(), contextlib.redirect_stderr(io.StringIO()), \
+                mock.patch("core.views.product_master", SimpleNamespace(snapshot=lambda: snapshot)), \
+                mock.patch("core.views.load_priority_model_and_encoder", return_value=(self.model, self.encoder)):
+            response = self.client.post(f"/api/data/?{query}", {"file": upload})
+            body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_upload_streams_ndjson(self):
+        orders = order_batch(self.master, 120, seed=6)
+        response, body = self.post(orders, "stream=ndjson&chunk_size=50")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = parse([body.decode()])
+        self.assertEqual(lines[-1]["__summary__"]["chunks"], 3)
+        self.assertEqual([r["Predicted_Priority"] for r in lines[1:-1]], self.expected(orders))
+
+    def test_bad_requests_are_refused_before_streaming(self):
+        orders = order_batch(self.master, 10, seed=7)
+        for query, frame in (("stream=xml", orders), ("stream=ndjson&chunk_size=0", orders),
+                             ("stream=ndjson", orders.drop(columns=["Quantity_Assigned"]))):
+            with self.subTest(query=query):
+                response, body = self.post(frame, query)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("error", json.loads(body))
@@ -0,0 +1,67 @@
+import contextlib
+import io
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestClassifier, RandomForestRegressor
+from sklearn.tree import DecisionTreeRegressor
+
+from core.tree_compiler import COMPILED_MAX_ROWS, CompiledForest, compile_model
+
+
+def training_data(seed, n=400, n_features=5):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, n_features))
+    y = X[:, 0] * 3 - X[:, 1] ** 2 + rng.normal(scale=0.3, size=n)
+    return X, y
+
+
+class CompiledForestMatchesSklearn(SimpleTestCase):
+    """Compiled predictions must be bit-identical to the sklearn estimator they came from."""
+
+    def compiled(self, model):
+        with contextlib.redirect_stdout(io.StringIO()):
+            compiled = compile_model(model)
+        self.assertIsInstance(compiled, CompiledForest)
+        return compiled
+
+    def check(self, model, X):
+        compiled = self.compiled(model)
+        np.testing.assert_array_equal(compiled.predict(X), model.predict(X))
+        if hasattr(model, "predict_proba"):
+            np.testing.assert_array_equal(compiled.predict_proba(X), model.predict_proba(X))
+
+    def test_regressors(self):
+        X, y = training_data(0)
+        rows = np.random.default_rng(1).normal(size=(300, X.shape[1]))
+        for model in (RandomForestRegressor(n_estimators=40, random_state=0),
+                      ExtraTreesRegressor(n_estimators=25, max_depth=6, random_state=0),
+                      DecisionTreeRegressor(random_state=0)):
+            with self.subTest(model=type(model).__name__):
+                self.check(model.fit(X, y), rows)
+
+    def test_classifier(self):
+        X, y = training_data(2)
+        labels = np.digitize(y, [-1.0, 1.0])
+        model = RandomForestClassifier(n_estimators=30, random_state=0).fit(X, labels)
+        self.check(model, np.random.default_rng(3).normal(size=(300, X.shape[1])))
+
+    def test_feature_names_and_fallbacks(self):
+        X, y = training_data(4)
+        frame = pd.DataFrame(X, columns=[f"f{i}" for i in range(X.shape[1])])
+        model = RandomForestRegressor(n_estimators=10, random_state=0).fit(frame, y)
+        compiled = self.compiled(model)
+        self.check(model, frame.iloc[:50])
+        # Too many rows, NaN, or reordered columns go to sklearn unchanged
+        big = pd.DataFrame(np.random.default_rng(5).normal(size=(COMPILED_MAX_ROWS + 1, X.shape[1])),
+                           columns=frame.columns)
+        np.testing.assert_array_equal(compiled.predict(big), model.predict(big))
+        with_nan = frame.iloc[:5].copy()
+        with_nan.iloc[0, 0] = np.nan
+        np.testing.assert_array_equal(compiled.predict(with_nan), model.predict(with_nan))
+        self.assertIsNone(compiled._as_matrix(frame[frame.columns[::-1]]))
+
+    def test_unsupported_models_are_returned_unchanged(self):
+        model = object()
+        self.assertIs(compile_model(model), model)
@@ -0,0 +1,80 @@
+import warnings
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from core.dispatch import base_vehicles, defined_vehicles, planning_order
+from core.vehicle_assignment import (
+    LOAD_TYPES, assign_vehicles, assign_vehicles_iterrows, build_vehicle_pool, classify_load_type
+)
+
+CONFIGURED_FLEET = [
+    {"Vehicle_Type": "Van", "Capacity_kg": 300, "Capacity_L": 900, "Vehicle_Property": "General", "count": 7},
+    {"Vehicle_Type": "Reefer", "Capacity_kg": 800, "Capacity_L": 1800, "Vehicle_Property": "Specialised", "count": 3},
+    {"Vehicle_Type": "Truck", "Capacity_kg": 2500, "Capacity_L": 5000, "Vehicle_Property": "General", "count": 2},
+    {"Vehicle_Type": "Cold_Truck", "Capacity_kg": 1500, "Capacity_L": 7000, "Vehicle_Property": "Specialised", "count": 2},
+]
+
+
+def random_orders(n, seed):
+    """A planned batch with every load type, orders small and large enough to fill (and overflow) the fleet."""
+    rng = np.random.default_rng(seed)
+    fragile = rng.integers(0, 2, n)
+    temp = rng.integers(0, 2, n)
+    df = pd.DataFrame({
+        "Total_Weight": np.round(rng.gamma(2.0, 60.0, n), 2),
+        "Total_Volume": np.round(rng.gamma(2.0, 150.0, n), 2),
+        "Cluster": rng.integers(0, 4, n),
+        "ML_Priority_Score": np.round(rng.random(n), 3),
+    })
+    df["Load_Type"] = classify_load_type(fragile, temp)
+    df["Assignment_Status"] = "Not_Assigned"
+    df["Assigned_Vehicle_ID"] = None
+    return df
+
+
+class ArrayEngineMatchesLegacyLoop(SimpleTestCase):
+    """assign_vehicles() must reproduce the original iterrows planner exactly."""
+
+    def check(self, vehicles, per_type, n, seed):
+        df = random_orders(n, seed)
+        self.assertTrue(set(df["Load_Type"]) <= set(LOAD_TYPES))
+        order_index = planning_order(df)
+
+        legacy_df = df.copy()
+        with warnings.catch_warnings():
+            # The legacy loop subtracts floats from the pool's integer capacity columns
+            warnings.simplefilter("ignore", FutureWarning)
+            legacy_pool = assign_vehicles_iterrows(
+                legacy_df, legacy_df.loc[order_index], build_vehicle_pool(vehicles, per_type)
+            )
+        new_df = df.copy()
+        fleet = assign_vehicles(new_df, build_vehicle_pool(vehicles, per_type), order_index)
+
+        pd.testing.assert_series_equal(new_df["Assigned_Vehicle_ID"], legacy_df["Assigned_Vehicle_ID"])
+        pd.testing.assert_series_equal(new_df["Assignment_Status"], legacy_df["Assignment_Status"])
+        np.testing.assert_allclose(fleet.remaining_kg, legacy_pool["Remaining_kg"].to_numpy(), rtol=0, atol=1e-9)
+        np.testing.assert_allclose(fleet.remaining_L, legacy_pool["Remaining_L"].to_numpy(), rtol=0, atol=1e-9)
+        np.testing.assert_array_equal(fleet.used, legacy_pool["Used"].to_numpy())
+        # The batch must be big enough that some orders do not fit
+        self.assertIn("Not_Assigned", set(new_df["Assignment_Status"]))
+
+    def test_default_fleet(self):
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                self.check(base_vehicles, defined_vehicles, 400, seed)
+
+    def test_configured_fleet(self):
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                self.check(CONFIGURED_FLEET, 1, 300, seed)
+
+    def test_indexed_first_fit(self):
+        # Large-fleet path (capacity blocks) forced on a small fleet
+        with mock.patch("core.vehicle_assignment.INDEX_MIN_FLEET", 0):
+            for seed in range(3):
+                with self.subTest(seed=seed):
+                    self.check(base_vehicles, defined_vehicles, 400, seed)
+                    self.check(CONFIGURED_FLEET, 1, 300, seed)
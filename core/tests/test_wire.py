@@ -0,0 +1,132 @@
+import contextlib
+import gzip
+import io
+import json
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ParseError
+
+from core.tests.test_result_store import TempResultStoreMixin
+from core.wire import _PREFIX, COLUMNAR_MEDIA_TYPE, MAGIC, FrameData, decode_columnar, encode_columnar
+
+ZONES = ["A1", "B1", "C1", "A2", "B2", "C2", "A3", "B3", "C3"]
+
+
+def with_header(header, body=b""):
+    """Columnar bytes with a hand-written header, for payloads the encoder would never produce."""
+    raw = json.dumps(header).encode()
+    return _PREFIX.pack(MAGIC, len(raw)) + raw + body
+
+
+def mixed_frame(n=50):
+    rng = np.random.default_rng(0)
+    text = pd.Series([f"order-{i} ✓" for i in range(n)], dtype=object)
+    text[::7] = None
+    return pd.DataFrame({
+        "int": rng.integers(-1000, 1000, n),
+        "small": rng.integers(0, 100, n).astype(np.uint8),
+        "float": rng.normal(size=n),
+        "flag": rng.random(n) < 0.5,
+        "when": pd.Timestamp("2025-07-01") + pd.to_timedelta(rng.integers(0, 90, n), unit="D"),
+        "text": text,
+        "mixed": [1, "two", 3.5, None, {"k": 1}] * (n // 5),
+    })
+
+
+class ColumnarRoundTrip(SimpleTestCase):
+    def round_trip(self, payload):
+        return decode_columnar(encode_columnar(payload))
+
+    def test_frame_and_meta_survive(self):
+        frame = mixed_frame()
+        out = self.round_trip({"columns": list(frame.columns), "data": FrameData(frame),
+                               "packing_mode": "best_fit", "fleet": {"depot": "north"}})
+        self.assertEqual(out["packing_mode"], "best_fit")
+        self.assertEqual(out["fleet"], {"depot": "north"})
+        self.assertEqual(out["columns"], list(frame.columns))
+        got = out["data"].frame
+        for name in ["int", "small", "float", "flag", "when"]:
+            with self.subTest(column=name):
+                self.assertEqual(got[name].dtype, frame[name].dtype)
+                np.testing.assert_array_equal(got[name].to_numpy(), frame[name].to_numpy())
+        self.assertEqual(got["text"].tolist(), frame["text"].tolist())
+        self.assertEqual(got["mixed"].tolist(), frame["mixed"].tolist())
+
+    def test_row_lists_match_json(self):
+        rows = [["High", 1, 0, 12.5], ["Low", 0, 1, 3.0]]
+        out = self.round_trip({"columns": ["urgency", "fragile", "temp", "demand"], "data": rows})
+        self.assertEqual(out["data"].tolist(), rows)
+
+    def test_nested_table_and_meta_only(self):
+        frame = pd.DataFrame({"zone": ["A1", "B2"], "stored": [3, 4]})
+        out = self.round_trip({"rows": 2, "result": {"columns": ["zone", "stored"], "data": FrameData(frame),
+                                                     "capacity": {"A1": 7}}})
+        self.assertEqual(out["rows"], 2)
+        self.assertEqual(out["result"]["capacity"], {"A1": 7})
+        self.assertEqual(out["result"]["data"].tolist(), frame.values.tolist())
+        self.assertEqual(self.round_trip({"status": "queued", "job_id": "abc"}), {"status": "queued", "job_id": "abc"})
+
+    def test_empty_table(self):
+        frame = pd.DataFrame({"a": pd.Series([], dtype=np.int64), "b": pd.Series([], dtype=object)})
+        out = self.round_trip({"columns": ["a", "b"], "data": FrameData(frame)})
+        self.assertEqual(len(out["data"]), 0)
+        self.assertEqual(out["columns"], ["a", "b"])
+
+    def test_malformed_payloads(self):
+        blob = encode_columnar({"columns": ["a"], "data": FrameData(pd.DataFrame({"a": [1, 2, 3]}))})
+        for bad in (b"", b"garbage!", blob[:-8]):
+            with self.subTest(bad=bad[:12]):
+                with self.assertRaises(ParseError):
+                    decode_columnar(bad)
+
+    def test_malformed_headers(self):
+        column = {"name": "a", "type": "<i8", "buffers": [[0, 8]]}
+        cases = {
+            "not an object": [1, 2],
+            "negative rows": {"rows": -1, "columns": [column]},
+            "columns not a list": {"rows": 1, "columns": {"a": column}},
+            "spec not an object": {"rows": 1, "columns": ["a"]},
+            "spec without name": {"rows": 1, "columns": [{"type": "<i8", "buffers": [[0, 8]]}]},
+            "spec without type": {"rows": 1, "columns": [{"name": "a", "buffers": [[0, 8]]}]},
+            "spec without buffers": {"rows": 1, "columns": [{"name": "a", "type": "<i8"}]},
+        }
+        for case, header in cases.items():
+            with self.subTest(case=case):
+                with self.assertRaises(ParseError):
+                    decode_columnar(with_header(header, bytes(8)))
+        out = decode_columnar(with_header({"rows": 1, "columns": [column], "table": []}, bytes(8)))
+        self.assertEqual(out["data"].tolist(), [[0]])
+
+
+class ColumnarEndpoint(TempResultStoreMixin, SimpleTestCase):
+    def payload(self, n=120):
+        rng = np.random.default_rng(1)
+        columns = ["urgency", "fragile", "temp", "capacity_required"] + [f"{z}_used" for z in ZONES]
+        used = rng.integers(0, 60, len(ZONES)).tolist()
+        data = [[str(u), int(f), int(t), int(d)] + used for u, f, t, d in zip(
+            rng.choice(["Low", "Medium", "High"], n), rng.integers(0, 2, n), rng.integers(0, 2, n),
+            rng.integers(1, 40, n))]
+        return {"columns": columns, "data": data}
+
+    def test_sop_columnar_matches_json(self):
+        payload = self.payload()
+        frame = pd.DataFrame(payload["data"], columns=payload["columns"])
+        body = encode_columnar({"columns": payload["columns"], "data": FrameData(frame)})
+        with contextlib.redirect_stdout(io.StringIO()):
+            plain = self.client.post("/api/sop/", json.dumps(payload), content_type="application/json")
+            columnar = self.client.post("/api/sop/", gzip.compress(body), content_type=COLUMNAR_MEDIA_TYPE,
+                                        HTTP_CONTENT_ENCODING="gzip", HTTP_ACCEPT=COLUMNAR_MEDIA_TYPE)
+        self.assertEqual(plain.status_code, 200)
+        self.assertEqual(columnar.status_code, 200)
+        self.assertEqual(columnar["Content-Type"], COLUMNAR_MEDIA_TYPE)
+        expected, got = plain.json(), decode_columnar(columnar.content)
+        self.assertEqual(got["result"]["data"].tolist(), expected["result"]["data"])
+        self.assertEqual(got["result"]["columns"], expected["result"]["columns"])
+
+    def test_bad_columnar_body_is_a_400(self):
+        for body in (b"garbage", with_header({"rows": -5, "columns": []}), with_header({"rows": 1, "columns": [{}]})):
+            with self.subTest(body=body[8:40]):
+                response = self.client.post("/api/sop/", body, content_type=COLUMNAR_MEDIA_TYPE)
+                self.assertEqual(response.status_code, 400)
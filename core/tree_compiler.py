@@ -0,0 +1,180 @@
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import ExtraTreesClassifier, ExtraTreesRegressor, RandomForestClassifier, RandomForestRegressor
+from sklearn.tree import DecisionTreeClassifier, DecisionTreeRegressor
+
+# 🌲 Estimators the compiler understands; anything else is served as-is
+FOREST_TYPES = (RandomForestRegressor, RandomForestClassifier, ExtraTreesRegressor, ExtraTreesClassifier)
+TREE_TYPES = (DecisionTreeRegressor, DecisionTreeClassifier)
+
+# Measured crossover: above this many rows sklearn's Cython traversal is
+# faster than the NumPy walk, so large batches go to the original model
+COMPILED_MAX_ROWS = 2000
+
+# Synthetic rows used to check a compiled model against the original at load time
+CHECK_ROWS = 512
+
+
+class CompiledForest:
+    """
+    A fitted sklearn tree ensemble flattened into NumPy node arrays
+    (feature, threshold, left, right, value) for all trees at once.
+
+    predict() walks every tree for a whole batch with one gather per depth
+    level. Leaves point back to themselves, so a fixed number of steps
+    (the deepest tree's depth) lands every row on its leaf. Inputs go
+    through float32 and tree outputs are summed in estimator order, as
+    sklearn does, so predictions match the original model bit for bit.
+
+    Batches above COMPILED_MAX_ROWS and anything the walk cannot handle
+    (NaN/inf, unexpected columns) go to the original estimator, which also
+    answers every attribute this class does not define.
+    """
+
+    def __init__(self, model):
+        self.original = model
+        self.is_forest = isinstance(model, FOREST_TYPES)
+        trees = list(model.estimators_) if self.is_forest else [model]
+        self.is_classifier = hasattr(model, "classes_")
+        self.n_trees = len(trees)
+        self.n_features = model.n_features_in_
+        self.feature_names = list(getattr(model, "feature_names_in_", [])) or None
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        self.max_depth = 0
+        for tree in trees:
+            t = tree.tree_
+            nodes = np.arange(t.node_count)
+            leaf = t.children_left == -1
+            roots.append(offset)
+            features.append(np.where(leaf, 0, t.feature))
+            thresholds.append(np.where(leaf, 0.0, t.threshold))
+            lefts.append(np.where(leaf, nodes, t.children_left) + offset)
+            rights.append(np.where(leaf, nodes, t.children_right) + offset)
+            values.append(self._node_values(t))
+            offset += t.node_count
+            self.max_depth = max(self.max_depth, t.max_depth)
+
+        self.roots = np.array(roots, dtype=np.intp)
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds).astype(np.float64)
+        self.left = np.concatenate(lefts).astype(np.intp)
+        self.right = np.concatenate(rights).astype(np.intp)
+        # children[2 * node + goes_right] -> next node, one gather per level
+        self.children = np.stack([self.left, self.right], axis=1).ravel()
+        self.value = np.concatenate(values)
+        self.n_nodes = offset
+
+    def _node_values(self, t):
+        value = t.value[:, 0, :]
+        if not self.is_classifier:
+            return value[:, 0].astype(np.float64)
+        # Per-tree class probabilities, normalised as DecisionTreeClassifier.predict_proba does
+        value = value[:, :len(self.original.classes_)].astype(np.float64)
+        normalizer = value.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        return value / normalizer
+
+    def __getattr__(self, name):
+        # Only reached for missing attributes; guard "original" itself so unpickling can run
+        if name == "original" or name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.original, name)
+
+    def _as_matrix(self, X):
+        """Feature matrix as float64 holding float32 values, or None if it needs the original model."""
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names is None or list(X.columns) != self.feature_names:
+                return None
+        try:
+            X = np.asarray(X, dtype=np.float32)
+        except (TypeError, ValueError):
+            return None
+        if X.ndim != 2 or X.shape[1] != self.n_features or not np.isfinite(X).all():
+            return None
+        return X.astype(np.float64)
+
+    def apply(self, X):
+        """Leaf node (global index) reached in every tree: shape (n_trees, n_rows)."""
+        n = len(X)
+        flat = np.ascontiguousarray(X).ravel()
+        row_base = np.arange(n, dtype=np.intp) * self.n_features
+        nodes = np.repeat(self.roots[:, np.newaxis], n, axis=1)
+        for _ in range(self.max_depth):
+            goes_right = flat[row_base + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[2 * nodes + goes_right]
+        return nodes
+
+    def _accumulate(self, X):
+        """Sum of per-tree outputs in estimator order, then the forest average."""
+        leaves = self.apply(X)
+        # One tree at a time, as sklearn adds them: the same rounding, without
+        # an (n_trees, rows, outputs) array of per-tree values
+        total = self.value[leaves[0]].copy()
+        for tree_leaves in leaves[1:]:
+            total += self.value[tree_leaves]
+        if self.is_forest:
+            total /= self.n_trees
+        return total
+
+    def _as_small_matrix(self, X):
+        if len(X) == 0 or len(X) > COMPILED_MAX_ROWS:
+            return None
+        return self._as_matrix(X)
+
+    def predict_proba(self, X):
+        matrix = self._as_small_matrix(X)
+        if matrix is None or not self.is_classifier:
+            return self.original.predict_proba(X)
+        return self._accumulate(matrix)
+
+    def predict(self, X):
+        matrix = self._as_small_matrix(X)
+        if matrix is None:
+            return self.original.predict(X)
+        out = self._accumulate(matrix)
+        if self.is_classifier:
+            return self.original.classes_.take(np.argmax(out, axis=1), axis=0)
+        return out
+
+    def check_rows(self, n=CHECK_ROWS, seed=0):
+        """Synthetic rows around the split thresholds, so every branch side gets exercised."""
+        rng = np.random.default_rng(seed)
+        X = np.zeros((n, self.n_features))
+        for f in range(self.n_features):
+            splits = self.threshold[(self.feature == f) & (self.left != np.arange(self.n_nodes))]
+            if len(splits) == 0:
+                continue
+            X[:, f] = rng.choice(splits, n) + rng.choice([-0.5, 0.5], n) * rng.random(n)
+        if self.feature_names is not None:
+            return pd.DataFrame(X, columns=self.feature_names)
+        return X
+
+
+def compile_model(model):
+    """
+    CompiledForest for supported single-output tree models, otherwise the
+    model unchanged. The compiled copy is checked against the original on
+    synthetic rows and dropped if they disagree.
+    """
+    if not isinstance(model, FOREST_TYPES + TREE_TYPES) or getattr(model, "n_outputs_", 1) != 1:
+        return model
+    try:
+        compiled = CompiledForest(model)
+        X = compiled.check_rows()
+        if not np.array_equal(compiled.predict(X), model.predict(X)):
+            print(f"[WARN] ⚠️ Compiled {type(model).__name__} disagrees with sklearn; serving the original")
+            return model
+    except Exception as e:
+        print(f"[WARN] ⚠️ Could not compile {type(model).__name__}: {e}; serving the original")
+        return model
+    print(f"[OK] 🌲 Compiled {type(model).__name__}: {compiled.n_trees} trees, {compiled.n_nodes} nodes, depth {compiled.max_depth}")
+    return compiled
+
+
+def compiled_loader(loader):
+    """Registry loader that compiles whatever `loader` returns."""
+    def load(path):
+        return compile_model(loader(path))
+    return load
@@ -1,14 +1,28 @@
 from django.urls import path
-from .views import PredictView, UploadMasterView, index, TestJSONView, SOPView
+from .views import (
+    PredictView, UploadMasterView, index, TestJSONView, SOPView, ModelRegistryView, JobsView,
+    MasterView, MasterChangesView, MasterRowsView
+)
 from .dispatch import DispatchPlannerView  # ✅ import it
+from .plan_sessions import DispatchSessionsView, DispatchSessionView, DispatchSessionOrdersView
 
 urlpatterns = [
     path('', index, name='home'),
     path('predict/', PredictView.as_view(), name='predict'),
     path('sop/', SOPView.as_view(), name='sop'),
+    path('sop/<str:result_id>/', SOPView.as_view(), name='sop_result'),
     path('upload-master/', UploadMasterView.as_view(), name='upload_master'),
+    path('master/', MasterView.as_view(), name='master'),
+    path('master/changes/', MasterChangesView.as_view(), name='master_changes'),
+    path('master/<str:action>/', MasterRowsView.as_view(), name='master_rows'),
     path('data/', TestJSONView.as_view(), name='data_handler'),
+    path('models/', ModelRegistryView.as_view(), name='model_registry'),
+    path('jobs/', JobsView.as_view(), name='jobs'),
+    path('jobs/<str:job_id>/', JobsView.as_view(), name='job_status'),
     
     # ✅ Your NEW Dispatch route
     path('dispatch/', DispatchPlannerView.as_view(), name='dispatch_planner'),
+    path('dispatch/sessions/', DispatchSessionsView.as_view(), name='dispatch_sessions'),
+    path('dispatch/sessions/<str:session_id>/', DispatchSessionView.as_view(), name='dispatch_session'),
+    path('dispatch/sessions/<str:session_id>/<str:action>/', DispatchSessionOrdersView.as_view(), name='dispatch_session_orders'),
 ]
@@ -0,0 +1,421 @@
+import numpy as np
+import pandas as pd
+from .capacity_index import CapacityBlocks, CapacityTree
+
+# === Load Types ===
+LOAD_TYPES = ["TF", "F", "T", "N"]
+ASSIGNMENT_STATUSES = ["Assigned", "Not_Assigned"]
+SPECIALISED = "Specialised"
+GENERAL = "General"
+
+# === Packing Modes ===
+PACKING_MODES = ["first_fit", "first_fit_decreasing", "best_fit", "best_fit_decreasing"]
+# Below this fleet size one vectorized mask over all vehicles beats the block
+# index for first-fit (measured crossover ~10k vehicles)
+INDEX_MIN_FLEET = 10000
+MAX_FLEET_SIZE = 100000
+
+FLEET_TEMPLATE_KEYS = ["Vehicle_Type", "Capacity_kg", "Capacity_L", "Vehicle_Property"]
+
+
+def build_vehicle_pool(base_vehicles, per_type):
+    """
+    Expand vehicle templates into the pool DataFrame used by the planner.
+    A template may carry its own "count"; otherwise `per_type` is used.
+    """
+    vehicle_pool = []
+    counter = 1
+    for v in base_vehicles:
+        for _ in range(int(v.get("count", per_type))):
+            vehicle_pool.append({
+                "Vehicle_ID": f"{v['Vehicle_Type'].upper()}_{counter:03d}",
+                "Vehicle_Type": v["Vehicle_Type"],
+                "Vehicle_Property": v["Vehicle_Property"],
+                "Capacity_kg": v["Capacity_kg"],
+                "Capacity_L": v["Capacity_L"],
+                "Remaining_kg": v["Capacity_kg"],
+                "Remaining_L": v["Capacity_L"],
+                "Used": 0
+            })
+            counter += 1
+    return pd.DataFrame(vehicle_pool)
+
+
+def fleet_from_spec(spec, default_vehicles, default_per_type, depots=None):
+    """
+    Build the vehicle pool for one request.
+
+    `spec` may be None (default fleet), {"depot": name} to pick a configured
+    depot fleet, or {"vehicles": [...], "per_type": n} with inline templates.
+    Raises ValueError for anything malformed.
+    """
+    depots = depots or {}
+    if spec is None:
+        spec = depots.get("default", {})
+    if not isinstance(spec, dict):
+        raise ValueError("'fleet' must be an object")
+
+    if "depot" in spec:
+        depot = spec["depot"]
+        if depot not in depots:
+            raise ValueError(f"Unknown depot fleet: {depot}")
+        spec = depots[depot]
+
+    vehicles = spec.get("vehicles", default_vehicles)
+    per_type = spec.get("per_type", default_per_type)
+
+    if not isinstance(vehicles, list) or not vehicles:
+        raise ValueError("'fleet.vehicles' must be a non-empty list")
+    try:
+        per_type = int(per_type)
+    except (TypeError, ValueError):
+        raise ValueError("'fleet.per_type' must be an integer")
+
+    total = 0
+    for i, v in enumerate(vehicles):
+        if not isinstance(v, dict):
+            raise ValueError(f"Vehicle template {i} must be an object")
+        missing = [k for k in FLEET_TEMPLATE_KEYS if k not in v]
+        if missing:
+            raise ValueError(f"Vehicle template {i} missing keys: {missing}")
+        if not isinstance(v["Vehicle_Type"], str) or not v["Vehicle_Type"].strip():
+            raise ValueError(f"Vehicle template {i} needs a non-empty string Vehicle_Type")
+        if not isinstance(v["Vehicle_Property"], str):
+            raise ValueError(f"Vehicle template {i} needs a string Vehicle_Property")
+        try:
+            count = int(v.get("count", per_type))
+            capacity_ok = float(v["Capacity_kg"]) > 0 and float(v["Capacity_L"]) > 0
+        except (TypeError, ValueError):
+            raise ValueError(f"Vehicle template {i} has non-numeric capacity or count")
+        if count < 0 or not capacity_ok:
+            raise ValueError(f"Vehicle template {i} needs positive capacities and a non-negative count")
+        total += count
+
+    if total == 0:
+        raise ValueError("Fleet has no vehicles")
+    if total > MAX_FLEET_SIZE:
+        raise ValueError(f"Fleet too large: {total} vehicles (max {MAX_FLEET_SIZE})")
+
+    return build_vehicle_pool(vehicles, per_type)
+
+
+def classify_load_type(fragile_flag, temp_flag):
+    """Vectorized TF / F / T / N tagging from 0/1 flag arrays."""
+    fragile = np.asarray(fragile_flag).astype(bool)
+    temp = np.asarray(temp_flag).astype(bool)
+    return np.select([fragile & temp, fragile, temp], ["TF", "F", "T"], default="N").astype(object)
+
+
+class FleetState:
+    """
+    Array-backed fleet: remaining kg / L and property per vehicle.
+
+    Candidate orders per load type are computed once so each placement is a
+    single vectorized feasibility mask over the fleet.
+    """
+
+    def __init__(self, vehicle_ids, vehicle_types, properties, capacity_kg, capacity_L,
+                 remaining_kg=None, remaining_L=None, used=None):
+        self.vehicle_ids = np.asarray(vehicle_ids, dtype=object)
+        self.vehicle_types = np.asarray(vehicle_types, dtype=object)
+        self.properties = np.asarray(properties, dtype=object)
+        self.capacity_kg = np.asarray(capacity_kg, dtype=np.float64)
+        self.capacity_L = np.asarray(capacity_L, dtype=np.float64)
+        self.remaining_kg = self.capacity_kg.copy() if remaining_kg is None else np.asarray(remaining_kg, dtype=np.float64).copy()
+        self.remaining_L = self.capacity_L.copy() if remaining_L is None else np.asarray(remaining_L, dtype=np.float64).copy()
+        self.used = np.zeros(len(self.vehicle_ids), dtype=np.int8) if used is None else np.asarray(used, dtype=np.int8).copy()
+        self.specialised_mask = self.properties == SPECIALISED
+        self._candidate_orders = None
+
+    @classmethod
+    def from_frame(cls, vehicle_df):
+        return cls(
+            vehicle_df["Vehicle_ID"].to_numpy(),
+            vehicle_df["Vehicle_Type"].to_numpy(),
+            vehicle_df["Vehicle_Property"].to_numpy(),
+            vehicle_df["Capacity_kg"].to_numpy(),
+            vehicle_df["Capacity_L"].to_numpy(),
+            vehicle_df["Remaining_kg"].to_numpy() if "Remaining_kg" in vehicle_df else None,
+            vehicle_df["Remaining_L"].to_numpy() if "Remaining_L" in vehicle_df else None,
+            vehicle_df["Used"].to_numpy() if "Used" in vehicle_df else None,
+        )
+
+    def __len__(self):
+        return len(self.vehicle_ids)
+
+    def to_frame(self):
+        return pd.DataFrame({
+            "Vehicle_ID": self.vehicle_ids,
+            "Vehicle_Type": self.vehicle_types,
+            "Vehicle_Property": self.properties,
+            "Capacity_kg": self.capacity_kg,
+            "Capacity_L": self.capacity_L,
+            "Remaining_kg": self.remaining_kg,
+            "Remaining_L": self.remaining_L,
+            "Used": self.used,
+        })
+
+    @property
+    def candidate_orders(self):
+        """Vehicle scan order per load type, matching the legacy iterrows planner."""
+        if self._candidate_orders is None:
+            pool_order = np.arange(len(self), dtype=np.intp)
+            # F/T orders scanned `vehicle_df.sort_values("Vehicle_Property")`; that sort
+            # is not stable, so reproduce it exactly instead of using a stable argsort.
+            property_order = pd.DataFrame({"Vehicle_Property": self.properties}).sort_values(
+                by="Vehicle_Property", ascending=True
+            ).index.to_numpy(dtype=np.intp)
+            self._candidate_orders = {
+                "TF": pool_order[self.specialised_mask],
+                "F": property_order,
+                "T": property_order,
+                "N": pool_order,
+            }
+        return self._candidate_orders
+
+    def place(self, vehicle_idx, weight, volume):
+        self.remaining_kg[vehicle_idx] -= weight
+        self.remaining_L[vehicle_idx] -= volume
+        self.used[vehicle_idx] = 1
+
+    def first_fit(self, load_type, weight, volume):
+        """Index of the first feasible vehicle for one order, or -1."""
+        candidates = self.candidate_orders.get(load_type, self.candidate_orders["N"])
+        if len(candidates) == 0:
+            return -1
+        feasible = (self.remaining_kg[candidates] >= weight) & (self.remaining_L[candidates] >= volume)
+        k = feasible.argmax()
+        return int(candidates[k]) if feasible[k] else -1
+
+
+class FleetIndex:
+    """
+    Capacity indexes over a FleetState for large fleets.
+
+    first_fit() queries a CapacityBlocks index built on the same scan order
+    the legacy planner used for the load type, so it returns the same vehicle
+    as the full mask scan while touching only ~sqrt(n) entries. best_fit()
+    asks a CapacityTree for the vehicle with the least remaining kg that still
+    fits, preferring non-specialised vehicles for everything except TF loads.
+    """
+
+    def __init__(self, fleet):
+        self.fleet = fleet
+        self._indexes = None
+        self._trees = None
+
+    @property
+    def indexes(self):
+        if self._indexes is None:
+            orders = self.fleet.candidate_orders
+            fleet = self.fleet
+            ft_blocks = CapacityBlocks(orders["F"], fleet.remaining_kg, fleet.remaining_L)
+            self._indexes = {
+                "TF": CapacityBlocks(orders["TF"], fleet.remaining_kg, fleet.remaining_L),
+                "F": ft_blocks,
+                "T": ft_blocks,
+                "N": CapacityBlocks(orders["N"], fleet.remaining_kg, fleet.remaining_L),
+            }
+        return self._indexes
+
+    @property
+    def trees(self):
+        if self._trees is None:
+            fleet = self.fleet
+            all_idx = np.arange(len(fleet))
+            self._trees = {
+                GENERAL: CapacityTree(all_idx[~fleet.specialised_mask], fleet.remaining_kg, fleet.remaining_L),
+                SPECIALISED: CapacityTree(all_idx[fleet.specialised_mask], fleet.remaining_kg, fleet.remaining_L),
+            }
+        return self._trees
+
+    def first_fit(self, load_type, weight, volume):
+        blocks = self.indexes.get(load_type, self.indexes["N"])
+        return blocks.leftmost(weight, volume)
+
+    def best_fit(self, load_type, weight, volume):
+        if load_type == "TF":
+            return self.trees[SPECIALISED].best_fit(weight, volume)
+        j = self.trees[GENERAL].best_fit(weight, volume)
+        if j < 0:
+            j = self.trees[SPECIALISED].best_fit(weight, volume)
+        return j
+
+    def place(self, vehicle_idx, weight, volume):
+        fleet = self.fleet
+        old_kg = float(fleet.remaining_kg[vehicle_idx])
+        fleet.place(vehicle_idx, weight, volume)
+        new_kg = float(fleet.remaining_kg[vehicle_idx])
+        new_L = float(fleet.remaining_L[vehicle_idx])
+
+        if self._indexes is not None:
+            for blocks in {id(b): b for b in self._indexes.values()}.values():
+                if vehicle_idx in blocks:
+                    blocks.update(vehicle_idx, new_kg, new_L)
+        if self._trees is not None:
+            group = SPECIALISED if fleet.specialised_mask[vehicle_idx] else GENERAL
+            self._trees[group].update(vehicle_idx, old_kg, new_kg, new_L)
+
+
+def order_sizes(fleet, weights, volumes):
+    """Scalar size per order for *_decreasing modes: the larger of its kg / L share of the biggest vehicle."""
+    max_kg = fleet.capacity_kg.max() if len(fleet) else 1.0
+    max_L = fleet.capacity_L.max() if len(fleet) else 1.0
+    return np.maximum(np.asarray(weights, dtype=np.float64) / max_kg, np.asarray(volumes, dtype=np.float64) / max_L)
+
+
+def pack(fleet, load_types, weights, volumes, mode="first_fit"):
+    """
+    Place orders (given in planning order) on `fleet` with the chosen packing mode.
+
+    "first_fit" keeps the planning order and is identical to the legacy planner.
+    "*_decreasing" modes re-order by size, largest first (stable within ties).
+    Returns vehicle indices aligned with the input (-1 = not assigned).
+    """
+    if mode not in PACKING_MODES:
+        raise ValueError(f"Unknown packing mode: {mode}")
+
+    load_types = np.asarray(load_types, dtype=object)
+    weights = np.asarray(weights, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+
+    if mode == "first_fit" and len(fleet) < INDEX_MIN_FLEET:
+        return assign_first_fit(fleet, load_types, weights, volumes)
+
+    if mode.endswith("_decreasing"):
+        sequence = np.argsort(-order_sizes(fleet, weights, volumes), kind="stable")
+    else:
+        sequence = np.arange(len(weights))
+
+    index = FleetIndex(fleet)
+    find = index.best_fit if mode.startswith("best_fit") else index.first_fit
+    assigned = np.full(len(weights), -1, dtype=np.intp)
+
+    for i in sequence:
+        w = float(weights[i])
+        v = float(volumes[i])
+        j = find(load_types[i], w, v)
+        if j >= 0:
+            index.place(j, w, v)
+            assigned[i] = j
+    return assigned
+
+
+def summarize_fleet(fleet):
+    """Vehicles used and kg / L utilisation of the used vehicles."""
+    used = fleet.used.astype(bool)
+    loaded_kg = fleet.capacity_kg - fleet.remaining_kg
+    loaded_L = fleet.capacity_L - fleet.remaining_L
+    used_cap_kg = fleet.capacity_kg[used].sum()
+    used_cap_L = fleet.capacity_L[used].sum()
+    used_types = pd.Series(fleet.vehicle_types[used]).value_counts()
+
+    return {
+        "vehicles_total": int(len(fleet)),
+        "vehicles_used": int(used.sum()),
+        "vehicles_used_by_type": {str(k): int(v) for k, v in used_types.items()},
+        "loaded_kg": round(float(loaded_kg.sum()), 3),
+        "loaded_L": round(float(loaded_L.sum()), 3),
+        "kg_utilisation": round(float(loaded_kg[used].sum() / used_cap_kg), 4) if used_cap_kg else 0.0,
+        "L_utilisation": round(float(loaded_L[used].sum() / used_cap_L), 4) if used_cap_L else 0.0,
+        "fleet_kg_utilisation": round(float(loaded_kg.sum() / fleet.capacity_kg.sum()), 4) if len(fleet) else 0.0,
+    }
+
+
+def assign_first_fit(fleet, load_types, weights, volumes):
+    """
+    Greedy first-fit over orders already in planning order.
+
+    Returns an int array of vehicle indices into `fleet` (-1 = not assigned);
+    the fleet's remaining capacities are updated in place.
+    """
+    load_types = np.asarray(load_types, dtype=object)
+    weights = np.asarray(weights, dtype=np.float64)
+    volumes = np.asarray(volumes, dtype=np.float64)
+    assigned = np.full(len(weights), -1, dtype=np.intp)
+
+    for i in range(len(weights)):
+        j = fleet.first_fit(load_types[i], weights[i], volumes[i])
+        if j >= 0:
+            fleet.place(j, weights[i], volumes[i])
+            assigned[i] = j
+    return assigned
+
+
+def assign_vehicles(df, vehicle_df, order_index=None, mode="first_fit"):
+    """
+    Assign vehicles to `df` in `order_index` order (defaults to df order).
+
+    Writes Assigned_Vehicle_ID / Assignment_Status into df and returns the
+    updated fleet as a FleetState.
+    """
+    if order_index is None:
+        order_index = df.index
+    fleet = vehicle_df if isinstance(vehicle_df, FleetState) else FleetState.from_frame(vehicle_df)
+
+    ordered = df.loc[order_index, ["Load_Type", "Total_Weight", "Total_Volume"]]
+    assigned = pack(
+        fleet,
+        ordered["Load_Type"].to_numpy(),
+        ordered["Total_Weight"].to_numpy(),
+        ordered["Total_Volume"].to_numpy(),
+        mode=mode,
+    )
+
+    write_assignment(df, order_index, fleet, assigned)
+    return fleet
+
+
+def write_assignment(df, order_index, fleet, assigned):
+    """Assigned_Vehicle_ID / Assignment_Status for the orders in `order_index` from fleet indices (-1 = none)."""
+    if isinstance(df["Assigned_Vehicle_ID"].dtype, pd.CategoricalDtype):
+        _write_assignment_codes(df, order_index, fleet, assigned)
+        return
+    hit = assigned >= 0
+    vehicle_ids = np.full(len(assigned), None, dtype=object)
+    vehicle_ids[hit] = fleet.vehicle_ids[assigned[hit]]
+    status = np.where(hit, "Assigned", "Not_Assigned").astype(object)
+
+    df.loc[order_index, "Assigned_Vehicle_ID"] = vehicle_ids
+    df.loc[order_index, "Assignment_Status"] = status
+
+
+def _write_assignment_codes(df, order_index, fleet, assigned):
+    """Low-memory frames: the fleet indices become the vehicle ID codes directly, no per-order strings."""
+    positions = df.index.get_indexer(order_index)
+    vehicles = df["Assigned_Vehicle_ID"].cat.set_categories(pd.Index(fleet.vehicle_ids, dtype=object))
+    codes = vehicles.cat.codes.to_numpy().astype(np.intp)
+    codes[positions] = assigned
+    status = df["Assignment_Status"].cat.codes.to_numpy().copy()
+    status[positions] = np.where(assigned >= 0, 0, 1)
+
+    df["Assigned_Vehicle_ID"] = pd.Categorical.from_codes(codes, dtype=vehicles.dtype)
+    df["Assignment_Status"] = pd.Categorical.from_codes(status, dtype=df["Assignment_Status"].dtype)
+
+
+def assign_vehicles_iterrows(df, df_sorted, vehicle_df):
+    """
+    Original row-by-row first-fit planner, kept as the reference the array
+    engine is checked against. Mutates df and vehicle_df like the old view did.
+    """
+    for i, order in df_sorted.iterrows():
+        load_type = order["Load_Type"]
+        weight = order["Total_Weight"]
+        volume = order["Total_Volume"]
+
+        if load_type == "TF":
+            candidates = vehicle_df[vehicle_df["Vehicle_Property"] == "Specialised"]
+        elif load_type in ["F", "T"]:
+            candidates = vehicle_df.sort_values(by="Vehicle_Property", ascending=True)
+        else:
+            candidates = vehicle_df.copy()
+
+        for j, vehicle in candidates.iterrows():
+            if vehicle["Remaining_kg"] >= weight and vehicle["Remaining_L"] >= volume:
+                df.at[i, "Assigned_Vehicle_ID"] = vehicle["Vehicle_ID"]
+                df.at[i, "Assignment_Status"] = "Assigned"
+                vehicle_df.at[j, "Remaining_kg"] -= weight
+                vehicle_df.at[j, "Remaining_L"] -= volume
+                vehicle_df.at[j, "Used"] = 1
+                break
+    return vehicle_df
@@ -1,25 +1,38 @@
 from django.shortcuts import render
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 import pandas as pd
 import traceback
-import datetime
 import os
 from .ml_utils import load_priority_model_and_encoder, predict_priority
+from .model_registry import registry
+from .batching import batching_stats
+from .prediction_cache import prediction_cache_stats
+from .metrics import stage
+from .wire import PAYLOAD_PARSERS, as_frame
+from .streaming import STREAM_FORMATS, STREAM_CONTENT_TYPE, parse_chunk_rows, read_csv_chunks, stream_predictions
 
 from .ml_handlers.sop_logic import process_sop_data
-# ✅ Import global result
-from .ml_handlers.sop_logic import process_sop_data, SOP_PROCESSED_RESULT
+from .result_store import get_result_store
+from .jobs import wants_async, submit_job, no_progress, get_job_runner, job_to_dict
 
 
-# Global variable to store the last processed SOP result
-SOP_PROCESSED_RESULT = None
+# 📄 GET /api/sop/<result_id>/ pagination
+DEFAULT_PAGE_ROWS = 1000
+MAX_PAGE_ROWS = 10000
+
+# 📥 /api/upload-master/?mode=: the file is the whole master, or only rows to insert / update
+MASTER_UPLOAD_MODES = ["replace", "upsert"]
 
 
 # Optional if using ML later
 # from .ml_utils import load_model, predict_dispatch
-from .file_handler import process_uploaded_csv, update_master_file
+from .file_handler import (
+    process_uploaded_csv, update_master_file, upsert_master_rows, delete_master_rows, product_master, prepare_orders,
+    REQUIRED_COLUMNS
+)
 
 
 
@@ -31,42 +44,51 @@ def index(request):
 
 
 
-# ✅ SOP HANDLER CLASS supporting POST (submit) and GET (fetch result)
+# ✅ SOP HANDLER CLASS supporting POST (submit) and GET (fetch result by ID)
 class SOPView(APIView):
+    metrics_component = "sop"
 
     def post(self, request):
         """
         This POST route receives SOP data (columns + data) from frontend,
         processes it using the Q-table RL model, and stores the result.
+        The response carries a result_id for fetching it again later.
         """
         payload = request.data
         print("📥 /sop POST request received")
 
+        # ✅ ?async=1 -> allocate in the background, return a job ID to poll
+        if wants_async(request):
+            return submit_job("sop", process_sop_data, payload)
+
         result, code = process_sop_data(payload)
 
         return Response(result, status=code)
 
-    def get(self, request):
+    def get(self, request, result_id=None):
         """
-        This GET route returns the latest processed SOP result.
-        Frontend can call this route after POST to retrieve prediction output.
+        This GET route returns one page of a stored SOP result.
+        Pass the result_id from the POST response (path or ?result_id=),
+        plus optional ?offset= and ?limit= to page through large batches.
         """
-        if SOP_PROCESSED_RESULT:
-            print("📤 /sop GET request served successfully")
-            return Response(SOP_PROCESSED_RESULT, status=200)
-
-        return Response({"error": "No processed result available"}, status=404)
+        result_id = result_id or request.query_params.get("result_id")
+        if not result_id:
+            return Response({"error": "result_id is required"}, status=400)
 
+        try:
+            offset = int(request.query_params.get("offset", 0))
+            limit = int(request.query_params.get("limit", DEFAULT_PAGE_ROWS))
+        except ValueError:
+            return Response({"error": "offset and limit must be integers"}, status=400)
+        if offset < 0 or not 1 <= limit <= MAX_PAGE_ROWS:
+            return Response({"error": f"offset must be >= 0 and limit between 1 and {MAX_PAGE_ROWS}"}, status=400)
 
-# SOP HANDLER 
-class SOPView(APIView):
-    def post(self, request):
-        payload = request.data
-        print("📥 /sop data received")
-
-        result, code = process_sop_data(payload)
-        return Response(result, status=code)
+        page = get_result_store().get(result_id, offset=offset, limit=limit)
+        if page is None:
+            return Response({"error": "No processed result available for this result_id"}, status=404)
 
+        print(f"📤 /sop GET request served: {result_id} rows {offset}-{offset + len(page['data'])}")
+        return Response(page, status=200)
 
 
 class PredictView(APIView):
@@ -74,20 +96,68 @@ class PredictView(APIView):
         ...
 
 
-# ✅ Unified handler for data sent from React (JSON or CSV)
+def score_orders(df, uploaded_columns, progress=no_progress):
+    """Enrichment + priority prediction for one validated /api/data/ batch. Returns (body, status_code)."""
+    try:
+        # ✅ Product master snapshot (cached, consistent for this request)
+        master = product_master.snapshot()
 
-PRODUCTS_CSV_PATH = os.path.join(os.path.dirname(__file__), '..\\assets\\products.csv')
+        # ✅ Enrichment (columnar, shared with CSV uploads) + model feature names
+        progress(0.1, "enrichment")
+        with stage("data", "enrichment", rows=len(df)):
+            df = prepare_orders(df, master.features)
+
+
+        # 🔍 Show final cleaned & enriched columns
+        final_columns = df.columns.tolist()
+        print(f"\n✅ Final DataFrame Columns After Enrichment: {final_columns}")
+
+        print("\n✅ Final Cleaned & Enriched DataFrame Preview:")
+        print(df.head())
+        
+        
+        print("\n[INFO] 🚀 Loading ML model and encoder...")
+        model, label_encoder = load_priority_model_and_encoder()
+
+        print("[INFO] 🧠 Running prediction...")
+        progress(0.5, "prediction")
+        with stage("data", "prediction", rows=len(df)):
+            df = predict_priority(df, model, label_encoder)
+
+        
+        print(df.columns.tolist())
+
+        return {
+            "message": "Data cleaned and enriched successfully",
+            "uploaded_columns": uploaded_columns,
+            "final_columns": final_columns,
+            "preview": df.head(5).to_dict(orient="records")  # optional
+        }, 200
+
+    except Exception as e:
+        traceback.print_exc()
+        return {"error": str(e)}, 500
+
+
+# ✅ Unified handler for data sent from React (JSON or CSV)
 
 class TestJSONView(APIView):
+    metrics_component = "data"
+
     def post(self, request):
         try:
             print("\n[INFO] 🔥 Incoming /api/data/ POST Request")
 
+            # ✅ Streaming mode for large CSV uploads (?stream=ndjson|columnar)
+            stream_format = request.query_params.get("stream")
+            if stream_format and 'file' in request.FILES:
+                return self.stream_upload(request, stream_format)
+
             df = None
 
             # ✅ CASE 1: React format
             if isinstance(request.data, dict) and "columns" in request.data and "data" in request.data:
-                df = pd.DataFrame(data=request.data["data"], columns=request.data["columns"])
+                df = as_frame(request.data["columns"], request.data["data"])
                 print("[OK] ✅ DataFrame created from columns + data")
 
             # ✅ CASE 2: Direct JSON array
@@ -110,20 +180,6 @@ class TestJSONView(APIView):
             print(f"\n📥 Uploaded Columns: {uploaded_columns}")
 
             # ✅ REQUIRED Columns Check
-            REQUIRED_COLUMNS = [
-                'Assignment_ID',
-                'Product_ID',
-                'Quantity_Assigned',
-                'Unit_Weight_(kg)',
-                'Unit_Volume_(L)',
-                'Urgent_Flag',
-                'Dispatch_Window',
-                'Delivery_Window',
-                'Fragile_Flag',
-                'Temp_Sensitive_Flag',
-                'Zone', 'Rack', 'UID', 'Vehicle_No'
-            ]
-
             missing_cols = [col for col in REQUIRED_COLUMNS if col not in df.columns]
             if missing_cols:
                 return Response({
@@ -131,109 +187,165 @@ class TestJSONView(APIView):
                     "uploaded_columns": uploaded_columns
                 }, status=400)
 
-            # ✅ Load product master
-            product_df = pd.read_csv(PRODUCTS_CSV_PATH)
-            product_df.columns = [col.strip().replace(" ", "_").replace("(", "").replace(")", "") for col in product_df.columns]
-            product_map = product_df.set_index("Product_ID").to_dict(orient="index")
-
-            # ✅ Enrichment
-            def enrich(row):
-                
-                # ✅ Generate Handle tag
-                
-                fragile = int(row.get('Fragile_Flag', 0))
-                temp_sens = int(row.get('Temp_Sensitive_Flag', 0))
-
-                if fragile and temp_sens:
-                    row['Handle'] = 'TF'
-                elif fragile:
-                    row['Handle'] = 'F'
-                elif temp_sens:
-                    row['Handle'] = 'T'
-                else:
-                    row['Handle'] = 'N'
-
-                pid = row['Product_ID']
-                if pid not in product_map:
-                    raise ValueError(f"❌ Expiry_Date not found for Product_ID: {pid}")
-
-                product = product_map[pid]
-                today = datetime.datetime.today()
-
-                dispatch = pd.to_datetime(row['Dispatch_Window'], errors='coerce')
-                delivery = pd.to_datetime(row['Delivery_Window'], errors='coerce')
-                expiry = pd.to_datetime(product['Expiry_Date'], errors='coerce')
-
-                qty = float(row['Quantity_Assigned'])
-                wt = float(row['Unit_Weight_(kg)'])
-                vol = float(row['Unit_Volume_(L)'])
-
-                row['Total_Weight'] = qty * wt
-                row['Total_Volume'] = qty * vol
-                row['Delivery_Window_Days'] = (delivery - dispatch).days if pd.notna(dispatch) and pd.notna(delivery) else None
-                mfg_date = pd.to_datetime(product['Manufacture_Date'], errors='coerce')
-                row['Expiry_Days_Left'] = (expiry - mfg_date).days if pd.notna(expiry) and pd.notna(mfg_date) else None
-                row['Expiry_Date'] = expiry.strftime("%Y-%m-%d") if pd.notna(expiry) else None
-
-                # Construct Assignment_ID & Product_ID
-                row['Assignment_ID'] = f"{row['Zone']}::{row['Rack']}::{row['UID']}::{row['Vehicle_No']}"
-                row['Product_ID'] = f"{product['Product_Name'].split()[0]}-{product['SKU_Code']}-{product['Batch_Number']}-{row['UID']}"
-
-                return row
-
-            df = df.apply(enrich, axis=1)
-            
-            df['Urgent_Flag'] = df['Urgent_Flag'].astype(int)
-            df['Temp_Sensitive_Flag'] = df['Temp_Sensitive_Flag'].astype(int)
-            df['Fragile_Flag'] = df['Fragile_Flag'].astype(int)
-
-            
-            column_mapping = {
-                'Fragile_Flag': 'Fragility',
-                'Temp_Sensitive_Flag': 'Temp_Sensitive',
-                'Urgent_Flag': 'Urgent_Order_Flag'
-            }
-
-            df.rename(columns=column_mapping, inplace=True)
-
-
-            # 🔍 Show final cleaned & enriched columns
-            final_columns = df.columns.tolist()
-            print(f"\n✅ Final DataFrame Columns After Enrichment: {final_columns}")
-
-            print("\n✅ Final Cleaned & Enriched DataFrame Preview:")
-            print(df.head())
-            
-            
-            print("\n[INFO] 🚀 Loading ML model and encoder...")
-            model, label_encoder = load_priority_model_and_encoder()
-
-            print("[INFO] 🧠 Running prediction...")
-            df = predict_priority(df, model, label_encoder)
+            # ✅ ?async=1 -> enrich + predict in the background, return a job ID to poll
+            if wants_async(request):
+                return submit_job("data", score_orders, df, uploaded_columns)
 
-            
-            print(df.columns.tolist())
-
-            return Response({
-                "message": "Data cleaned and enriched successfully",
-                "uploaded_columns": uploaded_columns,
-                "final_columns": final_columns,
-                "preview": df.head(5).to_dict(orient="records")  # optional
-            }, status=200)
+            body, code = score_orders(df, uploaded_columns)
+            return Response(body, status=code)
 
         except Exception as e:
             import traceback
             traceback.print_exc()
             return Response({"error": str(e)}, status=500)
 
+    def stream_upload(self, request, stream_format):
+        if stream_format not in STREAM_FORMATS:
+            return Response({"error": f"Unknown stream format '{stream_format}'. Use one of {STREAM_FORMATS}"}, status=400)
+        try:
+            chunk_rows = parse_chunk_rows(request.query_params.get("chunk_size"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        chunks = read_csv_chunks(request.FILES['file'], chunk_rows)
+        first_chunk = next(chunks, None)
+        if first_chunk is None or first_chunk.empty:
+            return Response({"error": "Uploaded CSV has no rows"}, status=400)
+
+        uploaded_columns = first_chunk.columns.tolist()
+        print(f"[OK] ✅ Streaming upload in chunks of {chunk_rows} rows | Columns: {uploaded_columns}")
+
+        missing_cols = [col for col in REQUIRED_COLUMNS if col not in first_chunk.columns]
+        if missing_cols:
+            return Response({
+                "error": f"❌ Missing required columns: {missing_cols}",
+                "uploaded_columns": uploaded_columns
+            }, status=400)
+
+        # Resolve everything that can fail up front, while a status code can still be sent
+        master = product_master.snapshot()
+        model, label_encoder = load_priority_model_and_encoder()
+
+        return StreamingHttpResponse(
+            stream_predictions(first_chunk, chunks, master.features, model, label_encoder, stream_format),
+            content_type=STREAM_CONTENT_TYPE
+        )
+
 class UploadMasterView(APIView):
     def post(self, request):
         try:
             if 'file' not in request.FILES:
                 return Response({"error": "No master file uploaded"}, status=400)
+            mode = request.query_params.get("mode", "replace")
+            if mode not in MASTER_UPLOAD_MODES:
+                return Response({"error": f"Unknown mode '{mode}'. Use one of {MASTER_UPLOAD_MODES}"}, status=400)
+
+            snapshot, report = update_master_file(request.FILES['file'], mode)
+            return Response({"message": "Master file updated", "master": snapshot.to_dict(), "changes": report}, status=200)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=500)
+
+
+# ✅ Versioned product master: current version + history, or specific rows via ?product_id=
+class MasterView(APIView):
+    metrics_component = "master"
+
+    def get(self, request):
+        snapshot = product_master.snapshot()
+        body = {"master": snapshot.to_dict(), "versions": product_master.store.versions()}
+        product_ids = request.query_params.getlist("product_id")
+        if product_ids:
+            columns, rows, missing = product_master.store.rows(product_ids)
+            body.update({"columns": columns, "data": rows, "missing": missing})
+        return Response(body, status=200)
+
 
-            update_master_file(request.FILES['file'])
-            return Response({"message": "Master file updated"}, status=200)
+# ✅ Products changed since a version (latest op per Product_ID), for caches refreshing incrementally
+class MasterChangesView(APIView):
+    metrics_component = "master"
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get("since", 0))
+            until = request.query_params.get("until")
+            until = int(until) if until is not None else None
+            offset = int(request.query_params.get("offset", 0))
+            limit = int(request.query_params.get("limit", DEFAULT_PAGE_ROWS))
+        except ValueError:
+            return Response({"error": "since, until, offset and limit must be integers"}, status=400)
+        if since < 0 or offset < 0 or not 0 < limit <= MAX_PAGE_ROWS:
+            return Response({"error": f"since / offset must be >= 0 and limit between 1 and {MAX_PAGE_ROWS}"}, status=400)
+
+        page = product_master.store.changes(since, offset, limit, until)
+        end = offset + len(page["changes"])
+        page.update({"offset": offset, "limit": limit,
+                     "next_offset": end if page["total"] is not None and end < page["total"] else None})
+        return Response(page, status=200)
+
+
+# ✅ Upsert ({"columns", "data"}) or delete ({"product_ids"}) master rows as one new version
+class MasterRowsView(APIView):
+    parser_classes = PAYLOAD_PARSERS
+    metrics_component = "master"
+    actions = ["upsert", "delete"]
+
+    def post(self, request, action):
+        if action not in self.actions:
+            return Response({"error": f"Unknown action '{action}'. Use one of {self.actions}"}, status=404)
+        try:
+            if action == "upsert":
+                columns = request.data.get("columns", [])
+                data = request.data.get("data", [])
+                if not columns or not len(data):
+                    return Response({"error": "Missing 'columns' or 'data' in request"}, status=400)
+                snapshot, report = upsert_master_rows(as_frame(columns, data))
+            else:
+                product_ids = request.data.get("product_ids")
+                if not isinstance(product_ids, list) or not product_ids:
+                    return Response({"error": "'product_ids' must be a non-empty list"}, status=400)
+                snapshot, report = delete_master_rows(product_ids)
+
+            print(f"✅ Product master {action}: version {report['previous_version']} -> {report['version']}")
+            return Response({"master": snapshot.to_dict(), "changes": report}, status=200)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
         except Exception as e:
             traceback.print_exc()
             return Response({"error": str(e)}, status=500)
+
+
+# ✅ Model registry status: load time + version of every cached artifact, plus predict batching / memo stats
+class ModelRegistryView(APIView):
+    def get(self, request):
+        return Response({
+            "models": registry.info(),
+            "batching": batching_stats(),
+            "prediction_cache": prediction_cache_stats(),
+        }, status=200)
+
+    def post(self, request):
+        try:
+            name = request.data.get("name") if isinstance(request.data, dict) else None
+            if name and not registry.is_registered(name):
+                return Response({"error": f"Unknown model: {name}"}, status=404)
+            return Response({"message": "Models reloaded", "models": registry.reload(name)}, status=200)
+        except Exception as e:
+            traceback.print_exc()
+            return Response({"error": str(e)}, status=500)
+
+
+# ✅ Background jobs: poll status / progress / result of ?async=1 submissions
+class JobsView(APIView):
+    def get(self, request, job_id=None):
+        runner = get_job_runner()
+        if job_id is None:
+            jobs = [job_to_dict(job) for job in runner.store.recent()]
+            return Response({"runner": runner.info(), "jobs": jobs}, status=200)
+
+        job = runner.store.get(job_id)
+        if job is None:
+            return Response({"error": f"Unknown job: {job_id}"}, status=404)
+        return Response(job_to_dict(job), status=200)
@@ -0,0 +1,369 @@
+import gzip
+import io
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+from .metrics import render_stage
+from .result_store import _json_default
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # Arrow IPC is optional
+    pa = None
+
+# 📦 Column-oriented wire formats for {"columns", "data"} payloads, picked by Content-Type / Accept.
+# JSON row lists stay the default.
+COLUMNAR_MEDIA_TYPE = "application/vnd.mlapi.columnar"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+DEFAULT_WIRE_FORMATS = {
+    "GZIP_LEVEL": 6,
+    "GZIP_MIN_BYTES": 1024,                # smaller columnar / Arrow responses are sent uncompressed
+    "MAX_DECOMPRESSED_BYTES": 1 << 30,     # gzip request bodies may not inflate beyond this
+}
+
+# Columnar layout:
+#   b"MLC1" | uint32 LE header length | header JSON (padded to 8 bytes) | column buffers (8-byte aligned)
+# header = {"rows", "columns": [{"name", "type", "buffers": [[offset, length], ...], "nulls"?: [offset, length]}],
+#           "meta": <every other payload key>, "table": <keys leading to the table, e.g. ["result"]>}
+# Column types: a little-endian NumPy dtype ("<f8", "<i8", "|b1", "<M8[ns]", ...) -> one raw buffer;
+# "utf8" / "large_utf8" -> int32 / int64 character offsets (rows + 1) and the UTF-8 text, plus a
+# uint8 null mask when needed; "json" -> mixed-type columns as one JSON list.
+MAGIC = b"MLC1"
+_PREFIX = struct.Struct("<4sI")
+_RAW_KINDS = "biufM"
+
+
+def _config():
+    return {**DEFAULT_WIRE_FORMATS, **getattr(settings, "WIRE_FORMATS", {})}
+
+
+class FrameData:
+    """
+    A response / request "data" value kept as a DataFrame. JSON renders it as
+    row lists (same output as `df.values.tolist()`); the columnar renderers
+    write its columns directly.
+    """
+
+    __slots__ = ("frame",)
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def __len__(self):
+        return len(self.frame)
+
+    def tolist(self):
+        return self.frame.values.tolist()
+
+
+def as_frame(columns, data, dtype=None):
+    """DataFrame for a payload's columns / data, whether the rows came as JSON lists or columnar."""
+    if isinstance(data, FrameData):
+        return data.frame
+    return pd.DataFrame(data, columns=columns, dtype=dtype)
+
+
+def _table_path(payload):
+    """Keys from the payload down to the dict holding "columns" + "data" (jobs and SOP nest it under "result")."""
+    path, node = [], payload
+    while isinstance(node, dict):
+        if isinstance(node.get("columns"), list) and isinstance(node.get("data"), (list, FrameData)):
+            return path, node
+        path.append("result")
+        node = node.get("result")
+    return None, None
+
+
+def split_payload(payload):
+    """(frame or None, meta, table path) for a response body."""
+    path, table = _table_path(payload)
+    if table is None:
+        return None, payload, None
+
+    data = table["data"]
+    frame = data.frame if isinstance(data, FrameData) else pd.DataFrame(data, columns=table["columns"])
+    meta = {k: v for k, v in payload.items()}
+    node = meta
+    for key in path:
+        node[key] = {k: v for k, v in node[key].items()}
+        node = node[key]
+    del node["columns"], node["data"]
+    return frame, meta, path
+
+
+def join_payload(frame, meta, path):
+    payload = dict(meta)
+    node = payload
+    for key in path or []:
+        node = node.setdefault(key, {})
+    node["columns"] = frame.columns.tolist()
+    node["data"] = FrameData(frame)
+    return payload
+
+
+# === Columnar encoding ===
+
+def _encode_column(values):
+    """(type, [buffers], null mask or None) for one column."""
+    arr = values.to_numpy()
+    if arr.dtype.kind in _RAW_KINDS:
+        arr = np.ascontiguousarray(arr, dtype=arr.dtype.newbyteorder("<"))
+        return arr.dtype.str, [arr.tobytes()], None
+
+    arr = arr.astype(object, copy=False)
+    nulls = pd.isna(arr)
+    if pd.api.types.infer_dtype(arr, skipna=True) in ("string", "empty"):
+        strings = np.where(nulls, "", arr)
+        offsets = np.zeros(len(strings) + 1, dtype="<i8")
+        np.cumsum(np.fromiter(map(len, strings), dtype=np.int64, count=len(strings)), out=offsets[1:])
+        kind = "large_utf8"
+        if offsets[-1] < 2 ** 31:
+            kind, offsets = "utf8", offsets.astype("<i4")
+        return kind, [offsets.tobytes(), "".join(strings).encode()], nulls if nulls.any() else None
+    return "json", [json.dumps(arr.tolist(), default=_json_default).encode()], None
+
+
+def encode_columnar(payload):
+    """Columnar bytes for a body; its "columns" / "data" table (if any) goes column by column."""
+    frame, meta, path = split_payload(payload)
+    chunks, specs, offset = [], [], 0
+
+    def add(buffer):
+        nonlocal offset
+        pad = -len(buffer) % 8
+        chunks.append(buffer + b"\0" * pad)
+        span = [offset, len(buffer)]
+        offset += len(buffer) + pad
+        return span
+
+    if frame is not None:
+        for i, name in enumerate(frame.columns):
+            kind, buffers, nulls = _encode_column(frame.iloc[:, i])
+            spec = {"name": name, "type": kind, "buffers": [add(b) for b in buffers]}
+            if nulls is not None:
+                spec["nulls"] = add(nulls.astype(np.uint8).tobytes())
+            specs.append(spec)
+
+    header = json.dumps({
+        "rows": len(frame) if frame is not None else 0,
+        "columns": specs,
+        "meta": meta,
+        "table": path,
+    }, default=_json_default).encode()
+    header += b" " * (-(len(header) + _PREFIX.size) % 8)
+    return b"".join([_PREFIX.pack(MAGIC, len(header)), header, *chunks])
+
+
+def _decode_column(spec, body, rows):
+    def buffer(span):
+        start, length = span
+        if start < 0 or length < 0 or start + length > len(body):
+            raise ParseError(f"Column '{spec['name']}' points outside the payload")
+        return body[start:start + length]
+
+    kind = spec["type"]
+    if kind in ("utf8", "large_utf8"):
+        offsets = np.frombuffer(buffer(spec["buffers"][0]), dtype="<i4" if kind == "utf8" else "<i8")
+        text = bytes(buffer(spec["buffers"][1])).decode()
+        if len(offsets) != rows + 1:
+            raise ParseError(f"Column '{spec['name']}' has {len(offsets) - 1} offsets for {rows} rows")
+        values = np.empty(rows, dtype=object)
+        values[:] = [text[a:b] for a, b in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+    elif kind == "json":
+        values = np.empty(rows, dtype=object)
+        decoded = json.loads(bytes(buffer(spec["buffers"][0])))
+        if len(decoded) != rows:
+            raise ParseError(f"Column '{spec['name']}' has {len(decoded)} values for {rows} rows")
+        values[:] = decoded
+    else:
+        try:
+            dtype = np.dtype(kind)
+        except TypeError:
+            raise ParseError(f"Column '{spec['name']}' has unknown type '{kind}'")
+        if dtype.kind not in _RAW_KINDS:
+            raise ParseError(f"Column '{spec['name']}' has unsupported type '{kind}'")
+        raw = buffer(spec["buffers"][0])
+        if len(raw) != rows * dtype.itemsize:
+            raise ParseError(f"Column '{spec['name']}' has {len(raw)} bytes for {rows} rows of {kind}")
+        values = np.frombuffer(raw, dtype=dtype)
+
+    if "nulls" in spec:
+        nulls = np.frombuffer(buffer(spec["nulls"]), dtype=np.uint8).astype(bool)
+        values = values.astype(object)
+        values[nulls] = None
+    return values
+
+
+def decode_columnar(raw):
+    """Payload dict for columnar bytes; the table comes back as a FrameData."""
+    body = memoryview(bytearray(raw))  # writable, so decoded columns are too
+    if len(body) < _PREFIX.size:
+        raise ParseError("Columnar payload is truncated")
+    magic, header_length = _PREFIX.unpack_from(body)
+    if magic != MAGIC:
+        raise ParseError("Not a columnar payload (bad magic)")
+    start = _PREFIX.size + header_length
+    try:
+        header = json.loads(bytes(body[_PREFIX.size:start]))
+    except ValueError as e:
+        raise ParseError(f"Invalid columnar header: {e}")
+    if not isinstance(header, dict):
+        raise ParseError("Invalid columnar header: expected a JSON object")
+    try:
+        rows = int(header["rows"])
+        specs = header["columns"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ParseError(f"Invalid columnar header: {e}")
+    if rows < 0:
+        raise ParseError(f"Invalid columnar header: rows must be >= 0, got {rows}")
+    if not isinstance(specs, list):
+        raise ParseError("Invalid columnar header: 'columns' must be a list")
+    for i, spec in enumerate(specs):
+        if not isinstance(spec, dict) or "name" not in spec or "type" not in spec:
+            raise ParseError(f"Invalid columnar header: column {i} needs a 'name' and a 'type'")
+        if not isinstance(spec.get("buffers"), list):
+            raise ParseError(f"Invalid columnar header: column '{spec['name']}' has no buffer list")
+
+    meta = header.get("meta") or {}
+    if header.get("table") is None and not specs:
+        return meta
+    columns = [_decode_column(spec, body[start:], rows) for spec in specs]
+    frame = pd.DataFrame(dict(enumerate(columns)), index=pd.RangeIndex(rows))
+    frame.columns = [spec["name"] for spec in specs]
+    return join_payload(frame, meta, header.get("table"))
+
+
+# === Arrow IPC (needs pyarrow) ===
+
+def encode_arrow(payload):
+    frame, meta, path = split_payload(payload)
+    frame = frame if frame is not None else pd.DataFrame()
+    try:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed-type object columns: send them as strings
+        mixed = {c: "string" for c in frame.columns[frame.dtypes == object]}
+        table = pa.Table.from_pandas(frame.astype(mixed), preserve_index=False)
+    header = json.dumps({"meta": meta, "table": path}, default=_json_default)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"mlapi": header.encode()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def decode_arrow(raw):
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(raw)).read_all()
+    except pa.ArrowException as e:
+        raise ParseError(f"Invalid Arrow IPC stream: {e}")
+    header = json.loads((table.schema.metadata or {}).get(b"mlapi", b"{}"))
+    meta = header.get("meta") or {}
+    if header.get("table") is None and table.num_columns == 0:
+        return meta
+    return join_payload(table.to_pandas(), meta, header.get("table"))
+
+
+# === DRF plumbing ===
+
+def _read_body(stream, parser_context):
+    """Request body bytes, inflating Content-Encoding: gzip (bounded by MAX_DECOMPRESSED_BYTES)."""
+    if stream is None:
+        return b""
+    request = (parser_context or {}).get("request")
+    encoding = request.META.get("HTTP_CONTENT_ENCODING", "").lower() if request is not None else ""
+    if encoding != "gzip":
+        return stream.read()
+    limit = _config()["MAX_DECOMPRESSED_BYTES"]
+    try:
+        raw = gzip.GzipFile(fileobj=stream).read(limit + 1)
+    except (OSError, EOFError) as e:
+        raise ParseError(f"Invalid gzip body: {e}")
+    if len(raw) > limit:
+        raise ParseError(f"Decompressed body is larger than {limit} bytes")
+    return raw
+
+
+def _compress(content, renderer_context):
+    """gzip the rendered bytes when the client accepts it (and they are worth compressing)."""
+    renderer_context = renderer_context or {}
+    request, response = renderer_context.get("request"), renderer_context.get("response")
+    config = _config()
+    if request is None or response is None or len(content) < config["GZIP_MIN_BYTES"]:
+        return content
+    if "gzip" not in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+        return content
+    response["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return gzip.compress(content, compresslevel=config["GZIP_LEVEL"])
+
+
+class JSONParser(parsers.JSONParser):
+    """The default JSON parser, also accepting Content-Encoding: gzip bodies."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return super().parse(io.BytesIO(_read_body(stream, parser_context)), media_type, parser_context)
+
+
+class ColumnarParser(parsers.BaseParser):
+    media_type = COLUMNAR_MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return decode_columnar(_read_body(stream, parser_context))
+
+
+class ArrowParser(parsers.BaseParser):
+    media_type = ARROW_MEDIA_TYPE
+    available = pa is not None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return decode_arrow(_read_body(stream, parser_context))
+
+
+class ColumnarRenderer(BaseRenderer):
+    media_type = COLUMNAR_MEDIA_TYPE
+    format = "columnar"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with render_stage(renderer_context):
+            return _compress(encode_columnar(data if data is not None else {}), renderer_context)
+
+
+class ArrowRenderer(BaseRenderer):
+    media_type = ARROW_MEDIA_TYPE
+    format = "arrow"
+    charset = None
+    available = pa is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with render_stage(renderer_context):
+            return _compress(encode_arrow(data if data is not None else {}), renderer_context)
+
+
+# Parsers for the {"columns", "data"} endpoints
+PAYLOAD_PARSERS = [JSONParser, ColumnarParser, ArrowParser]
+
+
+class WireNegotiation(DefaultContentNegotiation):
+    """Default negotiation, minus the Arrow parser / renderer when pyarrow is not installed."""
+
+    def select_parser(self, request, parsers):
+        return super().select_parser(request, [p for p in parsers if getattr(p, "available", True)])
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return super().select_renderer(
+            request, [r for r in renderers if getattr(r, "available", True)], format_suffix
+        )
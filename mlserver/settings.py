@@ -19,6 +19,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.capture.CaptureMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -55,8 +57,142 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+# 📦 JSON stays the default; clients can send / accept the columnar format or Arrow IPC (if pyarrow is installed)
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
-    ]
+        'core.metrics.TimedJSONRenderer',
+        'core.wire.ColumnarRenderer',
+        'core.wire.ArrowRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.wire.JSONParser',
+        'core.wire.ColumnarParser',
+        'core.wire.ArrowParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'core.wire.WireNegotiation',
+}
+
+# 🚚 Named depot fleets for /api/dispatch/ — select with {"fleet": {"depot": "<name>"}}.
+# Each entry: {"vehicles": [{"Vehicle_Type", "Capacity_kg", "Capacity_L", "Vehicle_Property", "count"?}], "per_type": n}
+# A "default" entry replaces the built-in 6 x 4 pool.
+DISPATCH_DEPOT_FLEETS = {}
+
+# 🗄️ Keyed store for /api/sop/ results (SQLite file shared by every worker on the host).
+# Entries expire after TTL_SECONDS; past MAX_ENTRIES / MAX_BYTES the least recently read go first.
+RESULT_STORE = {
+    "PATH": BASE_DIR / "var" / "results.sqlite3",
+    "TTL_SECONDS": 3600,
+    "MAX_ENTRIES": 500,
+    "MAX_BYTES": 256 * 1024 * 1024,
+}
+
+# ♻️ /api/sop/: demand the greedy zone cannot hold spills into the next-best zones by Q-value (Zone_Split column).
+# Off by default (single-zone allocation); requests opt in with "spillover": true.
+SOP_SPILLOVER = False
+
+# 🧵 Background jobs for ?async=1 on /api/dispatch/, /api/sop/ and /api/data/.
+# Limits are per server process: MAX_WORKERS jobs run at once, MAX_QUEUED more wait, then submits get 429.
+JOBS = {
+    "MAX_WORKERS": 2,
+    "MAX_QUEUED": 16,
+    "TTL_SECONDS": 3600,
+    "MAX_FINISHED": 200,
+}
+
+# ⏱️ Micro-batching of small concurrent predict() calls (priority + KNN models).
+# A call with no other call in flight runs at once; calls arriving while others are in flight
+# wait up to WINDOW_MS to share one batch. Calls of BYPASS_ROWS rows or more always run directly.
+PREDICTION_BATCHING = {
+    "ENABLED": True,
+    "WINDOW_MS": 3,
+    "MAX_ROWS": 4096,
+    "BYPASS_ROWS": 1024,
+}
+
+# 🧠 Row-level memo of priority / KNN predictions, keyed on the exact feature row + model checksum.
+# Cleared whenever a model is (re)loaded; MAX_ENTRIES distinct rows per model (LRU).
+PREDICTION_CACHE = {
+    "ENABLED": True,
+    "MAX_ENTRIES": 100000,
+}
+
+# 🧭 Default /api/dispatch/ cluster engine: "exact" (KNN), "fast" (grid + KNN near boundaries) or "grid".
+# Requests override it with "cluster_mode"; rebuild the grid after retraining: python manage.py build_cluster_grid
+DISPATCH_CLUSTER_MODE = "exact"
+
+# 🧩 /api/dispatch/ vehicle assignment: "serial" (one pass) or "sharded" (per-cluster fleet shares packed
+# in WORKERS processes, leftovers reconciled). Plans under MIN_POOL_ORDERS run their shards in-process.
+DISPATCH_ASSIGNMENT = {
+    "MODE": "serial",
+    "WORKERS": 4,
+    "MIN_POOL_ORDERS": 50000,
+}
+
+# ⏳ /api/dispatch/ "optimize": local search (moves / swaps between vehicles) seeded with the greedy plan,
+# run until the caller's time_budget_ms (DEFAULT_TIME_BUDGET_MS for "optimize": true, capped at MAX_TIME_BUDGET_MS).
+DISPATCH_OPTIMIZER = {
+    "DEFAULT_TIME_BUDGET_MS": 200,
+    "MAX_TIME_BUDGET_MS": 10000,
+}
+
+# 🪶 /api/dispatch/ memory mode: "standard" or "low" (frame built column by column, lossless downcasts, categorical
+# labels, models scored CHUNK_ROWS rows at a time); requests override it with "memory_mode". REPORT_PEAK adds the
+# request's peak RSS (the process high-water mark from /proc, Linux only) to the response.
+DISPATCH_MEMORY = {
+    "MODE": "standard",
+    "CHUNK_ROWS": 50000,
+    "REPORT_PEAK": True,
+}
+
+# 🎙️ Sampled capture of /api/dispatch/, /api/sop/ and /api/data/ payloads to JSONL (off by default).
+# Bodies over MAX_BODY_BYTES (or without a Content-Length) are skipped and capture stops at MAX_FILE_BYTES; replay with:
+# python manage.py replay_traffic --target wsgi --concurrency 8
+REQUEST_CAPTURE = {
+    "ENABLED": False,
+    "PATH": BASE_DIR / "var" / "captures" / "requests.jsonl",
+    "PATHS": ["/api/dispatch/", "/api/sop/", "/api/data/"],
+    "SAMPLE_RATE": 0.1,
+    "MAX_BODY_BYTES": 2 * 1024 * 1024,
+    "MAX_FILE_BYTES": 256 * 1024 * 1024,
+}
+
+# 🗂️ Product master rows keyed by Product_ID in their own SQLite file; every upsert / delete / upload is one
+# atomic version. assets/products.csv seeds it (and is re-imported when the file changes on disk).
+# Per-product change logs are kept for KEEP_VERSIONS versions; caches older than that reload in full.
+PRODUCT_MASTER = {
+    "PATH": BASE_DIR / "var" / "product_master.sqlite3",
+    "KEEP_VERSIONS": 500,
+}
+
+# 🗓️ /api/dispatch/sessions/: incremental plans kept in the RESULT_STORE SQLite file
+DISPATCH_SESSIONS = {
+    "TTL_SECONDS": 24 * 3600,
+    "MAX_SESSIONS": 50,
+}
+
+# 📈 Per-stage latency histograms, row counts and model loads, served as Prometheus text at /metrics/.
+# Counters live in each server process; with ENABLED False every timer is a no-op and /metrics/ returns 404.
+METRICS = {
+    "ENABLED": True,
+    "BUCKETS": [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0],
+}
+
+# 🗜️ Columnar / Arrow wire formats: responses are gzipped when the client sends Accept-Encoding: gzip
+# and they are at least GZIP_MIN_BYTES; gzip request bodies may inflate to MAX_DECOMPRESSED_BYTES.
+WIRE_FORMATS = {
+    "GZIP_LEVEL": 6,
+    "GZIP_MIN_BYTES": 1024,
+    "MAX_DECOMPRESSED_BYTES": 1 << 30,
+}
+
+# 🗺️ Model memory across worker processes: PRELOAD loads every model when mlserver.wsgi is imported
+# (serving processes only; before gunicorn --preload forks), MMAP serves large NumPy arrays from
+# read-only joblib copies in CACHE_DIR.
+# Measure with: python manage.py model_footprint --workers 4
+MODEL_ARTIFACTS = {
+    "PRELOAD": True,
+    "MMAP": True,
+    "CACHE_DIR": BASE_DIR / "var" / "model_cache",
 }
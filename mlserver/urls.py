@@ -1,9 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
+from core.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('core.urls')),
     path('healthz/', lambda req: JsonResponse({"status": "OK"})),
+    # 📈 Prometheus scrape target (default metrics_path is /metrics)
+    path('metrics', metrics_view),
+    path('metrics/', metrics_view, name='metrics'),
 ]
@@ -5,3 +5,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mlserver.settings')
 
 application = get_wsgi_application()
+
+# 🚀 Load models once the app is up, only when serving (settings.MODEL_ARTIFACTS["PRELOAD"]).
+# gunicorn --preload imports this module before forking, so workers share the parent's pages.
+from core.model_artifacts import preload_models  # noqa: E402
+preload_models()